@@ -6,10 +6,10 @@ from db import get_main_db_connection
 
 # Role-based access control
 ROLE_ACCESS = {
-    "admin": ["shift_output_form", "reports_dashboard", "master_data", "user_management", "extract_data", "change_password"],
-    "user": ["shift_output_form", "reports_dashboard", "extract_data", "change_password"],
-    "power user": ["shift_output_form", "reports_dashboard", "master_data", "extract_data", "change_password"],
-    "report": ["reports_dashboard", "extract_data", "change_password"],
+    "admin": ["shift_output_form", "reports_dashboard", "machine_ranking", "downtime_analytics", "batch_trace", "capacity_planning", "master_data", "rate_calibration", "user_management", "extract_data", "change_password", "import_data", "data_audit"],
+    "user": ["shift_output_form", "reports_dashboard", "machine_ranking", "downtime_analytics", "batch_trace", "extract_data", "change_password"],
+    "power user": ["shift_output_form", "reports_dashboard", "machine_ranking", "downtime_analytics", "batch_trace", "capacity_planning", "master_data", "rate_calibration", "extract_data", "change_password"],
+    "report": ["reports_dashboard", "machine_ranking", "downtime_analytics", "batch_trace", "extract_data", "change_password"],
 }
 
 def check_authentication():
@@ -22,6 +22,16 @@ def check_access(required_roles):
         st.error("Access Denied: You do not have permission to view this page.")
         st.stop()        
 
+def fetch_user(cur, username):
+    """Return (username, password hash, role, branch) for a username, or None."""
+    cur.execute("SELECT username, password, role, branch FROM users WHERE username = %s", (username,))
+    return cur.fetchone()
+
+def password_matches(password, stored_password):
+    """Check a plain password against the stored bcrypt hash."""
+    stored_password = stored_password.strip()  # Ensure no extra spaces
+    return bcrypt.checkpw(password.encode(), stored_password.encode())
+
 def authenticate_user():
     """Handles user authentication and assigns branch based on database records."""
     
@@ -45,12 +55,10 @@ def authenticate_user():
 
         try:
             # Fetch user details
-            cur.execute("SELECT username, password, role, branch FROM users WHERE username = %s", (username,))
-            user = cur.fetchone()
+            user = fetch_user(cur, username)
 
             if user:
-                stored_password = user[1].strip()  # Ensure no extra spaces
-                if bcrypt.checkpw(password.encode(), stored_password.encode()):
+                if password_matches(password, user[1]):
                     # Store login info in session state
                     st.session_state["authenticated"] = True
                     st.session_state["username"] = user[0]
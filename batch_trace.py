@@ -0,0 +1,78 @@
+import pandas as pd
+from sqlalchemy.sql import text
+from db import create_index
+from shared_cache import cached
+
+SUGGESTION_LIMIT = 25
+
+
+def ensure_batch_index(engine):
+    """
+    Creates the index behind batch lookups (a migration step, see migrations.py).
+    A B-tree on ("batch number" text_pattern_ops, "Product") serves exact
+    lookups, lookups by batch and product, and prefix suggestions.
+    """
+    create_index(engine, "archive_batch_product_idx", "archive", '("batch number" text_pattern_ops, "Product")')
+
+
+def search_batches(engine, prefix, limit=SUGGESTION_LIMIT):
+    """Return up to ``limit`` distinct batch numbers starting with ``prefix``."""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    query = text("""
+        SELECT DISTINCT "batch number" FROM archive
+        WHERE "batch number" LIKE :prefix
+        ORDER BY "batch number"
+        LIMIT :limit
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query, {"prefix": f"{escaped}%", "limit": limit}).fetchall()
+    return [row[0] for row in rows]
+
+
+def trace_batch(engine, batch, product=None):
+    """Every archive production row for a batch (optionally one product), in date and shift order."""
+    query = """
+        SELECT "Date", "Day/Night/plan" AS "Shift", "Machine", "Product", "batch number",
+               "quantity", "time", "rate", "standard rate", "efficiency"
+        FROM archive
+        WHERE "batch number" = :batch
+    """
+    params = {"batch": batch.strip()}
+    if product:
+        query += ' AND "Product" = :product'
+        params["product"] = product
+    query += ' ORDER BY "Date", "Day/Night/plan", "Machine"'
+    with engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def summarize_trace(trace):
+    """Quantity, time and average efficiency per machine and product for a traced batch."""
+    return (
+        trace.groupby(["Machine", "Product"], sort=False)
+        .agg(first_date=("Date", "min"), last_date=("Date", "max"), shifts=("Shift", "size"),
+             quantity=("quantity", "sum"), time=("time", "sum"), efficiency=("efficiency", "mean"))
+        .reset_index()
+    )
+
+
+@cached("batch_search", tables=["archive"])
+def cached_search_batches(_engine, branch, prefix):
+    """search_batches() cached per branch and prefix."""
+    return search_batches(_engine, prefix)
+
+
+@cached("batch_trace", tables=["archive"])
+def cached_trace(_engine, branch, batch, product=None):
+    """trace_batch() cached per branch, batch and product."""
+    return trace_batch(_engine, batch, product)
+
+
+def clear_trace_cache():
+    """Forget cached lookups."""
+    cached_search_batches.clear()
+    cached_trace.clear()
+
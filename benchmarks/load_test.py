@@ -0,0 +1,271 @@
+"""
+Load test simulating concurrent operators and managers against a local PostgreSQL stand-in.
+
+Every virtual user logs in with the same checks as auth.authenticate_user(), then
+loops over a weighted mix of shift-report saves, dashboard date flips and extracts
+until the run ends. Reports throughput, p50/p95/p99 latency and connection-pool
+saturation per operation.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --users 50 --duration 60
+    python -m benchmarks.load_test --dsn postgresql://localhost/bench --users 200 --pool-size 10 --max-overflow 5
+    (--dsn refuses a database that already has archive rows unless --allow-truncate is given)
+"""
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+import bcrypt
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.sql import text
+from auth import fetch_user, password_matches
+from benchmarks.local_postgres import temporary_postgres
+from benchmarks.synthetic import create_schema, generate_reports, has_archive_rows, load_catalogs, load_synthetic
+from rollups import refresh_downtime_rollup, refresh_oee_rollup
+from report_queries import QUERY_ARCHIVE, QUERY_AV, QUERY_PRODUCTION, fetch_extract, generate_excel
+from shift_report import clean_dataframe, report_exists, save_shift_report
+
+PASSWORD = "load-test"
+DEFAULT_MIX = "save=3,dashboard=5,extract=1"
+
+# Saved reports are dated far in the future so they never collide with loaded history
+SAVE_DATE_OFFSET = 3650
+
+
+class Recorder:
+    """Thread-safe latency and pool-saturation samples per operation."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.saturation = defaultdict(list)
+        self.running = {}  # thread id -> operation in progress
+
+    def start(self, op):
+        with self.lock:
+            self.running[threading.get_ident()] = op
+
+    def finish(self, op, elapsed_ms, error=None):
+        with self.lock:
+            self.running.pop(threading.get_ident(), None)
+            if error is None:
+                self.latencies[op].append(elapsed_ms)
+            elif isinstance(error, PoolTimeoutError):
+                self.timeouts[op] += 1
+            else:
+                self.errors[op] += 1
+
+    def sample_pool(self, pool, capacity):
+        """Attribute the current pool utilization to every operation in progress."""
+        utilization = pool.checkedout() / capacity
+        with self.lock:
+            for op in set(self.running.values()):
+                self.saturation[op].append(utilization)
+
+
+def seed_users(engine, count):
+    """Create load-test users sharing one bcrypt hash (verification cost is unchanged)."""
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username LIKE 'load_user_%'"))
+        conn.execute(
+            text("INSERT INTO users (username, password, role, branch) VALUES (:username, :password, 'user', 'main')"),
+            [{"username": f"load_user_{i}", "password": hashed} for i in range(count)],
+        )
+
+
+def login(engine, username):
+    """Same lookup and bcrypt check as auth.authenticate_user(), on a pooled connection."""
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        user = fetch_user(cur, username)
+        cur.close()
+        if not user or not password_matches(PASSWORD, user[1]):
+            raise RuntimeError(f"Login failed for {username}")
+    finally:
+        raw_conn.close()
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def virtual_user(user_id, engine, catalogs, recorder, weights, deadline, think_time, save_counter):
+    """One simulated session: log in, then run weighted operations until the deadline."""
+    rng = random.Random(user_id)
+    today = datetime.date.today()
+
+    def save_report():
+        with save_counter["lock"]:
+            key = save_counter["next"]
+            save_counter["next"] += 1
+        archive_df, av_df = generate_reports(catalogs, key, 1, today + datetime.timedelta(days=SAVE_DATE_OFFSET))
+        report = (av_df["date"][0], av_df["machine"][0], av_df["shift"][0])
+        if not report_exists(engine, report[0], report[2], report[1]):
+            save_shift_report(engine, clean_dataframe(archive_df), clean_dataframe(av_df))
+            with save_counter["lock"]:
+                save_counter["saved"].append(report)
+
+    def flip_dashboard():
+        params = {"date": today - datetime.timedelta(days=rng.randint(0, 30)), "shift": rng.choice(["Day", "Night"])}
+        with engine.connect() as conn:
+            for query in (QUERY_AV, QUERY_ARCHIVE, QUERY_PRODUCTION):
+                conn.execute(text(query), params).fetchall()
+
+    def pull_extract():
+        end = today - datetime.timedelta(days=rng.randint(0, 60))
+        start = end - datetime.timedelta(days=7)
+        generate_excel(fetch_extract(engine, "av", start, end), fetch_extract(engine, "archive", start, end),
+                       "load", start, end)
+
+    operations = {"save": save_report, "dashboard": flip_dashboard, "extract": pull_extract}
+    names = [name for name in weights if name in operations]
+    op_weights = [weights[name] for name in names]
+
+    def run(op, func):
+        recorder.start(op)
+        started = time.perf_counter()
+        try:
+            func()
+            recorder.finish(op, (time.perf_counter() - started) * 1000)
+        except Exception as e:
+            recorder.finish(op, 0, error=e)
+
+    run("login", lambda: login(engine, f"load_user_{user_id}"))
+    while time.perf_counter() < deadline:
+        op = rng.choices(names, op_weights)[0]
+        run(op, operations[op])
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def summarize(recorder, elapsed, capacity):
+    """Per-operation throughput, latency percentiles and pool saturation."""
+    summary = {}
+    for op in sorted(set(recorder.latencies) | set(recorder.errors) | set(recorder.timeouts)):
+        samples = np.array(recorder.latencies[op]) if recorder.latencies[op] else np.array([np.nan])
+        saturation = np.array(recorder.saturation[op]) if recorder.saturation[op] else np.array([0.0])
+        summary[op] = {
+            "count": len(recorder.latencies[op]),
+            "errors": recorder.errors[op],
+            "pool_timeouts": recorder.timeouts[op],
+            "throughput_per_s": round(len(recorder.latencies[op]) / elapsed, 2),
+            "p50_ms": round(float(np.nanpercentile(samples, 50)), 2),
+            "p95_ms": round(float(np.nanpercentile(samples, 95)), 2),
+            "p99_ms": round(float(np.nanpercentile(samples, 99)), 2),
+            "pool_saturation_mean": round(float(saturation.mean()), 3),
+            "pool_saturation_max": round(float(saturation.max()), 3),
+            "pool_full_share": round(float((saturation >= 1).mean()), 3),
+        }
+    return {"elapsed_s": round(elapsed, 2), "pool_capacity": capacity, "operations": summary}
+
+
+def delete_saved_reports(engine, reports):
+    """Delete the (date, machine, shift) reports saved by the run and refresh their rollups."""
+    if not reports:
+        return
+    dates, machines, shifts = (list(column) for column in zip(*reports))
+    params = {"dates": dates, "machines": machines, "shifts": shifts}
+    with engine.begin() as conn:
+        conn.execute(text("""
+            DELETE FROM archive a
+            USING unnest(CAST(:dates AS date[]), CAST(:machines AS text[]), CAST(:shifts AS text[])) AS r(d, m, s)
+            WHERE a."Date" = r.d AND a."Machine" = r.m AND a."Day/Night/plan" = r.s
+        """), params)
+        conn.execute(text("""
+            DELETE FROM av
+            USING unnest(CAST(:dates AS date[]), CAST(:machines AS text[]), CAST(:shifts AS text[])) AS r(d, m, s)
+            WHERE av.date = r.d AND av.machine = r.m AND av.shift = r.s
+        """), params)
+        refresh_oee_rollup(conn, dates)
+        refresh_downtime_rollup(conn, dates)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent operators and managers.")
+    parser.add_argument("--dsn", help="Existing PostgreSQL URL (default: start a temporary local cluster)")
+    parser.add_argument("--allow-truncate", action="store_true",
+                        help="Let --dsn point at a database whose archive/av rows will be replaced")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run after start-up")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic archive rows to load first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between operations in seconds")
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--max-overflow", type=int, default=10)
+    parser.add_argument("--pool-timeout", type=float, default=30)
+    parser.add_argument("--json", help="Also write the summary to this file")
+    args = parser.parse_args(argv)
+
+    if args.dsn and not args.allow_truncate:
+        target = create_engine(args.dsn)
+        if has_archive_rows(target):
+            parser.error(f"{target.url} already has archive rows; pass --allow-truncate to replace them")
+        target.dispose()
+
+    catalogs = load_catalogs()
+    weights = parse_mix(args.mix)
+
+    with (nullcontext(args.dsn) if args.dsn else temporary_postgres()) as dsn:
+        engine = create_engine(dsn, pool_pre_ping=True, pool_size=args.pool_size,
+                               max_overflow=args.max_overflow, pool_timeout=args.pool_timeout)
+        capacity = args.pool_size + args.max_overflow
+
+        print(f"Preparing {args.rows:,} archive rows and {args.users} users...")
+        create_schema(engine, catalogs)
+        load_synthetic(engine, catalogs, args.rows)
+        seed_users(engine, args.users)
+
+        recorder = Recorder()
+        save_counter = {"next": 0, "lock": threading.Lock(), "saved": []}
+        deadline = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=virtual_user, daemon=True,
+                             args=(i, engine, catalogs, recorder, weights, deadline, args.think_time, save_counter))
+            for i in range(args.users)
+        ]
+
+        print(f"Running {args.users} users for {args.duration:.0f}s...")
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            recorder.sample_pool(engine.pool, capacity)
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+
+        delete_saved_reports(engine, save_counter["saved"])
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM users WHERE username LIKE 'load_user_%'"))
+        engine.dispose()
+
+    summary = summarize(recorder, elapsed, capacity)
+    print(f"\n{'operation':<12}{'count':>8}{'err':>6}{'t/o':>6}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'pool avg':>10}{'pool max':>10}")
+    for op, stats in summary["operations"].items():
+        print(f"{op:<12}{stats['count']:>8}{stats['errors']:>6}{stats['pool_timeouts']:>6}"
+              f"{stats['throughput_per_s']:>9.2f}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['pool_saturation_mean']:>10.0%}{stats['pool_saturation_max']:>10.0%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
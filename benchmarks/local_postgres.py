@@ -0,0 +1,58 @@
+"""
+Throwaway PostgreSQL cluster for benchmarks and load tests.
+
+Looks for initdb/pg_ctl on PATH, via pg_config, or under /usr/lib/postgresql,
+initializes a cluster in a temporary directory and removes it on exit.
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+
+def find_bindir():
+    """Return the directory holding initdb and pg_ctl, or None."""
+    pg_ctl = shutil.which("pg_ctl")
+    if pg_ctl:
+        return os.path.dirname(pg_ctl)
+
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.run([pg_config, "--bindir"], capture_output=True, text=True).stdout.strip()
+        if os.path.exists(os.path.join(bindir, "pg_ctl")):
+            return bindir
+
+    candidates = sorted(glob.glob("/usr/lib/postgresql/*/bin/pg_ctl"))
+    return os.path.dirname(candidates[-1]) if candidates else None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def temporary_postgres(user="bench"):
+    """Start a local cluster and yield its SQLAlchemy URL."""
+    bindir = find_bindir()
+    if bindir is None:
+        raise RuntimeError("PostgreSQL binaries not found. Install PostgreSQL or pass --dsn.")
+
+    workdir = tempfile.mkdtemp(prefix="bench_pg_")
+    datadir = os.path.join(workdir, "data")
+    port = free_port()
+    try:
+        subprocess.run([os.path.join(bindir, "initdb"), "-D", datadir, "-U", user, "--auth=trust", "-E", "UTF8", "--locale=C"],
+                       check=True, capture_output=True)
+        subprocess.run([os.path.join(bindir, "pg_ctl"), "-D", datadir, "-l", os.path.join(workdir, "server.log"),
+                        "-o", f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1", "-w", "start"],
+                       check=True, capture_output=True)
+        yield f"postgresql://{user}@127.0.0.1:{port}/postgres"
+    finally:
+        if os.path.exists(os.path.join(datadir, "postmaster.pid")):
+            subprocess.run([os.path.join(bindir, "pg_ctl"), "-D", datadir, "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(workdir, ignore_errors=True)
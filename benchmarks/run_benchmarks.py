@@ -0,0 +1,225 @@
+"""
+Benchmarks for the app's data paths against a local PostgreSQL stand-in.
+
+Loads synthetic archive/av data at each size, times the dashboard queries, the
+extract export, the shift-form save path and the master-data upserts, writes the
+results as JSON and flags regressions against a stored baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks                       # temporary cluster, 10k/1m/10m rows
+    python -m benchmarks.run_benchmarks --dsn postgresql://localhost/bench --sizes 10k,1m
+    (--dsn refuses a database that already has archive rows unless --allow-truncate is given)
+    python -m benchmarks.run_benchmarks --sizes 10k --save-baseline
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.sql import text
+from benchmarks.local_postgres import temporary_postgres
+from benchmarks.synthetic import create_schema, generate_reports, has_archive_rows, load_catalogs, load_synthetic
+from master_sync import diff_sheet, fetch_current, save_rate_changes
+from planning import plan_capacity
+from report_queries import QUERY_ARCHIVE, QUERY_AV, QUERY_PRODUCTION, fetch_extract, generate_excel
+from shift_report import clean_dataframe, report_exists, save_shift_report
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(label):
+    label = label.strip().lower()
+    if label[-1] in SIZE_SUFFIXES:
+        return int(float(label[:-1]) * SIZE_SUFFIXES[label[-1]])
+    return int(label)
+
+
+def timed(func, repeat, setup=None, teardown=None):
+    """Run ``func`` ``repeat`` times after one warm-up run and return timing stats in ms."""
+    samples = []
+    for i in range(repeat + 1):
+        state = setup(i) if setup else None
+        started = time.perf_counter()
+        func(state) if setup else func()
+        elapsed = (time.perf_counter() - started) * 1000
+        if teardown:
+            teardown(state)
+        if i > 0:
+            samples.append(elapsed)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "runs": len(samples),
+    }
+
+
+def read_query(engine, query, params):
+    with engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def benchmark_size(engine, catalogs, n_rows, repeat):
+    """Load one dataset size and time every operation on it."""
+    today = datetime.date.today()
+    started = time.perf_counter()
+    load_synthetic(engine, catalogs, n_rows, end_date=today)
+    results = {"load_seconds": round(time.perf_counter() - started, 2)}
+
+    params = {"date": today, "shift": "Day"}
+    results["dashboard.av"] = timed(lambda: read_query(engine, QUERY_AV, params), repeat)
+    results["dashboard.archive"] = timed(lambda: read_query(engine, QUERY_ARCHIVE, params), repeat)
+    results["dashboard.production"] = timed(lambda: read_query(engine, QUERY_PRODUCTION, params), repeat)
+
+    def extract(days):
+        start = today - datetime.timedelta(days=days)
+        av_df = fetch_extract(engine, "av", start, today)
+        archive_df = fetch_extract(engine, "archive", start, today)
+        generate_excel(av_df, archive_df, "bench", start, today)
+
+    results["extract.7d"] = timed(lambda: extract(7), repeat)
+    results["extract.30d"] = timed(lambda: extract(30), repeat)
+
+    # Shift-form save path: duplicate check, clean_dataframe() and the transactional append.
+    # Every run saves a report dated in the future so it never collides with loaded data.
+    def make_report(i):
+        archive_df, av_df = generate_reports(catalogs, i, 1, today + datetime.timedelta(days=365 + i))
+        return archive_df, av_df
+
+    def save(report):
+        archive_df, av_df = report
+        if not report_exists(engine, av_df["date"][0], av_df["shift"][0], av_df["machine"][0]):
+            save_shift_report(engine, clean_dataframe(archive_df.copy()), clean_dataframe(av_df.copy()))
+
+    def delete(report):
+        _, av_df = report
+        with engine.begin() as conn:
+            conn.execute(text('DELETE FROM archive WHERE "Date" = :date'), {"date": av_df["date"][0]})
+            conn.execute(text("DELETE FROM av WHERE date = :date"), {"date": av_df["date"][0]})
+
+    results["shift_form.save"] = timed(save, repeat, setup=make_report, teardown=delete)
+
+    # Master data: diff the full rates sheet, then upsert every rate with a changed value
+    rates = catalogs["rates"]
+
+    def diff_rates():
+        with engine.connect() as conn:
+            diff_sheet("rates", rates, fetch_current(conn, "rates"))
+
+    def changed_rates(i):
+        return rates.assign(standard_rate=rates["standard_rate"] * (1 + (i + 1) / 1000))
+
+    results["master_data.diff_rates"] = timed(diff_rates, repeat)
+    results["master_data.upsert_rates"] = timed(lambda changes: save_rate_changes(engine, changes),
+                                                repeat, setup=changed_rates)
+
+    # Capacity planning: a month of orders (3000 lines) against the full rates matrix
+    rng = np.random.default_rng(0)
+    orders = pd.DataFrame({
+        "product": rng.choice(rates["product"].unique(), 3000),
+        "quantity": rng.integers(100, 5000, 3000).astype(float),
+    })
+    results["planning.month"] = timed(
+        lambda: plan_capacity(orders, rates, catalogs["shift_hours"]["LD"], available_shifts=52,
+                              families=catalogs["machine_families"]), repeat)
+    return results
+
+
+def compare(current, baseline, threshold, noise_ms=1.0):
+    """Return regressions where the median got slower than ``threshold`` (e.g. 0.2 = 20%)."""
+    regressions = []
+    for size, operations in current["sizes"].items():
+        for name, stats in operations.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not isinstance(stats, dict) or not isinstance(base, dict):
+                continue
+            before, after = base["median_ms"], stats["median_ms"]
+            if after > before * (1 + threshold) and after - before > noise_ms:
+                regressions.append({"size": size, "operation": name, "baseline_ms": before,
+                                    "current_ms": after, "change": round(after / before - 1, 3)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's data paths.")
+    parser.add_argument("--dsn", help="Existing PostgreSQL URL (default: start a temporary local cluster)")
+    parser.add_argument("--allow-truncate", action="store_true",
+                        help="Let --dsn point at a database whose archive/av rows will be replaced")
+    parser.add_argument("--sizes", default="10k,1m,10m", help="Comma-separated archive row counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.dsn and not args.allow_truncate:
+        target = create_engine(args.dsn)
+        if has_archive_rows(target):
+            parser.error(f"{target.url} already has archive rows; pass --allow-truncate to replace them")
+        target.dispose()
+
+    catalogs = load_catalogs()
+    sizes = [label.strip() for label in args.sizes.split(",") if label.strip()]
+
+    with (nullcontext(args.dsn) if args.dsn else temporary_postgres()) as dsn:
+        engine = create_engine(dsn, pool_pre_ping=True)
+        create_schema(engine, catalogs)
+        with engine.connect() as conn:
+            server_version = conn.execute(text("SHOW server_version")).scalar()
+
+        report = {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "postgres": server_version,
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sizes": {},
+        }
+        for label in sizes:
+            print(f"⏱️ {label}: loading {parse_size(label):,} archive rows...")
+            report["sizes"][label] = benchmark_size(engine, catalogs, parse_size(label), args.repeat)
+            for name, stats in report["sizes"][label].items():
+                if isinstance(stats, dict):
+                    print(f"   {name:<28} median {stats['median_ms']:>10.2f} ms   p95 {stats['p95_ms']:>10.2f} ms")
+        engine.dispose()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    result_path = os.path.join(RESULTS_DIR, f"{report['created'].replace(':', '')}.json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {result_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found. Run with --save-baseline to create one.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(report, json.load(f), args.threshold)
+    for r in regressions:
+        print(f"❌ Regression: {r['size']} {r['operation']} {r['baseline_ms']} ms → {r['current_ms']} ms (+{r['change']:.0%})")
+    if not regressions:
+        print("✅ No regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+-- Stand-in schema for benchmarks and load tests (mirrors the production tables used by the app)
+CREATE TABLE IF NOT EXISTS branches (
+    branch_name text PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id serial PRIMARY KEY,
+    username text UNIQUE NOT NULL,
+    password text NOT NULL,
+    role text NOT NULL,
+    branch text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS machines (
+    name text PRIMARY KEY,
+    qty_uom text
+);
+
+CREATE TABLE IF NOT EXISTS products (
+    id serial PRIMARY KEY,
+    name text UNIQUE NOT NULL,
+    batch_size double precision,
+    units_per_box double precision,
+    primary_units_per_box double precision,
+    oracle_code text
+);
+
+CREATE TABLE IF NOT EXISTS rates (
+    product text NOT NULL,
+    machine text NOT NULL,
+    standard_rate double precision,
+    PRIMARY KEY (product, machine)
+);
+
+CREATE TABLE IF NOT EXISTS archive (
+    "Date" date,
+    "Machine" text,
+    "Day/Night/plan" text,
+    "Activity" text,
+    "time" double precision,
+    "Product" text,
+    "batch number" text,
+    "quantity" double precision,
+    "comments" text,
+    "rate" double precision,
+    "standard rate" double precision,
+    "efficiency" double precision
+);
+
+CREATE TABLE IF NOT EXISTS av (
+    "date" date,
+    "machine" text,
+    "shift type" text,
+    "hours" double precision,
+    "shift" text,
+    "T.production time" double precision,
+    "Availability" double precision,
+    "Av Efficiency" double precision,
+    "OEE" double precision
+);
@@ -0,0 +1,105 @@
+"""
+Per-session memory of the shift form's draft state, old layout against BatchDraft.
+
+The old layout kept a dict of per-product batch lists, a bulk-batch DataFrame and
+the two submitted archive/av DataFrames in st.session_state. The new layout keeps
+one shift_report.BatchDraft; the DataFrames are built only while a run displays
+or saves them. Memory is measured with tracemalloc while many sessions' states
+are held at once, and reported per session.
+
+Usage (from the repository root):
+    python -m benchmarks.session_memory
+    python -m benchmarks.session_memory --sessions 500 --single 10 --bulk 40
+"""
+import argparse
+import datetime
+import gc
+import random
+import sys
+import tracemalloc
+import pandas as pd
+from shift_report import DOWNTIME_TYPES, BatchDraft, batches_to_archive
+
+MACHINE = "Sieving/milling"
+
+
+def sample_batches(rng, single, bulk, products=5):
+    names = [f"PRODUCT {rng.randrange(10**6):06d} LEMON FLAVOR 1 SCOOP JAR ({rng.randrange(100)} gm)"
+             for _ in range(products)]
+    rows = []
+    for i in range(single + bulk):
+        rows.append((names[i % products], f"B{rng.randrange(10**7):07d}",
+                     round(rng.uniform(50, 500), 1), round(rng.uniform(0.2, 2), 1), round(rng.uniform(50, 400), 1)))
+    return rows[:single], rows[single:]
+
+
+def old_state(single_rows, bulk_rows, date):
+    """The former session-state layout, including the submitted DataFrames."""
+    product_batches = {}
+    for product, batch, quantity, time_consumed, _ in single_rows:
+        product_batches.setdefault(product, []).append(
+            {"batch": batch, "quantity": quantity, "time_consumed": time_consumed})
+    bulk = pd.DataFrame(bulk_rows, columns=["product", "batch", "quantity", "time_consumed", "standard_rate"])
+    bulk["product"] = bulk["product"].astype("category")
+
+    single = pd.DataFrame([(p, b, q, t, r) for p, b, q, t, r in single_rows],
+                          columns=["product", "batch", "quantity", "time_consumed", "standard_rate"])
+    archive = pd.concat([_downtime_rows(date), batches_to_archive(pd.concat([single, bulk]), date, MACHINE, "Day")],
+                        ignore_index=True)
+    av = pd.DataFrame([{"date": date, "machine": MACHINE, "shift type": "LD", "hours": 11.5, "shift": "Day",
+                        "T.production time": 10.0, "Availability": 0.87, "Av Efficiency": 0.9, "OEE": 0.77}])
+    return {"product_batches": product_batches, "bulk_batches": bulk,
+            "submitted_archive_df": archive, "submitted_av_df": av}
+
+
+def new_state(single_rows, bulk_rows):
+    draft = BatchDraft()
+    for product, batch, quantity, time_consumed, _ in single_rows:
+        draft.add(product, batch, quantity, time_consumed)
+    for product, batch, quantity, time_consumed, standard_rate in bulk_rows:
+        draft.add(product, batch, quantity, time_consumed, standard_rate, bulk=True)
+    return {"batch_draft": draft}
+
+
+def _downtime_rows(date):
+    return pd.DataFrame([{"Date": date, "Machine": MACHINE, "Day/Night/plan": "Day", "Activity": dt, "time": 0.5,
+                          "Product": "", "batch number": "", "quantity": "", "comments": "changeover",
+                          "rate": "", "standard rate": "", "efficiency": ""} for dt in DOWNTIME_TYPES[:3]])
+
+
+def measure(build, samples):
+    """Average traced bytes per session while all ``samples`` states are alive."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [build(*sample) for sample in samples]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del states
+    return (after - before) / len(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure per-session memory of shift form drafts.")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--single", type=int, default=10, help="Single-entry batches per session")
+    parser.add_argument("--bulk", type=int, default=40, help="Bulk batches per session")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    samples = [sample_batches(rng, args.single, args.bulk) for _ in range(args.sessions)]
+    date = datetime.date.today()
+    old = measure(lambda single, bulk: old_state(single, bulk, date), samples)
+    new = measure(new_state, samples)
+
+    print(f"Sessions: {args.sessions}, batches per session: {args.single} single + {args.bulk} bulk")
+    print(f"Old layout:  {old / 1024:8.1f} KiB per session")
+    print(f"BatchDraft:  {new / 1024:8.1f} KiB per session ({old / new:.0f}x smaller)")
+    print(f"For {args.sessions} sessions: {old * args.sessions / 1024 ** 2:.1f} MiB → "
+          f"{new * args.sessions / 1024 ** 2:.2f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
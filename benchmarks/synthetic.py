@@ -0,0 +1,152 @@
+"""
+Synthetic archive/av data generated from the bundled product, machine, rate and shift catalogs.
+
+Each (date, machine, shift) report gets a few downtime rows and production batches
+whose rates and efficiencies follow the same formulas as the shift output form.
+"""
+import datetime
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from master_sync import read_sheet, upsert_rows
+from migrations import migrate
+from history_import import copy_rows
+from planning import load_machine_families
+from shift_report import DOWNTIME_TYPES, load_shift_hours
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+ROWS_PER_SHIFT = 6      # 2 downtime rows + 4 production batches per report
+DOWNTIME_ROWS = 2
+SHIFTS = ["Day", "Night"]
+SHIFT_CODE = {"Day": "LD", "Night": "NS"}
+
+
+def load_catalogs(root=REPO_ROOT):
+    """Read the bundled machines, products, rates, shifts and machine families CSVs."""
+    rates = read_sheet("rates", os.path.join(root, "rates.csv"))
+    rates = rates[rates["standard_rate"] > 0].sort_values("machine").reset_index(drop=True)
+    return {
+        "machines": read_sheet("machines", os.path.join(root, "machines.csv")),
+        "products": read_sheet("products", os.path.join(root, "products.csv")),
+        "rates": rates,
+        "shift_hours": load_shift_hours(os.path.join(root, "shifts.csv")),
+        "machine_families": load_machine_families(os.path.join(root, "machine_families.csv")),
+    }
+
+
+def has_archive_rows(engine):
+    """Whether ``engine``'s database already holds archive rows (which load_synthetic() would truncate)."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass('archive')")).scalar():
+            return False
+        return bool(conn.execute(text("SELECT EXISTS (SELECT 1 FROM archive)")).scalar())
+
+
+def create_schema(engine, catalogs):
+    """Create the stand-in tables and load the master data."""
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        ddl = f.read()
+    with engine.begin() as conn:
+        for statement in ddl.split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+        conn.execute(text("INSERT INTO branches (branch_name) VALUES ('main') ON CONFLICT DO NOTHING"))
+        upsert_rows(conn, "machines", catalogs["machines"], ["name"], [])
+        products = catalogs["products"].assign(batch_size=1.0, units_per_box=1.0, primary_units_per_box=1.0, oracle_code="")
+        upsert_rows(conn, "products", products, ["name"], [])
+        upsert_rows(conn, "rates", catalogs["rates"], ["product", "machine"], ["standard_rate"])
+    migrate(engine)
+
+
+def generate_reports(catalogs, first_key, n_keys, end_date, seed=0):
+    """
+    Generate ``n_keys`` consecutive shift reports as (archive_df, av_df).
+    Report k covers day k // (machines * shifts) counted back from ``end_date``.
+    """
+    rng = np.random.default_rng(seed + first_key)
+    rates = catalogs["rates"]
+    machines = rates["machine"].unique()
+    starts = rates.groupby("machine", sort=True).indices
+    first_row = np.array([starts[m][0] for m in machines])
+    counts = np.array([len(starts[m]) for m in machines])
+
+    keys = np.arange(first_key, first_key + n_keys)
+    per_day = len(machines) * len(SHIFTS)
+    day = keys // per_day
+    machine_idx = (keys % per_day) // len(SHIFTS)
+    shift_idx = keys % len(SHIFTS)
+    dates = pd.Timestamp(end_date) - pd.to_timedelta(day, unit="D")
+
+    # One archive row per (report, slot); the first slots are downtime
+    report = np.repeat(np.arange(n_keys), ROWS_PER_SHIFT)
+    slot = np.tile(np.arange(ROWS_PER_SHIFT), n_keys)
+    production = slot >= DOWNTIME_ROWS
+    n_rows = len(report)
+
+    rate_row = first_row[machine_idx[report]] + (rng.random(n_rows) * counts[machine_idx[report]]).astype(int)
+    standard_rate = rates["standard_rate"].to_numpy()[rate_row]
+    efficiency = rng.uniform(0.5, 0.98, n_rows)
+    time_consumed = np.where(production, rng.uniform(0.5, 2.5, n_rows), rng.uniform(0.1, 1.0, n_rows)).round(2)
+    rate = standard_rate * efficiency
+    quantity = (rate * time_consumed).round(3)
+    rate = quantity / time_consumed
+    efficiency = rate / standard_rate
+
+    shift_names = np.array(SHIFTS)[shift_idx[report]]
+    archive = pd.DataFrame({
+        "Date": dates[report].strftime("%Y-%m-%d"),
+        "Machine": machines[machine_idx[report]],
+        "Day/Night/plan": shift_names,
+        "Activity": np.where(production, "Production", np.array(DOWNTIME_TYPES)[rng.integers(0, len(DOWNTIME_TYPES), n_rows)]),
+        "time": time_consumed,
+        "Product": np.where(production, rates["product"].to_numpy()[rate_row], ""),
+        # Batches are drawn from a shared pool so they show up on several machines
+        "batch number": np.where(production, np.char.add("B", rng.integers(0, max(n_keys, 1) * 2 + first_key, n_rows).astype(str)), ""),
+        "quantity": np.where(production, quantity, np.nan),
+        "comments": np.where(production, "", "synthetic downtime"),
+        "rate": np.where(production, rate, np.nan),
+        "standard rate": np.where(production, standard_rate, np.nan),
+        "efficiency": np.where(production, efficiency, np.nan),
+    })
+
+    production_time = np.bincount(report, weights=np.where(production, time_consumed, 0), minlength=n_keys)
+    efficiency_sum = np.bincount(report, weights=np.where(production, efficiency, 0), minlength=n_keys)
+    av_efficiency = efficiency_sum / (ROWS_PER_SHIFT - DOWNTIME_ROWS)
+    shift_codes = np.array([SHIFT_CODE[s] for s in SHIFTS])[shift_idx]
+    hours = np.array([catalogs["shift_hours"][c] for c in shift_codes], dtype="float64")
+    availability = production_time / hours
+
+    av = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "machine": machines[machine_idx],
+        "shift type": shift_codes,
+        "hours": hours,
+        "shift": np.array(SHIFTS)[shift_idx],
+        "T.production time": production_time,
+        "Availability": availability,
+        "Av Efficiency": av_efficiency,
+        "OEE": 0.99 * availability * av_efficiency,
+    })
+    return archive, av
+
+
+def load_synthetic(engine, catalogs, n_rows, end_date=None, chunk_rows=600_000, seed=0):
+    """Replace archive/av with ``n_rows`` synthetic archive rows, loaded with COPY in chunks."""
+    end_date = end_date or datetime.date.today()
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE archive, av"))
+
+    n_keys = -(-n_rows // ROWS_PER_SHIFT)
+    keys_per_chunk = max(chunk_rows // ROWS_PER_SHIFT, 1)
+    for first_key in range(0, n_keys, keys_per_chunk):
+        archive, av = generate_reports(catalogs, first_key, min(keys_per_chunk, n_keys - first_key), end_date, seed)
+        copy_rows(engine, "archive", archive)
+        copy_rows(engine, "av", av)
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE archive"))
+        conn.execute(text("ANALYZE av"))
+    return n_keys
@@ -0,0 +1,243 @@
+"""
+Change notifications for archive, av and rates writes.
+
+Writers describe what they touched as Change(branch, table, date, shift, machine)
+keys (None means "any"). notify() sends them with pg_notify inside the writer's
+transaction, so other app processes receive them only if it commits, and
+publish() hands them to this process's subscribers right after the commit.
+A listener thread per branch relays notifications from other processes, marked
+with where they come from ("host" for other processes on this host, "remote"
+for other hosts), so a subscriber can skip work the originating process did.
+
+notify() also appends the keys to the ``change_log`` table in the same
+transaction, so readers can poll it cheaply (change_watermark() /
+changes_since()) without holding a LISTEN connection. Ids are not assigned in
+commit order, so the watermark is based on transactions instead: each row records
+the transaction that wrote it, and a poll re-reads the rows of transactions that
+were still running at the previous poll, skipping the ones it already returned.
+The table is created by migrations.py.
+"""
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+import pandas as pd
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy.sql import text
+
+CHANNEL = "app_changes"
+ALL_TABLES = "*"               # Table of the reset published after a listener reconnects
+MAX_PAYLOAD_BYTES = 7000       # NOTIFY payloads must stay under 8000 bytes
+RECONNECT_SECONDS = 5
+LOG_RETENTION_DAYS = 7
+LOG_PRUNE_SECONDS = 3600
+
+CREATE_CHANGE_LOG = """
+    CREATE TABLE IF NOT EXISTS change_log (
+        id BIGSERIAL PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        date DATE,
+        shift TEXT,
+        machine TEXT,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        xid XID8 NOT NULL DEFAULT pg_current_xact_id()
+    )
+"""
+# Tables created before rows recorded their transaction
+ADD_CHANGE_LOG_XID = "ALTER TABLE change_log ADD COLUMN IF NOT EXISTS xid XID8 NOT NULL DEFAULT pg_current_xact_id()"
+CREATE_CHANGE_LOG_XID_INDEX = "CREATE INDEX IF NOT EXISTS change_log_xid_idx ON change_log (xid)"
+
+# Rows of transactions not finished at the previous poll, read in the same snapshot as the
+# oldest transaction still running (every older one has finished, so its rows are visible)
+CHANGES_SINCE_QUERY = """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS xmin, c.id, c.xid::text,
+           c.table_name, c.date, c.shift, c.machine
+    FROM (SELECT 1) AS one
+    LEFT JOIN LATERAL (
+        SELECT id, xid, table_name, date, shift, machine FROM change_log
+        WHERE xid >= CAST(:xmin AS xid8) AND NOT (id = ANY(:seen))
+        ORDER BY id LIMIT :limit
+    ) AS c ON true
+"""
+
+Change = namedtuple("Change", ["branch", "table", "date", "shift", "machine"])
+
+# Notifications sent by this process are skipped by its own listeners
+ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+HOST = socket.gethostname()
+SOURCES = ("local", "host", "remote")   # This process, another one on this host, another host
+
+_subscribers = []   # (callback, tables or None, sources)
+_listeners = {}     # branch -> listener thread
+_lock = threading.Lock()
+_log_pruned = {}    # Engine -> time.monotonic() of the last prune
+
+
+def report_changes(branch, df, tables=("archive", "av")):
+    """Keys for every (date, shift, machine) in a saved or deleted av frame."""
+    keys = df[["date", "shift", "machine"]].drop_duplicates()
+    return [
+        Change(branch, table, str(pd.Timestamp(date).date()), shift, machine)
+        for date, shift, machine in keys.itertuples(index=False, name=None)
+        for table in tables
+    ]
+
+
+def date_changes(branch, table, dates):
+    """Keys for whole dates of one table, e.g. after a bulk import."""
+    return [Change(branch, table, str(pd.Timestamp(d).date()), None, None) for d in sorted(set(dates)) if pd.notna(d)]
+
+
+def subscribe(callback, tables=None, sources=SOURCES):
+    """
+    Call ``callback(changes)`` with every published batch touching ``tables`` (all when
+    None) that comes from one of ``sources``.
+    """
+    with _lock:
+        _subscribers.append((callback, set(tables) if tables else None, set(sources)))
+
+
+def publish(changes, source="local"):
+    """Deliver changes to this process's subscribers (call after the transaction commits)."""
+    changes = list(changes)
+    if not changes:
+        return
+    with _lock:
+        subscribers = [(callback, tables) for callback, tables, sources in _subscribers if source in sources]
+    for callback, tables in subscribers:
+        selected = [c for c in changes if tables is None or c.table in tables or c.table == ALL_TABLES]
+        if selected:
+            try:
+                callback(selected)
+            except Exception as e:
+                print(f"❌ Change subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def ensure_change_log(conn):
+    """Create the change_log table (a migration step, see migrations.py)."""
+    conn.execute(text(CREATE_CHANGE_LOG))
+    conn.execute(text(ADD_CHANGE_LOG_XID))
+    conn.execute(text(CREATE_CHANGE_LOG_XID_INDEX))
+
+
+def _log(conn, changes):
+    conn.execute(
+        text("INSERT INTO change_log (table_name, date, shift, machine) VALUES (:table, :date, :shift, :machine)"),
+        [{"table": c.table, "date": c.date, "shift": c.shift, "machine": c.machine} for c in changes],
+    )
+    key = str(conn.engine.url)
+    if time.monotonic() - _log_pruned.get(key, float("-inf")) > LOG_PRUNE_SECONDS:
+        conn.execute(text("DELETE FROM change_log WHERE changed_at < now() - make_interval(days => :days)"),
+                     {"days": LOG_RETENTION_DAYS})
+        _log_pruned[key] = time.monotonic()
+
+
+def change_watermark(conn):
+    """
+    The change_log position reached so far, for changes_since(). Take it before
+    reading the data it covers.
+    """
+    xmin = conn.execute(text("SELECT pg_snapshot_xmin(pg_current_snapshot())::text")).scalar()
+    return int(xmin), ()
+
+
+def changes_since(conn, watermark, limit=1000):
+    """
+    Returns (changes, watermark): the (id, Change) pairs committed since ``watermark``,
+    in id order, and the watermark to pass next time. ``branch`` is None (one
+    database per branch).
+
+    A watermark is (xmin, seen): every transaction older than xmin had committed or
+    aborted when it was taken, and ``seen`` holds the (id, xid) of rows already
+    returned from newer transactions. When ``limit`` cuts the list short, xmin stays
+    put and the returned rows are only added to ``seen``.
+    """
+    if not conn.execute(text("SELECT to_regclass('change_log')")).scalar():
+        return [], watermark
+    xmin, seen = watermark
+    rows = conn.execute(text(CHANGES_SINCE_QUERY),
+                        {"xmin": str(xmin), "seen": [id_ for id_, _ in seen], "limit": limit}).fetchall()
+    new_xmin = int(rows[0][0])
+    rows = [row for row in rows if row[1] is not None]
+    changes = [(row[1], Change(None, row[3], str(row[4]) if row[4] else None, row[5], row[6])) for row in rows]
+    seen = seen + tuple((row[1], int(row[2])) for row in rows)
+    if len(rows) >= limit:
+        return changes, (xmin, seen)
+    # Rows of transactions at or after the new xmin are read again next time and skipped then
+    return changes, (new_xmin, tuple((id_, xid) for id_, xid in seen if xid >= new_xmin))
+
+
+def notify(conn, changes):
+    """Log the changes and queue them as NOTIFY payloads inside the writer's transaction."""
+    changes = list(changes)
+    if not changes:
+        return
+    _log(conn, changes)
+    batch, size = [], 0
+    for change in changes:
+        item = list(change)
+        item_size = len(json.dumps(item)) + 2
+        if batch and size + item_size > MAX_PAYLOAD_BYTES:
+            _send(conn, batch)
+            batch, size = [], 0
+        batch.append(item)
+        size += item_size
+    if batch:
+        _send(conn, batch)
+
+
+def _send(conn, items):
+    payload = json.dumps({"origin": ORIGIN, "host": HOST, "changes": items})
+    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+
+
+def _connect(engine):
+    """A dedicated autocommit connection outside the pool (LISTEN holds it open)."""
+    args = engine.url.translate_connect_args(username="user", database="dbname")
+    conn = psycopg2.connect(**args, **engine.url.query)
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    return conn
+
+
+def _listen(engine, branch):
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = _connect(engine)
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            if connected_before:
+                # Notifications from anywhere may have been missed while disconnected
+                publish([Change(branch, ALL_TABLES, None, None, None)], source="remote")
+            connected_before = True
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    message = json.loads(conn.notifies.pop(0).payload)
+                    if message.get("origin") != ORIGIN:
+                        source = "host" if message.get("host") == HOST else "remote"
+                        publish((Change(*item) for item in message["changes"]), source)
+        except Exception as e:
+            print(f"⚠️ Change listener for {branch} disconnected: {e}")
+            time.sleep(RECONNECT_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener(engine, branch):
+    """Start relaying other processes' notifications for ``branch`` (once per process)."""
+    with _lock:
+        if branch in _listeners:
+            return
+        thread = threading.Thread(target=_listen, args=(engine, branch), daemon=True, name=f"change-feed-{branch}")
+        _listeners[branch] = thread
+    thread.start()
@@ -0,0 +1,424 @@
+"""
+Headless ingestion service for machine counters.
+
+Line machines POST count/state events; they are buffered in memory per branch
+and written to the ``machine_events`` table in micro-batches with COPY. When a
+shift has closed, each machine's events are rolled up into the same ``archive``
+Production/downtime rows and ``av`` row the shift output form produces, using
+the form's rate, efficiency and OEE formulas. A shift that already has a report
+(entered by hand or rolled up earlier) is left untouched.
+
+Events are JSON objects, posted as a JSON array or one object per line:
+
+    {"machine": "M1", "ts": "2026-10-19T08:15:02", "state": "Production",
+     "product": "P100", "batch": "B1", "count": 12}
+
+``state`` is "Production" or one of the downtime types; the machine stays in a
+state until its next event, however long that takes. A machine's latest event
+counts for at most STATE_TIMEOUT_SECONDS, so a machine that stops reporting is
+not counted until the end of the shift. ``count`` is
+the number of units made since the previous event. Each buffer holds at most
+MAX_BUFFERED_EVENTS; when it is full the service answers 503 and the sender
+retries later.
+
+Senders must pass the shared token from secrets ([counter_ingest] token = "...")
+as "Authorization: Bearer <token>". The service listens on localhost unless
+--host says otherwise. The machine_events table is created by migrations.py.
+
+Usage:
+    python counter_ingest.py --port 8600 --branch main --branch plant2
+    curl -X POST -H "Authorization: Bearer $TOKEN" --data-binary @events.ndjson \
+        "http://localhost:8600/events?branch=main"
+"""
+import argparse
+import csv
+import datetime
+import hmac
+import io
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+import streamlit as st
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine
+from shift_report import (
+    DOWNTIME_TYPES, batch_metrics, clean_dataframe, load_machine_rates, load_shift_hours, report_exists,
+    save_shift_report, shift_metrics,
+)
+
+STATES = ["Production"] + DOWNTIME_TYPES
+BATCH_SIZE = 5000
+FLUSH_SECONDS = 1.0
+MAX_BUFFERED_EVENTS = 200_000     # Per branch; about 200 bytes each
+MAX_BODY_BYTES = 16 * 1024 * 1024
+STATE_TIMEOUT_SECONDS = 900       # A machine's latest state is not counted past this without a newer event
+ROLLUP_SECONDS = 60
+ROLLUP_GRACE_SECONDS = 300        # Wait for late events before rolling up a closed shift
+ROLLUP_LOOKBACK_SHIFTS = 4        # Closed shifts re-checked after a restart
+ROLLUP_COMMENT = "Recorded by machine counter"
+
+# Shift name -> (start time, shifts.csv code); each shift runs until the next one starts
+SHIFT_WINDOWS = {
+    "Day": (datetime.time(7, 0), "LD"),
+    "Night": (datetime.time(19, 0), "NS"),
+}
+
+EVENT_COLUMNS = ["machine", "ts", "state", "product", "batch", "count"]
+
+
+def ensure_event_table(engine):
+    """Create machine_events and its indexes (a migration step, see migrations.py)."""
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS machine_events (
+                machine TEXT NOT NULL,
+                ts TIMESTAMP NOT NULL,
+                state TEXT NOT NULL,
+                product TEXT NOT NULL DEFAULT '',
+                batch TEXT NOT NULL DEFAULT '',
+                count DOUBLE PRECISION NOT NULL DEFAULT 0,
+                received_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS machine_events_machine_ts_idx ON machine_events (machine, ts)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS machine_events_ts_idx ON machine_events (ts)"))
+
+
+def parse_timestamp(value):
+    """ISO 8601 text or epoch seconds → naive plant-local datetime."""
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value)
+    ts = datetime.datetime.fromisoformat(value)
+    return ts.astimezone().replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def parse_event(event):
+    """Validate one event and return its row in EVENT_COLUMNS order."""
+    if not isinstance(event, dict):
+        raise ValueError("event is not a JSON object")
+    machine = str(event.get("machine") or "").strip()
+    if not machine:
+        raise ValueError("missing machine")
+    state = event.get("state", "Production")
+    if state not in STATES:
+        raise ValueError(f"unknown state {state!r}")
+    count = float(event.get("count") or 0)
+    if count < 0:
+        raise ValueError("negative count")
+    return (machine, parse_timestamp(event["ts"]), state,
+            str(event.get("product") or ""), str(event.get("batch") or ""), count)
+
+
+def parse_body(body):
+    """Events from a JSON array or newline-delimited JSON. Returns (rows, errors)."""
+    body = body.strip()
+    if not body:
+        return [], []
+    if body.startswith(b"["):
+        events = json.loads(body)
+    else:
+        events = [json.loads(line) for line in body.splitlines() if line.strip()]
+    rows, errors = [], []
+    for i, event in enumerate(events):
+        try:
+            rows.append(parse_event(event))
+        except (KeyError, TypeError, ValueError) as e:
+            errors.append({"index": i, "error": str(e)})
+    return rows, errors
+
+
+class EventBuffer:
+    """Bounded in-memory buffer of one branch's events, flushed by its own thread."""
+
+    def __init__(self, branch, max_events=MAX_BUFFERED_EVENTS):
+        self.branch = branch
+        self.max_events = max_events
+        self.rows = []
+        self.cond = threading.Condition()
+        self.written = 0
+        self.failures = 0
+        self.last_error = None
+
+    def add(self, rows):
+        """Buffer ``rows``; returns False (nothing buffered) when they do not fit."""
+        with self.cond:
+            if len(self.rows) + len(rows) > self.max_events:
+                return False
+            self.rows.extend(rows)
+            if len(self.rows) >= BATCH_SIZE:
+                self.cond.notify()
+            return True
+
+    def take(self):
+        """Wait for a full batch or FLUSH_SECONDS, then remove and return up to BATCH_SIZE rows."""
+        with self.cond:
+            if len(self.rows) < BATCH_SIZE:
+                self.cond.wait(FLUSH_SECONDS)
+            batch, self.rows = self.rows[:BATCH_SIZE], self.rows[BATCH_SIZE:]
+            return batch
+
+    def put_back(self, batch):
+        with self.cond:
+            self.rows[:0] = batch
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def write_events(engine, rows):
+    """COPY a batch of parsed events into machine_events."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY machine_events ({', '.join(EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _flush_loop(buffer, engine):
+    backoff = FLUSH_SECONDS
+    while True:
+        batch = buffer.take()
+        if not batch:
+            continue
+        try:
+            write_events(engine, batch)
+            buffer.written += len(batch)
+            backoff = FLUSH_SECONDS
+        except Exception as e:
+            # Keep the events; the bounded buffer pushes back on senders while the database is away
+            buffer.put_back(batch)
+            buffer.failures += 1
+            buffer.last_error = str(e)[:500]
+            print(f"⚠️ Could not write {len(batch)} events for {buffer.branch}, retrying in {backoff:.0f}s: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+
+# ✅ Shift rollups
+
+def shift_window(date, shift):
+    """(start, end) datetimes of a counter shift starting on ``date``."""
+    names = list(SHIFT_WINDOWS)
+    start = datetime.datetime.combine(date, SHIFT_WINDOWS[shift][0])
+    next_shift = names[(names.index(shift) + 1) % len(names)]
+    end = datetime.datetime.combine(date, SHIFT_WINDOWS[next_shift][0])
+    if end <= start:
+        end += datetime.timedelta(days=1)
+    return start, end
+
+
+def closed_shifts(now, lookback=ROLLUP_LOOKBACK_SHIFTS):
+    """The latest ``lookback`` shifts that ended at least ROLLUP_GRACE_SECONDS before ``now``."""
+    cutoff = now - datetime.timedelta(seconds=ROLLUP_GRACE_SECONDS)
+    windows = []
+    day = cutoff.date()
+    while len(windows) < lookback:
+        for shift in reversed(list(SHIFT_WINDOWS)):
+            start, end = shift_window(day, shift)
+            if end <= cutoff and len(windows) < lookback:
+                windows.append((day, shift, start, end))
+        day -= datetime.timedelta(days=1)
+    return windows
+
+
+def load_shift_events(conn, machine, start, end):
+    """
+    Events of ``machine`` in [start, end) plus the last one before ``start`` (the state
+    carried in) and the first one from ``end`` on (which ends the last state of the shift).
+    """
+    return pd.read_sql(text("""
+        (SELECT ts, state, product, batch, count FROM machine_events
+         WHERE machine = :machine AND ts < :start ORDER BY ts DESC LIMIT 1)
+        UNION ALL
+        (SELECT ts, state, product, batch, count FROM machine_events
+         WHERE machine = :machine AND ts >= :start AND ts < :end)
+        UNION ALL
+        (SELECT ts, state, product, batch, count FROM machine_events
+         WHERE machine = :machine AND ts >= :end ORDER BY ts LIMIT 1)
+        ORDER BY ts
+    """), conn, params={"machine": machine, "start": start, "end": end})
+
+
+def state_intervals(events, start, end):
+    """Hours spent in each event's state inside [start, end)."""
+    ts = pd.to_datetime(events["ts"])
+    # Each state lasts until the next event; only the latest event, without one, times out
+    until = ts.shift(-1).fillna(ts + pd.Timedelta(seconds=STATE_TIMEOUT_SECONDS))
+    begin = ts.clip(lower=pd.Timestamp(start))
+    until = until.clip(upper=pd.Timestamp(end))
+    return ((until - begin).dt.total_seconds().clip(lower=0) / 3600).to_numpy()
+
+
+def rollup_machine_shift(events, rates, date, machine, shift, start, end, shift_hours):
+    """Build the (archive_df, av_df) of one machine and shift from its events, or None when it did not run."""
+    events = events.assign(hours=state_intervals(events, start, end))
+    ts = pd.to_datetime(events["ts"])
+    in_shift = (ts >= pd.Timestamp(start)) & (ts < pd.Timestamp(end))
+    events["count"] = events["count"].where(in_shift, 0)
+    if events["hours"].sum() == 0 and events["count"].sum() == 0:
+        return None
+
+    downtime = (events[events["state"] != "Production"]
+                .groupby("state", sort=False)["hours"].sum().round(2))
+    downtime = downtime[downtime > 0]
+    archive_rows = [{
+        "Date": date, "Machine": machine, "Day/Night/plan": shift, "Activity": state,
+        "time": hours, "Product": "", "batch number": "", "quantity": "",
+        "comments": ROLLUP_COMMENT, "rate": "", "standard rate": "", "efficiency": "",
+    } for state, hours in downtime.items()]
+
+    events["hours"] = events["hours"].where(events["state"] == "Production", 0)
+    production = (events[(events["state"] == "Production") | (events["count"] > 0)]
+                  .groupby(["product", "batch"], sort=False)
+                  .agg(time=("hours", "sum"), quantity=("count", "sum"))
+                  .reset_index())
+    production = production[(production["time"] > 0) | (production["quantity"] > 0)]
+    production["time"] = production["time"].round(2)
+    # Same fallback as the form: a product without a standard rate is measured against 1
+    standard_rate = production["product"].map(rates).fillna(1).to_numpy()
+    rate, efficiency = batch_metrics(production["quantity"], production["time"], standard_rate)
+    for i, row in enumerate(production.itertuples(index=False)):
+        archive_rows.append({
+            "Date": date, "Machine": machine, "Day/Night/plan": shift, "Activity": "Production",
+            "time": row.time, "Product": row.product, "batch number": row.batch, "quantity": row.quantity,
+            "comments": "", "rate": rate[i], "standard rate": standard_rate[i], "efficiency": efficiency[i],
+        })
+
+    production_time = float(production["time"].sum())
+    availability, average_efficiency, oee = shift_metrics(
+        production_time, float(downtime.sum()), shift_hours, efficiency)
+    av_df = pd.DataFrame([{
+        "date": date, "machine": machine, "shift type": SHIFT_WINDOWS[shift][1], "hours": shift_hours,
+        "shift": shift, "T.production time": production_time,
+        "Availability": availability, "Av Efficiency": average_efficiency, "OEE": oee,
+    }])
+    return clean_dataframe(pd.DataFrame(archive_rows)), av_df
+
+
+def rollup_closed_shifts(engine, branch, shift_hours, now=None):
+    """Roll up every machine with events in the recent closed shifts that has no report yet."""
+    saved = []
+    for date, shift, start, end in closed_shifts(now or datetime.datetime.now()):
+        with engine.connect() as conn:
+            machines = conn.execute(text(
+                "SELECT DISTINCT machine FROM machine_events WHERE ts >= :start AND ts < :end"
+            ), {"start": start, "end": end}).scalars().all()
+        for machine in machines:
+            if report_exists(engine, date, shift, machine):
+                continue
+            with engine.connect() as conn:
+                events = load_shift_events(conn, machine, start, end)
+            report = rollup_machine_shift(events, load_machine_rates(engine, machine), date, machine, shift,
+                                          start, end, shift_hours[SHIFT_WINDOWS[shift][1]])
+            if report is None:
+                continue
+            save_shift_report(engine, *report, branch=branch)
+            saved.append((date, shift, machine))
+            print(f"✅ {branch}: rolled up {machine} {date} {shift} from machine counters")
+    return saved
+
+
+def _rollup_loop(engine, branch, shift_hours):
+    while True:
+        try:
+            rollup_closed_shifts(engine, branch, shift_hours)
+        except Exception as e:
+            print(f"❌ Counter rollup for {branch} failed: {e}")
+        time.sleep(ROLLUP_SECONDS)
+
+
+# ✅ HTTP service
+
+def load_token():
+    """The shared token senders must present, from secrets."""
+    return st.secrets.get("counter_ingest", {}).get("token", "")
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    buffers = {}
+    token = ""
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, {branch: {"buffered": len(buffer), "written": buffer.written,
+                                   "failures": buffer.failures, "last_error": buffer.last_error}
+                          for branch, buffer in self.buffers.items()})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/events":
+            return self._reply(404, {"error": "not found"})
+        presented = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not self.token or not hmac.compare_digest(presented.encode(), self.token.encode()):
+            return self._reply(401, {"error": "missing or wrong token"})
+        branch = parse_qs(url.query).get("branch", ["main"])[0]
+        buffer = self.buffers.get(branch)
+        if buffer is None:
+            return self._reply(404, {"error": f"branch {branch!r} is not served here"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            return self._reply(413, {"error": f"body larger than {MAX_BODY_BYTES} bytes"})
+        try:
+            rows, errors = parse_body(self.rfile.read(length))
+        except ValueError as e:
+            return self._reply(400, {"error": f"invalid JSON: {e}"})
+        if rows and not buffer.add(rows):
+            return self._reply(503, {"error": "buffer full, retry later"})
+        self._reply(202 if not errors else 207, {"accepted": len(rows), "rejected": errors[:100]})
+
+    def log_message(self, format, *args):
+        pass  # One line per request would swamp the console at thousands of events per second
+
+
+def serve(branches, host="127.0.0.1", port=8600, rollups=True, token=None):
+    IngestHandler.token = token or load_token()
+    if not IngestHandler.token:
+        raise SystemExit("❌ No [counter_ingest] token in secrets; refusing to accept unauthenticated events")
+    shift_hours = load_shift_hours()
+    for branch in branches:
+        engine = get_sqlalchemy_engine(branch)
+        buffer = EventBuffer(branch)
+        IngestHandler.buffers[branch] = buffer
+        threading.Thread(target=_flush_loop, args=(buffer, engine), daemon=True, name=f"events-{branch}").start()
+        if rollups:
+            threading.Thread(target=_rollup_loop, args=(engine, branch, shift_hours), daemon=True,
+                             name=f"rollup-{branch}").start()
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    print(f"✅ Accepting machine events on http://{host}:{port}/events for {', '.join(branches)}")
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest machine counter events over HTTP.")
+    parser.add_argument("--branch", action="append", help="Branch to serve (repeatable, default: main)")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for every interface)")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--no-rollup", action="store_true", help="Only store raw events")
+    args = parser.parse_args(argv)
+    try:
+        serve(args.branch or ["main"], args.host, args.port, rollups=not args.no_rollup)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+Rendering of the Machine Performance Dashboard as a downloadable PDF or HTML report.
+
+Kept out of the page so the export jobs can build reports in the background.
+"""
+import io
+import plotly.express as px
+import plotly.io as pio
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from bs4 import BeautifulSoup
+
+TABLE_ROWS = 8  # Rows printed per table in the PDF; the HTML report has them all
+
+
+def performance_figure(df_av):
+    """Availability, efficiency and OEE per machine."""
+    return px.bar(df_av, x="machine", y=["Availability", "Av Efficiency", "OEE"],
+                  barmode="group", title="Performance Metrics per Machine",
+                  color_discrete_map={"Availability": "#1f77b4", "Av Efficiency": "#ff7f0e", "OEE": "#2ca02c"})
+
+
+def add_table(c, title, df, y):
+    """Draw a title and the first rows of ``df`` as plain text starting at height ``y``."""
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, title)
+    c.setFont("Helvetica", 7)
+    y -= 14
+    if df.empty:
+        c.drawString(50, y, "No data")
+        return
+    c.drawString(50, y, " | ".join(str(col) for col in df.columns)[:150])
+    for row in df.head(TABLE_ROWS).itertuples(index=False):
+        y -= 10
+        c.drawString(50, y, " | ".join(str(value) for value in row)[:150])
+    if len(df) > TABLE_ROWS:
+        c.drawString(50, y - 10, f"… {len(df) - TABLE_ROWS} more rows")
+
+
+def create_pdf(df_av, df_archive, df_production, fig=None):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+
+    # ✅ Set PDF Title
+    c.setTitle("Machine Performance Report")
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(50, 750, "📊 Machine Performance Report")
+
+    # ✅ Convert Plotly graph to high-quality PNG
+    if fig is None and not df_av.empty:
+        fig = performance_figure(df_av)
+    if fig is not None:
+        img_buf = io.BytesIO()
+        pio.write_image(fig, img_buf, format="png", scale=3)
+        img_buf.seek(0)
+        c.drawImage(ImageReader(img_buf), 50, 500, width=500, height=200)
+
+    # ✅ Add tables
+    add_table(c, "📋 Machine Activity Summary", df_archive, 450)
+    add_table(c, "🏭 Production Summary", df_production, 300)
+    add_table(c, "📈 AV Data", df_av, 150)
+
+    # ✅ Save PDF
+    c.save()
+    return buffer.getvalue()
+
+
+def generate_full_html(df_av, df_archive, df_production, fig=None):
+    if fig is None and not df_av.empty:
+        fig = performance_figure(df_av)
+    fig_html = fig.to_html(full_html=False) if fig is not None else ""
+
+    raw_html = f"""
+    <html>
+    <head>
+        <title>Machine Performance Report</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; padding: 20px; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 20px 0; }}
+            th, td {{ border: 1px solid black; padding: 8px; text-align: left; }}
+            th {{ background-color: #f2f2f2; }}
+            .graph-container {{ text-align: center; margin: 20px 0; }}
+        </style>
+    </head>
+    <body>
+        <h1>📊 Machine Performance Report</h1>
+        <div class="graph-container">{fig_html}</div>
+        <h2>📋 Machine Activity Summary</h2>
+        {df_archive.to_html(index=False)}
+        <h2>🏭 Production Summary</h2>
+        {df_production.to_html(index=False)}
+        <h2>📈 AV Data</h2>
+        {df_av.to_html(index=False)}
+    </body>
+    </html>
+    """
+
+    # Minify and clean HTML using BeautifulSoup
+    soup = BeautifulSoup(raw_html, "html.parser")
+    return soup.prettify(formatter="minimal")
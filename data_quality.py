@@ -0,0 +1,205 @@
+"""
+Data-quality audit of saved shift reports.
+
+Runs the shift output form's entry checks, plus consistency checks between
+``av`` and the summed ``archive`` time, over any date range. Rows that were
+imported or saved before a check existed are covered too. Each branch is read
+in chunks of CHUNK_DAYS and checked with vectorized pandas rules. Branches are
+audited in parallel.
+
+Usage:
+    python data_quality.py --start 2025-01-01 --end 2025-12-31 --out violations.csv
+    python data_quality.py --start 2025-01-01 --end 2025-12-31 --branch main --branch plant2
+"""
+import argparse
+import datetime
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_branches, get_sqlalchemy_engine
+
+CHUNK_DAYS = 92            # A quarter of rows per read keeps memory bounded on years of history
+MAX_WORKERS = 4
+TIME_TOLERANCE = 0.01          # Hours
+LOW_TIME_SHARE = 0.9           # The form warns below 90% of the standard shift time
+
+RULES = {
+    "efficiency above 1": "Production batch efficiency above 100%",
+    "downtime without comment": "Downtime entry without the required comment",
+    "invalid time": "Missing or negative time",
+    "production without batch": "Production row without product or batch number",
+    "time above shift hours": "Recorded time exceeds the standard shift time",
+    "time below 90% of shift hours": "Recorded time is less than 90% of the standard shift time",
+    "production time mismatch": "av T.production time differs from the archive production time",
+    "availability mismatch": "av Availability differs from production time / shift hours",
+    "av efficiency above 1": "av Av Efficiency above 100%",
+    "OEE above 1": "av OEE above 100%",
+    "av without archive": "av row with no archive rows for the shift",
+    "archive without av": "archive rows with no av row for the shift",
+}
+
+VIOLATION_COLUMNS = ["date", "shift", "machine", "table", "rule", "value", "expected"]
+
+ARCHIVE_QUERY = """
+    SELECT "Date", "Machine", "Day/Night/plan", "Activity", time, "Product", "batch number", comments, efficiency
+    FROM archive WHERE "Date" BETWEEN :start AND :end
+"""
+AV_QUERY = """
+    SELECT date, machine, shift, "shift type", hours, "T.production time", "Availability", "Av Efficiency", "OEE"
+    FROM av WHERE date BETWEEN :start AND :end
+"""
+
+
+def _hits(df, mask, table, rule, value=None, expected=None, keys=("Date", "Day/Night/plan", "Machine")):
+    mask = np.asarray(mask, dtype=bool)
+    hit = df[mask]
+    return pd.DataFrame({
+        "date": hit[keys[0]].to_numpy(),
+        "shift": hit[keys[1]].to_numpy(),
+        "machine": hit[keys[2]].to_numpy(),
+        "table": table,
+        "rule": rule,
+        "value": np.broadcast_to(np.asarray(value, dtype="float64"), mask.shape)[mask] if value is not None else np.nan,
+        "expected": np.broadcast_to(np.asarray(expected, dtype="float64"), mask.shape)[mask] if expected is not None else np.nan,
+    })
+
+
+def _blank(series):
+    return series.isna() | series.astype(str).str.strip().eq("")
+
+
+def audit_frames(archive, av):
+    """All rule violations in one chunk of archive and av rows."""
+    found = []
+
+    # ✅ Row checks on archive (the form's entry checks)
+    production = archive["Activity"].eq("Production")
+    time_ = pd.to_numeric(archive["time"], errors="coerce")
+    efficiency = pd.to_numeric(archive["efficiency"], errors="coerce")
+    found.append(_hits(archive, production & (efficiency > 1), "archive", "efficiency above 1", efficiency, 1))
+    found.append(_hits(archive, ~production & (time_ > 0) & _blank(archive["comments"]),
+                       "archive", "downtime without comment", time_))
+    found.append(_hits(archive, time_.isna() | (time_ < 0), "archive", "invalid time", time_))
+    found.append(_hits(archive, production & (_blank(archive["Product"]) | _blank(archive["batch number"])),
+                       "archive", "production without batch"))
+
+    # ✅ Row checks on av
+    av_keys = ("date", "shift", "machine")
+    for col, rule in (("Av Efficiency", "av efficiency above 1"), ("OEE", "OEE above 1")):
+        values = pd.to_numeric(av[col], errors="coerce")
+        found.append(_hits(av, values > 1, "av", rule, values, 1, av_keys))
+
+    # ✅ Shift totals: archive time summed per (date, shift, machine) against the av row
+    totals = (archive.assign(time=time_, production_time=time_.where(production, 0))
+              .groupby(["Date", "Day/Night/plan", "Machine"], dropna=False)[["time", "production_time"]].sum()
+              .reset_index()
+              .rename(columns={"Date": "date", "Day/Night/plan": "shift", "Machine": "machine"}))
+    shifts = totals.merge(av, on=list(av_keys), how="outer", indicator=True)
+    found.append(_hits(shifts, shifts["_merge"].eq("right_only"), "av", "av without archive", keys=av_keys))
+    found.append(_hits(shifts, shifts["_merge"].eq("left_only"), "archive", "archive without av",
+                       shifts["time"], keys=av_keys))
+
+    both = shifts["_merge"].eq("both")
+    hours = pd.to_numeric(shifts["hours"], errors="coerce")
+    recorded = shifts["time"]
+    av_production = pd.to_numeric(shifts["T.production time"], errors="coerce")
+    availability = pd.to_numeric(shifts["Availability"], errors="coerce")
+    has_hours = both & (hours > 0)
+    partial = shifts["shift type"].astype(str).str.lower().eq("partial")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected_availability = av_production / hours
+
+    found.append(_hits(shifts, has_hours & (recorded > hours + TIME_TOLERANCE),
+                       "av", "time above shift hours", recorded, hours, av_keys))
+    found.append(_hits(shifts, has_hours & ~partial & (recorded < LOW_TIME_SHARE * hours - TIME_TOLERANCE),
+                       "av", "time below 90% of shift hours", recorded, LOW_TIME_SHARE * hours, av_keys))
+    found.append(_hits(shifts, both & ((av_production - shifts["production_time"]).abs() > TIME_TOLERANCE),
+                       "av", "production time mismatch", av_production, shifts["production_time"], av_keys))
+    found.append(_hits(shifts, has_hours & ~partial & ((availability - expected_availability).abs() > TIME_TOLERANCE),
+                       "av", "availability mismatch", availability, expected_availability, av_keys))
+
+    found = [df for df in found if not df.empty]
+    if not found:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    return pd.concat(found, ignore_index=True)
+
+
+def date_chunks(start, end, days=CHUNK_DAYS):
+    start, end = pd.Timestamp(start).date(), pd.Timestamp(end).date()
+    while start <= end:
+        chunk_end = min(start + datetime.timedelta(days=days - 1), end)
+        yield start, chunk_end
+        start = chunk_end + datetime.timedelta(days=1)
+
+
+def audit_branch(engine, branch, start, end, chunk_days=CHUNK_DAYS):
+    """Violations of one branch between two dates, read and checked chunk by chunk."""
+    found = []
+    for chunk_start, chunk_end in date_chunks(start, end, chunk_days):
+        params = {"start": chunk_start, "end": chunk_end}
+        with engine.connect() as conn:
+            archive = pd.read_sql(text(ARCHIVE_QUERY), conn, params=params, parse_dates=["Date"])
+            av = pd.read_sql(text(AV_QUERY), conn, params=params, parse_dates=["date"])
+        violations = audit_frames(archive, av)
+        if not violations.empty:
+            found.append(violations)
+    if not found:
+        return pd.DataFrame(columns=["branch"] + VIOLATION_COLUMNS)
+    violations = pd.concat(found, ignore_index=True)
+    violations.insert(0, "branch", branch)
+    return violations
+
+
+def audit_branches(branches, start, end, max_workers=MAX_WORKERS, engine_for=get_sqlalchemy_engine):
+    """
+    Audit several branches in parallel.
+    Returns (violations, errors): all violations, sorted, and {branch: error message}.
+    """
+    results, errors = [], {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(branches)))) as pool:
+        futures = {pool.submit(audit_branch, engine_for(branch), branch, start, end): branch for branch in branches}
+        for future in as_completed(futures):
+            branch = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors[branch] = str(e)
+                print(f"❌ Audit of {branch} failed: {e}")
+    results = [df for df in results if not df.empty]
+    if not results:
+        return pd.DataFrame(columns=["branch"] + VIOLATION_COLUMNS), errors
+    violations = pd.concat(results, ignore_index=True)
+    return violations.sort_values(["branch", "date", "shift", "machine", "rule"]).reset_index(drop=True), errors
+
+
+def summarize(violations):
+    """Violation counts per rule (rows) and branch (columns)."""
+    if violations.empty:
+        return pd.DataFrame()
+    return violations.pivot_table(index="rule", columns="branch", values="table", aggfunc="size", fill_value=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit saved shift reports for data-quality violations.")
+    parser.add_argument("--start", required=True, help="First date (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--branch", action="append", help="Branch to audit (repeatable, default: all)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--out", default="violations.csv")
+    args = parser.parse_args(argv)
+
+    branches = args.branch or get_branches()
+    started = time.perf_counter()
+    violations, errors = audit_branches(branches, args.start, args.end, args.workers)
+    violations.to_csv(args.out, index=False)
+    print(summarize(violations).to_string() if not violations.empty else "No violations found.")
+    print(f"✅ {len(violations)} violations in {len(branches)} branches written to {args.out} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,130 @@
+import threading
+import time
 import psycopg2
 from sqlalchemy import create_engine
+from sqlalchemy.sql import text
 import streamlit as st
 
-def get_sqlalchemy_engine():
-    """Returns a SQLAlchemy engine for connecting to the correct PostgreSQL branch."""
-    
-    branch = st.session_state.get("branch", "main")  # Default to "main"
+# Read replicas lagging more than this many seconds are skipped (override with
+# database.max_replica_lag_seconds in secrets)
+DEFAULT_MAX_REPLICA_LAG = 30
+REPLICA_CHECK_SECONDS = 10
 
-    # Load database host from secrets based on the branch
-    db_host = st.secrets["database"]["hosts"].get(branch, st.secrets["database"]["hosts"]["main"])
+# NULL (unavailable) when the replica is not streaming from its primary: replay then stops
+# at the last WAL received, so "replay caught up" says nothing about staleness. The
+# receiver's status is only visible to pg_read_all_stats; other roles see its row only.
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming')
+            THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# ✅ One engine (and connection pool) per database URL, shared by all sessions
+_engines = {}
+_engines_lock = threading.Lock()
+_replica_lag = {}  # url -> (checked_at, lag in seconds)
+_replica_max_lag = {}  # url of each replica engine handed out -> the lag it was accepted with
+
+
+def _engine_for(db_url):
+    with _engines_lock:
+        if db_url not in _engines:
+            _engines[db_url] = create_engine(db_url, pool_pre_ping=True)
+        return _engines[db_url]
+
+
+def _database_url(branch, db_host):
     db_user = st.secrets["database"]["user"]
     db_password = st.secrets["branch_passwords"].get(branch, st.secrets["branch_passwords"]["main"])
     db_name = st.secrets["database"]["database"]  # Same database name, different branches
+    return f"postgresql://{db_user}:{db_password}@{db_host}/{db_name}"
+
+
+def get_sqlalchemy_engine(branch=None):
+    """Returns a SQLAlchemy engine for connecting to the correct PostgreSQL branch.
+
+    Pass ``branch`` explicitly from command-line tools; pages use the session's branch.
+    """
+    
+    if branch is None:
+        branch = st.session_state.get("branch", "main")  # Default to "main"
+
+    # Load database host from secrets based on the branch
+    db_host = st.secrets["database"]["hosts"].get(branch, st.secrets["database"]["hosts"]["main"])
+
+    return _engine_for(_database_url(branch, db_host))
+
+
+def replica_lag(engine):
+    """Seconds the replica behind ``engine`` is behind its primary (checked every few seconds)."""
+    key = str(engine.url)
+    checked_at, lag = _replica_lag.get(key, (0.0, None))
+    if time.monotonic() - checked_at > REPLICA_CHECK_SECONDS:
+        try:
+            with engine.connect() as conn:
+                lag = conn.execute(text(REPLICA_LAG_QUERY)).scalar()
+            if lag is None:
+                print(f"⚠️ Read replica {engine.url.host} is not streaming from its primary")
+                lag = float("inf")
+            lag = float(lag)
+        except Exception as e:
+            print(f"⚠️ Read replica unavailable: {e}")
+            lag = float("inf")
+        _replica_lag[key] = (time.monotonic(), lag)
+    return lag
+
+
+def create_index(engine, name, table, definition):
+    """Create index ``name`` ON ``table`` ``definition`` unless it exists (a migration step).
+
+    Plain tables are indexed CONCURRENTLY, so saves keep running while it builds;
+    an invalid index left by an interrupted build is dropped and rebuilt.
+    Partitioned tables cannot be indexed concurrently and take a plain CREATE INDEX.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+                            {"table": table}).scalar()
+        if kind == "p":
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"))
+            return
+        invalid = conn.execute(text("""
+            SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)
+        """), {"name": name}).scalar()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}"))
+
+
+def get_read_engine(branch=None, max_lag=None):
+    """Returns an engine for read-only queries (dashboards, extracts, listings).
+
+    Uses the first read replica of the branch listed in ``database.read_replicas``
+    whose lag is within ``max_lag`` seconds, and the primary otherwise.
+    """
+    if branch is None:
+        branch = st.session_state.get("branch", "main")
+
+    replicas = st.secrets["database"].get("read_replicas", {}).get(branch, [])
+    if isinstance(replicas, str):
+        replicas = [replicas]
+    if max_lag is None:
+        max_lag = st.secrets["database"].get("max_replica_lag_seconds", DEFAULT_MAX_REPLICA_LAG)
+
+    for db_host in replicas:
+        engine = _engine_for(_database_url(branch, db_host))
+        if replica_lag(engine) <= max_lag:
+            _replica_max_lag[str(engine.url)] = max_lag
+            return engine
+    return get_sqlalchemy_engine(branch)
 
-    # ✅ Construct the database URL dynamically
-    db_url = f"postgresql://{db_user}:{db_password}@{db_host}/{db_name}"
 
-    return create_engine(db_url, pool_pre_ping=True)
+def max_staleness(engine):
+    """Seconds that reads through ``engine`` may lag behind the primary (0 for a primary)."""
+    return _replica_max_lag.get(str(engine.url), 0)
 
 def get_db_connection():
     """Establish and return a database connection based on the user's assigned branch."""
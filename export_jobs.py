@@ -0,0 +1,310 @@
+"""
+Background export jobs: data extracts and dashboard reports built off the page's
+script thread.
+
+Jobs run on a small bounded thread pool so a large extract cannot tie up the
+app. Each job reports its progress, and the finished file is written to a local
+artifact store (a file plus a JSON sidecar) that expires after a day. An
+identical request (same branch, kind, range and format) returns the job that is
+already queued, running or finished instead of building the file again, and
+adds the new requester to it so the job shows up in both users' lists.
+Finished artifacts are dropped when the change feed reports writes to their
+dates, so a re-request is rebuilt from the current data.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import streamlit as st
+import change_feed
+from db import get_read_engine
+from report_queries import count_extract, fetch_dashboard, fetch_extract, generate_excel
+from dashboard_report import create_pdf, generate_full_html
+
+ARTIFACT_DIR = os.environ.get("EXPORT_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_artifacts"))
+MAX_WORKERS = 2
+ARTIFACT_TTL_SECONDS = 24 * 3600
+PANEL_REFRESH_SECONDS = 2
+EXTRACT_CHUNKSIZE = 50_000
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "html": "text/html",
+}
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="export-job")
+_jobs = {}
+_lock = threading.Lock()
+
+
+class ExportJob:
+    """One export request and its state: queued → running → done | failed."""
+
+    def __init__(self, job_id, key, requested_by=None):
+        self.id = job_id
+        self.key = key                  # branch, kind, start, end, format (+ shift for reports)
+        self.requesters = {requested_by} if requested_by else set()
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = "Waiting for a free worker"
+        self.filename = None
+        self.mime = MIME_TYPES.get(key["format"])
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def path(self):
+        return os.path.join(ARTIFACT_DIR, self.id)
+
+    @property
+    def expired(self):
+        return self.finished_at is not None and time.time() - self.finished_at > ARTIFACT_TTL_SECONDS
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def to_dict(self):
+        meta = {name: getattr(self, name) for name in
+                ("id", "key", "status", "message", "filename", "mime", "created_at", "finished_at")}
+        meta["requesters"] = sorted(self.requesters)
+        return meta
+
+    @classmethod
+    def from_dict(cls, meta):
+        job = cls(meta["id"], meta["key"])
+        # Metadata written before jobs kept every requester has a single "requested_by"
+        job.requesters = set(meta.get("requesters") or [meta.get("requested_by")]) - {None}
+        for name in ("status", "message", "filename", "mime", "created_at", "finished_at"):
+            setattr(job, name, meta.get(name))
+        job.progress = 1.0 if job.status == "done" else 0.0
+        return job
+
+
+def job_id(key):
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _write_meta(job):
+    tmp_path = job.path + ".json.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(job.to_dict(), f)
+    os.replace(tmp_path, job.path + ".json")
+
+
+def _load_finished():
+    """Finished jobs in the artifact store, including those of earlier processes."""
+    jobs = {}
+    if not os.path.isdir(ARTIFACT_DIR):
+        return jobs
+    for name in os.listdir(ARTIFACT_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(ARTIFACT_DIR, name)) as f:
+                job = ExportJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Skipping unreadable export metadata {name}: {e}")
+            continue
+        jobs[job.id] = job
+    return jobs
+
+
+def _remove_artifact(job):
+    for path in (job.path, job.path + ".json"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_expired():
+    """Delete artifacts older than ARTIFACT_TTL_SECONDS and forget their jobs."""
+    with _lock:
+        for job in list(_load_finished().values()):
+            if job.expired:
+                _remove_artifact(job)
+        for job_key, job in list(_jobs.items()):
+            if job.expired:
+                del _jobs[job_key]
+
+
+def _run(job, build):
+    job.status = "running"
+    job.message = "Starting"
+    try:
+        data, job.filename = build(job)
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        tmp_path = job.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, job.path)
+        job.finished_at = time.time()
+        job.status, job.progress, job.message = "done", 1.0, f"Ready ({len(data) / 1024:.0f} KB)"
+        _write_meta(job)
+    except Exception as e:
+        job.finished_at = time.time()
+        job.status, job.message = "failed", str(e)[:500]
+        print(f"❌ Export {job.id} {job.key} failed: {e}")
+
+
+def submit(key, build, requested_by=None):
+    """
+    Queue ``build(job) -> (bytes, filename)`` for ``key`` unless an identical job is
+    queued, running or finished (and not expired); ``requested_by`` is then added to
+    its requesters. Returns (job, created).
+    """
+    purge_expired()
+    with _lock:
+        jid = job_id(key)
+        job = _jobs.get(jid) or _load_finished().get(jid)
+        if job and (job.active or (job.status == "done" and os.path.exists(job.path))):
+            _jobs[jid] = job
+            if requested_by and requested_by not in job.requesters:
+                job.requesters.add(requested_by)
+                if job.status == "done":
+                    _write_meta(job)  # Other processes list finished jobs from the sidecar
+            return job, False
+        job = ExportJob(jid, key, requested_by)
+        _jobs[jid] = job
+    _pool.submit(_run, job, build)
+    return job, True
+
+
+def get_job(jid):
+    with _lock:
+        return _jobs.get(jid) or _load_finished().get(jid)
+
+
+def list_jobs(branch=None, requested_by=None):
+    """Known jobs (running in this process or stored as artifacts), newest first."""
+    with _lock:
+        stored = _load_finished()
+        for jid, job in _jobs.items():
+            if jid in stored:  # Another process may have added requesters to the sidecar
+                job.requesters |= stored[jid].requesters
+        jobs = {**stored, **_jobs}
+    return sorted(
+        (job for job in jobs.values()
+         if not job.expired
+         and (branch is None or job.key["branch"] == branch)
+         and (requested_by is None or requested_by in job.requesters)),
+        key=lambda job: job.created_at, reverse=True,
+    )
+
+
+def read_artifact(job):
+    with open(job.path, "rb") as f:
+        return f.read()
+
+
+def describe(job):
+    key = job.key
+    period = key["start"] if key["start"] == key["end"] else f"{key['start']} → {key['end']}"
+    shift = f" {key['shift']}" if key.get("shift") else ""
+    return f"{key['kind'].title()} {key['format'].upper()} · {key['branch']} · {period}{shift}"
+
+
+def _on_change(changes):
+    """Drop finished artifacts whose range covers a changed date."""
+    with _lock:
+        jobs = {**_load_finished(), **_jobs}
+        for job in jobs.values():
+            if job.status != "done":
+                continue
+            start, end = pd.Timestamp(job.key["start"]), pd.Timestamp(job.key["end"])
+            if any(change.branch == job.key["branch"]
+                   and (change.date is None or start <= pd.Timestamp(change.date) <= end)
+                   for change in changes):
+                _remove_artifact(job)
+                _jobs.pop(job.id, None)
+
+
+change_feed.subscribe(_on_change, tables=("archive", "av"))
+
+
+# ✅ Extracts
+
+def _build_extract(job, branch, start_date, end_date):
+    engine = get_read_engine(branch)
+    counts = {table: count_extract(engine, table, start_date, end_date) for table in ("av", "archive")}
+    total = max(sum(counts.values()), 1)
+    done = 0
+
+    frames = {}
+    for table in ("av", "archive"):
+        job.message = f"Reading {table} ({counts[table]:,} rows)"
+
+        def progress(rows, offset=done):
+            job.progress = 0.9 * (offset + rows) / total
+
+        frames[table] = fetch_extract(engine, table, start_date, end_date,
+                                      chunksize=EXTRACT_CHUNKSIZE, progress=progress)
+        done += counts[table]
+
+    job.message = "Writing Excel file"
+    return generate_excel(frames["av"], frames["archive"], branch, start_date, end_date)
+
+
+def submit_extract(branch, start_date, end_date, requested_by=None):
+    key = {"branch": branch, "kind": "extract", "start": str(start_date), "end": str(end_date), "format": "xlsx"}
+    return submit(key, lambda job: _build_extract(job, branch, start_date, end_date), requested_by)
+
+
+# ✅ Dashboard reports
+
+def _build_dashboard(job, branch, date, shift, fmt):
+    job.message = "Reading dashboard data"
+    df_av, df_archive, df_production = fetch_dashboard(get_read_engine(branch), branch, date, shift)
+    job.progress = 0.5
+    job.message = f"Rendering {fmt.upper()}"
+    if fmt == "pdf":
+        data = create_pdf(df_av, df_archive, df_production)
+    else:
+        data = generate_full_html(df_av, df_archive, df_production).encode("utf-8")
+    return data, f"{shift}_{date}.{fmt}"
+
+
+def submit_dashboard(branch, date, shift, fmt, requested_by=None):
+    if fmt not in ("pdf", "html"):
+        raise ValueError(f"Unsupported report format: {fmt}")
+    key = {"branch": branch, "kind": "report", "start": str(date), "end": str(date), "shift": shift, "format": fmt}
+    return submit(key, lambda job: _build_dashboard(job, branch, date, shift, fmt), requested_by)
+
+
+# ✅ Streamlit panel
+
+def jobs_panel(branch, requested_by=None, kind=None):
+    """Progress bars for running jobs and download buttons for finished ones, refreshed while jobs run."""
+    def jobs():
+        return [job for job in list_jobs(branch, requested_by) if kind is None or job.key["kind"] == kind]
+
+    polling = any(job.active for job in jobs())
+
+    @st.fragment(run_every=PANEL_REFRESH_SECONDS if polling else None)
+    def panel():
+        current = jobs()
+        if polling and not any(job.active for job in current):
+            st.rerun()  # Everything finished: rerun the page to stop polling
+        if not current:
+            return
+        st.subheader("📦 Exports")
+        for job in current:
+            label = describe(job)
+            if job.active:
+                st.progress(min(job.progress, 1.0), text=f"{label} — {job.message}")
+            elif job.status == "failed":
+                st.error(f"❌ {label} failed: {job.message}")
+            else:
+                try:
+                    data = read_artifact(job)
+                except FileNotFoundError:
+                    continue
+                st.download_button(f"📥 {label} — {job.message}", data=data, file_name=job.filename,
+                                   mime=job.mime, key=f"export_{job.id}")
+
+    panel()
@@ -0,0 +1,236 @@
+"""
+Bulk import of historical ``archive`` / ``av`` CSV files.
+
+Files are streamed in chunks, normalized like the shift form's clean_dataframe(),
+validated against machines, products and shifts, and loaded with COPY.
+Rows that fail a check are written to a rejected-rows CSV with the reason.
+
+Usage:
+    python history_import.py archive archive.csv --branch main --rejected archive_rejected.csv
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine
+from rollups import refresh_oee_rollup, refresh_downtime_rollup
+import change_feed
+from shift_report import clean_dataframe, SHIFT_TYPES, DOWNTIME_TYPES
+
+# Column layout of each table plus the (date, machine, shift) key used for duplicates
+TABLES = {
+    "archive": {
+        "columns": ["Date", "Machine", "Day/Night/plan", "Activity", "time", "Product",
+                    "batch number", "quantity", "comments", "rate", "standard rate", "efficiency"],
+        "numeric": ["time", "quantity", "rate", "standard rate", "efficiency"],
+        "key": ["Date", "Machine", "Day/Night/plan"],
+    },
+    "av": {
+        "columns": ["date", "machine", "shift type", "hours", "shift",
+                    "T.production time", "Availability", "Av Efficiency", "OEE"],
+        "numeric": ["hours", "T.production time", "Availability", "Av Efficiency", "OEE"],
+        "key": ["date", "machine", "shift"],
+    },
+}
+
+# Known misspellings in exported sheets (the bundled archive.csv uses "commnets")
+COLUMN_FIXES = {"commnets": "comments"}
+
+DEFAULT_CHUNKSIZE = 50_000
+
+
+def load_reference_data(engine, shifts_path="shifts.csv"):
+    """Fetch the machine and product names and the shift codes used for validation."""
+    with engine.connect() as conn:
+        machines = pd.read_sql(text("SELECT name FROM machines"), conn)["name"]
+        products = pd.read_sql(text("SELECT name FROM products"), conn)["name"]
+    shift_codes = pd.read_csv(shifts_path, encoding="utf-8-sig")["code"]
+    return {
+        "machines": set(machines.astype(str).str.strip()),
+        "products": set(products.astype(str).str.strip()),
+        "shift_codes": set(shift_codes.astype(str).str.strip()),
+    }
+
+
+def normalize_chunk(raw, table, dayfirst=False):
+    """Normalize a raw chunk of strings to the table's columns and types."""
+    spec = TABLES[table]
+    df = clean_dataframe(raw.copy()).rename(columns=COLUMN_FIXES)
+
+    for col in spec["columns"]:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[spec["columns"]]
+
+    for col in spec["numeric"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    text_cols = [col for col in spec["columns"] if col not in spec["numeric"]]
+    df[text_cols] = df[text_cols].fillna("").astype(str).apply(lambda col: col.str.strip())
+
+    date_col = spec["key"][0]
+    df[date_col] = pd.to_datetime(df[date_col], errors="coerce", dayfirst=dayfirst).dt.strftime("%Y-%m-%d")
+    return df
+
+
+def fetch_existing_keys(engine, table, start, end):
+    """Return the (date, machine, shift) keys already stored between two dates."""
+    date_col, machine_col, shift_col = TABLES[table]["key"]
+    query = text(f"""
+        SELECT DISTINCT "{date_col}", "{machine_col}", "{shift_col}" FROM {table}
+        WHERE "{date_col}" BETWEEN :start AND :end
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query, {"start": start, "end": end}).fetchall()
+    return {(str(d), m, s) for d, m, s in rows}
+
+
+def validate_chunk(df, table, reference, existing_keys, loaded_keys):
+    """Run every check on a chunk at once and return a DataFrame of failed checks."""
+    date_col, machine_col, shift_col = TABLES[table]["key"]
+    keys = pd.MultiIndex.from_frame(df[[date_col, machine_col, shift_col]])
+
+    checks = {
+        "invalid date": df[date_col].isna(),
+        "unknown machine": ~df[machine_col].isin(reference["machines"]),
+        "unknown shift": ~df[shift_col].isin(SHIFT_TYPES),
+        # Keys imported earlier in this run are not duplicates for archive (one row per activity)
+        "already in database": keys.isin(existing_keys - loaded_keys),
+    }
+
+    if table == "archive":
+        production = df["Activity"].eq("Production")
+        checks["unknown activity"] = ~df["Activity"].isin(DOWNTIME_TYPES + ["Production"])
+        checks["unknown product"] = production & ~df["Product"].isin(reference["products"])
+        checks["invalid time"] = df["time"].isna() | (df["time"] < 0)
+        checks["invalid quantity"] = production & (df["quantity"].isna() | (df["quantity"] < 0))
+    else:
+        checks["unknown shift type"] = ~df["shift type"].isin(reference["shift_codes"])
+        checks["duplicate in file"] = keys.isin(loaded_keys) | keys.duplicated(keep="first")
+
+    return pd.DataFrame(checks, index=df.index)
+
+
+def copy_rows(engine, table, df):
+    """Load rows with COPY ... FROM STDIN in a single transaction."""
+    buffer = io.StringIO()
+    # Quoted empty strings stay empty strings in text columns
+    df.to_csv(buffer, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC)
+    buffer.seek(0)
+
+    columns = ", ".join(f'"{col}"' for col in df.columns)
+    options = "FORMAT csv"
+    # Missing numbers (NaN) are written as a quoted "" too, which COPY rejects for numeric
+    # columns; FORCE_NULL turns them back into NULL
+    numeric = [f'"{col}"' for col in TABLES[table]["numeric"] if col in df.columns]
+    if numeric:
+        options += f", FORCE_NULL ({', '.join(numeric)})"
+
+    raw_conn = engine.raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH ({options})", buffer)
+        raw_conn.commit()
+        cur.close()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        raw_conn.close()
+
+
+def import_csv(engine, table, source, rejected_file=None, chunksize=DEFAULT_CHUNKSIZE,
+               reference=None, progress=None, dayfirst=False, branch="main"):
+    """
+    Streams a CSV file into ``table`` chunk by chunk.
+    ``rejected_file`` is a writable text file that receives rejected rows and reasons;
+    ``progress`` is called after every chunk with the running totals.
+    Loaded dates are announced on the change feed for ``branch``.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unsupported table: {table}")
+    if reference is None:
+        reference = load_reference_data(engine)
+
+    stats = {"read": 0, "loaded": 0, "rejected": 0, "chunks": 0, "seconds": 0.0}
+    loaded_keys = set()
+    loaded_dates = set()
+    started = time.perf_counter()
+    write_header = True
+
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize, encoding="utf-8-sig")
+    for raw in reader:
+        df = normalize_chunk(raw, table, dayfirst)
+        date_col = TABLES[table]["key"][0]
+        dates = df[date_col].dropna()
+        existing_keys = fetch_existing_keys(engine, table, dates.min(), dates.max()) if not dates.empty else set()
+
+        checks = validate_chunk(df, table, reference, existing_keys, loaded_keys)
+        failed = checks.any(axis=1)
+        valid = df[~failed]
+
+        if not valid.empty:
+            copy_rows(engine, table, valid)
+            loaded_keys.update(valid[TABLES[table]["key"]].itertuples(index=False, name=None))
+            loaded_dates.update(valid[date_col].dropna().unique())
+
+        if failed.any() and rejected_file is not None:
+            rejected = raw[failed].copy()
+            rejected["reason"] = checks[failed].dot(checks.columns + "; ").str.rstrip("; ")
+            rejected.to_csv(rejected_file, index=False, header=write_header)
+            write_header = False
+
+        stats["read"] += len(df)
+        stats["loaded"] += len(valid)
+        stats["rejected"] += int(failed.sum())
+        stats["chunks"] += 1
+        stats["seconds"] = time.perf_counter() - started
+        if progress:
+            progress(stats)
+
+    if loaded_dates:
+        changes = change_feed.date_changes(branch, table, loaded_dates)
+        with engine.begin() as conn:
+            if table == "av":
+                refresh_oee_rollup(conn, loaded_dates)
+            else:
+                refresh_downtime_rollup(conn, loaded_dates)
+            change_feed.notify(conn, changes)
+        change_feed.publish(changes)
+    return stats
+
+
+def print_progress(stats):
+    rate = stats["read"] / stats["seconds"] if stats["seconds"] else 0
+    print(f"chunk {stats['chunks']}: {stats['read']} read, {stats['loaded']} loaded, "
+          f"{stats['rejected']} rejected ({rate:,.0f} rows/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import historical archive/av CSV files.")
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("csv_file")
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--rejected", help="Where to write rejected rows (default: <csv_file>.rejected.csv)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--dayfirst", action="store_true", help="Parse dates like 31/01/2024")
+    args = parser.parse_args(argv)
+
+    engine = get_sqlalchemy_engine(args.branch)
+    rejected_path = args.rejected or f"{args.csv_file}.rejected.csv"
+
+    with open(rejected_path, "w", newline="", encoding="utf-8") as rejected_file:
+        stats = import_csv(engine, args.table, args.csv_file, rejected_file,
+                           chunksize=args.chunksize, progress=print_progress, dayfirst=args.dayfirst,
+                           branch=args.branch)
+
+    print(f"✅ Done: {stats['loaded']} rows loaded into {args.table}, "
+          f"{stats['rejected']} rejected (see {rejected_path}) in {stats['seconds']:.1f}s")
+    return 0 if stats["loaded"] or not stats["read"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
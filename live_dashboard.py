@@ -0,0 +1,137 @@
+"""
+Live data for the Machine Performance Dashboard.
+
+A view of one (branch, date, shift) keeps the dashboard's three tables in memory
+together with a change_log watermark. Each poll reads only the change_log rows
+committed since the watermark. When some logged changes belong to the view's date and
+shift, only the changed machines are re-queried and their rows are replaced.
+Polls with nothing new cost a single indexed lookup. Views are shared by every
+session showing the same shift, so many floor displays still make one poll
+per POLL_SECONDS.
+"""
+import threading
+import time
+import pandas as pd
+from sqlalchemy.sql import text
+import change_feed
+from report_queries import (
+    QUERY_AV, QUERY_ARCHIVE, QUERY_PRODUCTION,
+    QUERY_AV_MACHINES, QUERY_ARCHIVE_MACHINES, QUERY_PRODUCTION_MACHINES,
+)
+
+POLL_SECONDS = 5
+MAX_CHANGES = 1000          # More pending changes than this → reload the view in full
+VIEW_IDLE_SECONDS = 3600    # Views nobody polled for this long are dropped
+
+# Dashboard frames in (av, activity, production) order: full query, per-machine query, machine column, sort
+FRAMES = [
+    (QUERY_AV, QUERY_AV_MACHINES, "machine", ["machine"]),
+    (QUERY_ARCHIVE, QUERY_ARCHIVE_MACHINES, "Machine", ["Machine", "Activity"]),
+    (QUERY_PRODUCTION, QUERY_PRODUCTION_MACHINES, "Machine", ["Machine", "batch number"]),
+]
+
+
+class LiveView:
+    """Dashboard tables of one date and shift, kept current from the change log."""
+
+    def __init__(self, date, shift):
+        self.date = str(date)
+        self.shift = shift
+        self.frames = None
+        self.watermark = None       # change_feed.change_watermark() position
+        self.version = 0            # Bumped whenever the frames change
+        self.polled_at = 0.0
+        self.updated_at = None      # Wall-clock time of the last change applied
+        self.lock = threading.Lock()
+
+
+_views = {}  # (branch, date, shift) -> LiveView
+_views_lock = threading.Lock()
+
+
+def _load(conn, params, machines=None):
+    frames = []
+    for full_query, machine_query, _, sort in FRAMES:
+        if machines is None:
+            df = pd.read_sql(text(full_query), conn, params=params)
+        else:
+            df = pd.read_sql(text(machine_query), conn, params={**params, "machines": sorted(machines)})
+        frames.append(df.sort_values(sort, kind="stable").reset_index(drop=True))
+    return frames
+
+
+def _merge(frames, fresh, machines):
+    """Replace the rows of ``machines`` in each frame with the freshly read ones."""
+    merged = []
+    for old, new, (_, _, machine_col, sort) in zip(frames, fresh, FRAMES):
+        kept = old[~old[machine_col].isin(machines)]
+        merged.append(pd.concat([kept, new], ignore_index=True).sort_values(sort, kind="stable").reset_index(drop=True))
+    return merged
+
+
+def _poll(view, engine):
+    params = {"date": view.date, "shift": view.shift}
+    with engine.connect() as conn:
+        if view.frames is None:
+            # Watermark first: changes committed while loading are applied again on the next poll
+            view.watermark = change_feed.change_watermark(conn)
+            view.frames = _load(conn, params)
+            view.version += 1
+            view.updated_at = pd.Timestamp.now()
+            return
+
+        pending, watermark = change_feed.changes_since(conn, view.watermark, MAX_CHANGES + 1)
+        if not pending:
+            view.watermark = watermark
+            return
+        if len(pending) > MAX_CHANGES:
+            view.frames = None
+            return _poll(view, engine)
+
+        machines, reload_all = set(), False
+        for _, change in pending:
+            if change.table not in ("archive", "av", change_feed.ALL_TABLES):
+                continue
+            if change.date not in (None, view.date) or change.shift not in (None, view.shift):
+                continue
+            if change.machine is None:
+                reload_all = True
+            else:
+                machines.add(change.machine)
+        view.watermark = watermark
+
+        if reload_all:
+            view.frames = _load(conn, params)
+        elif machines:
+            view.frames = _merge(view.frames, _load(conn, params, machines), machines)
+        else:
+            return
+        view.version += 1
+        view.updated_at = pd.Timestamp.now()
+
+
+def live_frames(engine, branch, date, shift):
+    """
+    Returns (df_av, df_archive, df_production, version) for ``date`` and
+    ``shift``, polling the change log at most every POLL_SECONDS. ``version``
+    changes whenever the tables do.
+    """
+    key = (branch, str(date), shift)
+    now = time.monotonic()
+    with _views_lock:
+        for stale in [k for k, v in _views.items() if now - v.polled_at > VIEW_IDLE_SECONDS and k != key]:
+            del _views[stale]
+        view = _views.setdefault(key, LiveView(date, shift))
+
+    with view.lock:
+        if view.frames is None or now - view.polled_at >= POLL_SECONDS:
+            _poll(view, engine)
+            view.polled_at = now
+        av, archive, production = view.frames
+        return av, archive, production, view.version
+
+
+def last_update(branch, date, shift):
+    """When the view last changed (None if it has not loaded yet)."""
+    view = _views.get((branch, str(date), shift))
+    return view.updated_at if view else None
@@ -0,0 +1,315 @@
+"""
+Diff-based sync of master data (machines, products, rates) from CSV sheets.
+
+Each sheet is compared with the branch's table and only new or changed rows are
+written, with one multi-row upsert per table. Branches are synced in parallel.
+
+Usage:
+    python master_sync.py                       # dry run of the bundled CSVs on every branch
+    python master_sync.py --rates rates.csv --branch main --apply
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine, get_branches
+from change_feed import Change, notify, publish
+
+# Sheet kinds in the order they must be applied (rates reference machines and products)
+SPECS = {
+    "machines": {
+        "key": ["name"],
+        "values": ["qty_uom"],
+        "numeric": [],
+        "defaults": {},
+        "aliases": {"name": "name", "machine": "name", "qty_uom": "qty_uom", "uom": "qty_uom"},
+    },
+    "products": {
+        "key": ["name"],
+        "values": ["batch_size", "units_per_box", "primary_units_per_box", "oracle_code"],
+        "numeric": ["batch_size", "units_per_box", "primary_units_per_box"],
+        # Same defaults as a "New Product" in master_data.py, used for inserts only
+        "defaults": {"batch_size": 1.0, "units_per_box": 1.0, "primary_units_per_box": 1.0, "oracle_code": ""},
+        "aliases": {"name": "name", "product": "name", "batch_size": "batch_size", "batch size": "batch_size",
+                    "units_per_box": "units_per_box", "units per box": "units_per_box",
+                    "primary_units_per_box": "primary_units_per_box",
+                    "primary units per box": "primary_units_per_box",
+                    "oracle_code": "oracle_code", "oracle code": "oracle_code"},
+    },
+    "rates": {
+        "key": ["product", "machine"],
+        "values": ["standard_rate"],
+        "numeric": ["standard_rate"],
+        "defaults": {},
+        "aliases": {"product": "product", "machine": "machine", "rate": "standard_rate",
+                    "standard_rate": "standard_rate", "standard rate": "standard_rate"},
+    },
+}
+
+BUNDLED_SHEETS = {"machines": "machines.csv", "products": "products.csv", "rates": "rates.csv"}
+
+# PostgreSQL accepts at most 65535 bind parameters per statement
+MAX_PARAMS = 60_000
+
+
+def upsert_rows(conn, table, df, key, update_columns):
+    """
+    Writes all rows of ``df`` with one multi-row INSERT ... ON CONFLICT statement.
+    Only ``update_columns`` are overwritten on existing rows; other columns apply to inserts.
+    """
+    if df.empty:
+        return 0
+
+    columns = list(df.columns)
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    if update_columns:
+        conflict = "DO UPDATE SET " + ", ".join(f'"{col}" = EXCLUDED."{col}"' for col in update_columns)
+    else:
+        conflict = "DO NOTHING"
+
+    rows_per_statement = max(MAX_PARAMS // len(columns), 1)
+    for start in range(0, len(records), rows_per_statement):
+        chunk = records[start:start + rows_per_statement]
+        params = {}
+        values_sql = []
+        for i, record in enumerate(chunk):
+            names = []
+            for j, col in enumerate(columns):
+                params[f"v{i}_{j}"] = record[col]
+                names.append(f":v{i}_{j}")
+            values_sql.append(f"({', '.join(names)})")
+
+        query = text(f"""
+            INSERT INTO {table} ({", ".join(f'"{col}"' for col in columns)})
+            VALUES {", ".join(values_sql)}
+            ON CONFLICT ({", ".join(f'"{col}"' for col in key)}) {conflict}
+        """)
+        conn.execute(query, params)
+
+    return len(records)
+
+
+def read_sheet(kind, source):
+    """Read a CSV sheet (with or without a header row) into the table's column names."""
+    spec = SPECS[kind]
+    df = pd.read_csv(source, dtype=str, keep_default_na=False, header=None, encoding="utf-8-sig")
+
+    first_row = df.iloc[0].astype(str).str.strip().str.lower() if not df.empty else pd.Series(dtype=str)
+    if first_row.isin(spec["aliases"].keys()).any():
+        df.columns = first_row.map(lambda col: spec["aliases"].get(col, col))
+        df = df.iloc[1:]
+    else:
+        # Headerless sheets such as the bundled machines.csv / products.csv / rates.csv body
+        df.columns = (spec["key"] + spec["values"])[:len(df.columns)]
+
+    columns = [col for col in spec["key"] + spec["values"] if col in df.columns]
+    df = df[columns].apply(lambda col: col.astype(str).str.strip())
+    for col in spec["numeric"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    df = df[df[spec["key"]].ne("").all(axis=1)]
+    return df.drop_duplicates(spec["key"], keep="last").reset_index(drop=True)
+
+
+def fetch_current(conn, kind):
+    """Load the current contents of a master-data table."""
+    spec = SPECS[kind]
+    columns = ", ".join(f'"{col}"' for col in spec["key"] + spec["values"])
+    return pd.read_sql(text(f"SELECT {columns} FROM {kind}"), conn)
+
+
+def canonical_names(names):
+    """Map whitespace-trimmed names to the exact spelling stored in the database."""
+    names = pd.Series(names, dtype=str)
+    return dict(zip(names.str.strip(), names))
+
+
+def diff_sheet(kind, sheet, current):
+    """
+    Compares a sheet with the table and returns only rows that are new or changed,
+    with a "change" column. Columns missing from the sheet are never compared.
+    """
+    spec = SPECS[kind]
+    key = spec["key"]
+    compare = [col for col in spec["values"] if col in sheet.columns]
+
+    merged = sheet.merge(current, on=key, how="left", suffixes=("", "_current"), indicator=True)
+    new = merged["_merge"].eq("left_only")
+    changed = pd.Series(False, index=merged.index)
+
+    for col in compare:
+        incoming, stored = merged[col], merged[f"{col}_current"]
+        if col in spec["numeric"]:
+            stored = pd.to_numeric(stored, errors="coerce")
+            differs = ~np.isclose(incoming.astype(float), stored.astype(float), equal_nan=True)
+        else:
+            differs = incoming.fillna("").astype(str).ne(stored.fillna("").astype(str).str.strip())
+        changed |= differs & ~new
+
+    changes = merged.loc[new | changed, key + compare].copy()
+    changes["change"] = np.where(new[new | changed], "new", "changed")
+    return changes.reset_index(drop=True)
+
+
+def load_rate_matrix(conn):
+    """Load every product × machine standard rate in one query as a pivoted matrix (NaN = no rate)."""
+    query = text("""
+        SELECT p.name AS product, m.name AS machine, r.standard_rate
+        FROM products p
+        CROSS JOIN machines m
+        LEFT JOIN rates r ON r.product = p.name AND r.machine = m.name
+    """)
+    df = pd.read_sql(query, conn)
+    df["standard_rate"] = pd.to_numeric(df["standard_rate"], errors="coerce")
+    matrix = df.pivot(index="product", columns="machine", values="standard_rate")
+    return matrix.sort_index().sort_index(axis=1).rename_axis(index=None, columns=None)
+
+
+def diff_rate_matrix(original, edited):
+    """
+    Compares two rate matrices cell by cell in one vectorized step and returns the
+    changed cells as (product, machine, standard_rate) rows. Cleared cells are ignored.
+    """
+    edited = edited.reindex(index=original.index, columns=original.columns)
+    before = original.to_numpy(dtype="float64")
+    after = edited.apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+
+    changed = ~np.isclose(before, after, equal_nan=True) & ~np.isnan(after)
+    rows, cols = np.nonzero(changed)
+    return pd.DataFrame({
+        "product": original.index[rows],
+        "machine": original.columns[cols],
+        "standard_rate": after[rows, cols],
+    })
+
+
+def rate_changes(branch, rates):
+    """Change-feed keys for the machines whose rates were written."""
+    return [Change(branch, "rates", None, None, machine) for machine in sorted(set(rates["machine"]))]
+
+
+def save_rate_changes(engine, changes, branch="main"):
+    """Write changed rates with one batched upsert inside one transaction."""
+    feed = rate_changes(branch, changes)
+    with engine.begin() as conn:
+        written = upsert_rows(conn, "rates", changes, ["product", "machine"], ["standard_rate"])
+        notify(conn, feed)
+    publish(feed)
+    return written
+
+
+def sync_branch(branch, sheets, apply=False):
+    """
+    Diffs every sheet against one branch and, when ``apply`` is set, writes the
+    changes in a single transaction. Returns {kind: changes DataFrame} plus skipped rates.
+    """
+    engine = get_sqlalchemy_engine(branch)
+    result = {}
+
+    with engine.connect() as conn:
+        known = {}
+        for kind in SPECS:
+            current = fetch_current(conn, kind)
+            spec = SPECS[kind]
+
+            if kind in ("machines", "products"):
+                known[kind] = canonical_names(current["name"])
+
+            if kind not in sheets:
+                continue
+            sheet = sheets[kind].copy()
+
+            # Use the database spelling for names that only differ by surrounding whitespace
+            if kind == "rates":
+                sheet["product"] = sheet["product"].map(lambda name: known["products"].get(name, name))
+                sheet["machine"] = sheet["machine"].map(lambda name: known["machines"].get(name, name))
+                valid = sheet["product"].isin(known["products"].values()) & sheet["machine"].isin(known["machines"].values())
+                result["skipped_rates"] = sheet[~valid]
+                sheet = sheet[valid]
+            else:
+                sheet["name"] = sheet["name"].map(lambda name: known[kind].get(name, name))
+
+            changes = diff_sheet(kind, sheet, current)
+            result[kind] = changes
+
+            if apply and not changes.empty:
+                rows = changes.drop(columns="change")
+                for col, default in spec["defaults"].items():
+                    if col not in rows.columns:
+                        rows[col] = default
+                update_columns = [col for col in spec["values"] if col in sheet.columns]
+                upsert_rows(conn, kind, rows, spec["key"], update_columns)
+
+            # Newly inserted machines/products become valid targets for the rates sheet
+            if kind in ("machines", "products"):
+                known[kind].update({name.strip(): name for name in changes["name"]})
+
+        feed = rate_changes(branch, result["rates"]) if "rates" in result else []
+        if apply:
+            notify(conn, feed)
+            conn.commit()
+            publish(feed)
+
+    return result
+
+
+def sync_branches(branches, sheets, apply=False, max_workers=8):
+    """Sync several branches in parallel. Returns {branch: result or Exception}."""
+    def run(branch):
+        try:
+            return sync_branch(branch, sheets, apply)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(branches)))) as pool:
+        return dict(zip(branches, pool.map(run, branches)))
+
+
+def summarize(result):
+    """One-line count of changes per table."""
+    parts = []
+    for kind in SPECS:
+        if kind in result:
+            changes = result[kind]
+            parts.append(f"{kind}: {int(changes['change'].eq('new').sum())} new, "
+                         f"{int(changes['change'].eq('changed').sum())} changed")
+    if len(result.get("skipped_rates", [])):
+        parts.append(f"{len(result['skipped_rates'])} rates skipped (unknown product or machine)")
+    return "; ".join(parts) or "no sheets"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync machines, products and rates from CSV sheets.")
+    parser.add_argument("--machines")
+    parser.add_argument("--products")
+    parser.add_argument("--rates")
+    parser.add_argument("--branch", action="append", help="Branch to sync (repeatable, default: all branches)")
+    parser.add_argument("--apply", action="store_true", help="Write the changes (default is a dry run)")
+    args = parser.parse_args(argv)
+
+    paths = {kind: getattr(args, kind) for kind in SPECS if getattr(args, kind)}
+    if not paths:
+        paths = BUNDLED_SHEETS
+    sheets = {kind: read_sheet(kind, path) for kind, path in paths.items()}
+
+    branches = args.branch or get_branches()
+    results = sync_branches(branches, sheets, apply=args.apply)
+
+    failed = False
+    for branch, result in results.items():
+        if isinstance(result, Exception):
+            failed = True
+            print(f"❌ {branch}: {result}")
+        else:
+            print(f"{'✅' if args.apply else '🔍'} {branch}: {summarize(result)}")
+
+    if not args.apply:
+        print("Dry run only. Re-run with --apply to write the changes.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Schema migrations for the tables and indexes the app adds to each branch database.
+
+Run at deploy time, before the app serves traffic, so no writer or page render
+ever runs DDL (lazy CREATE TABLE in concurrent writers races, and CREATE INDEX
+blocks saves while it builds). Indexes on plain tables are built CONCURRENTLY,
+so the app may keep running during a migration. Every step is idempotent.
+
+Usage:
+    python migrations.py                    # all branches
+    python migrations.py --branch main
+"""
+import argparse
+import sys
+import time
+from db import get_branches, get_sqlalchemy_engine
+from batch_trace import ensure_batch_index
+from change_feed import ensure_change_log
+from counter_ingest import ensure_event_table
+from partitions import ensure_future_partitions
+from product_search import ensure_search_index
+from rollups import ensure_rollup_tables
+
+
+def rollup_tables(engine):
+    with engine.begin() as conn:
+        ensure_rollup_tables(conn)
+
+
+def change_log(engine):
+    with engine.begin() as conn:
+        ensure_change_log(conn)
+
+
+def future_partitions(engine):
+    created = ensure_future_partitions(engine)
+    if created:
+        print(f"✅ Created partitions: {', '.join(created)}")
+
+
+# (name, step(engine)) in the order they run
+STEPS = [
+    ("rollup tables", rollup_tables),
+    ("change log", change_log),
+    ("machine events", ensure_event_table),
+    ("batch index", ensure_batch_index),
+    ("product search index", ensure_search_index),
+    ("future partitions", future_partitions),
+]
+
+
+def migrate(engine, branch="main"):
+    """Run every step on one branch database. Returns {step: error message} of the failed ones."""
+    errors = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step(engine)
+            print(f"✅ {branch}: {name} ({time.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            errors[name] = str(e)
+            print(f"❌ {branch}: {name} failed: {e}")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create the app's tables and indexes on each branch database.")
+    parser.add_argument("--branch", action="append", help="Branch to migrate (repeatable, default: all)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for branch in args.branch or get_branches():
+        failed |= bool(migrate(get_sqlalchemy_engine(branch), branch))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import streamlit as st
+from db import get_read_engine
+from auth import check_authentication, check_access
+from batch_trace import cached_search_batches, cached_trace, summarize_trace
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["user", "power user", "admin", "report"])
+
+st.title("🔎 Batch Traceability")
+
+branch = st.session_state.get("branch", "main")
+engine = get_read_engine()
+
+term = st.text_input("Batch Number", placeholder="Type a batch number or its first characters")
+if not term.strip():
+    st.info("Enter a batch number to trace it across machines and shifts.")
+    st.stop()
+
+try:
+    suggestions = cached_search_batches(engine, branch, term)
+except Exception as e:
+    st.error(f"❌ Error searching batches: {e}")
+    st.stop()
+
+if not suggestions:
+    st.warning("⚠️ No batch found with this number.")
+    st.stop()
+
+# ✅ Exact matches are selected directly; otherwise pick from the prefix matches
+batch = term.strip() if term.strip() in suggestions else st.selectbox("Matching Batches", suggestions)
+
+try:
+    trace = cached_trace(engine, branch, batch)
+except Exception as e:
+    st.error(f"❌ Error tracing batch: {e}")
+    st.stop()
+
+products = sorted(trace["Product"].dropna().unique())
+if len(products) > 1:
+    product = st.selectbox("Product", ["All products"] + products)
+    if product != "All products":
+        trace = trace[trace["Product"] == product]
+
+c1, c2, c3 = st.columns(3)
+c1.metric("Machines", trace["Machine"].nunique())
+c2.metric("Shifts", len(trace[["Date", "Shift", "Machine"]].drop_duplicates()))
+c3.metric("Total Quantity", f"{trace['quantity'].sum():,.2f}")
+
+st.subheader(f"📋 Route of batch {batch}")
+st.dataframe(summarize_trace(trace), use_container_width=True)
+
+st.subheader("🗂️ All Entries")
+st.dataframe(trace, use_container_width=True)
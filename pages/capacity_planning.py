@@ -0,0 +1,101 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from db import get_read_engine
+from auth import check_authentication, check_access
+from planning import cached_rate_table, clean_orders, load_machine_families, plan_capacity, read_orders
+from shift_report import load_shift_hours
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["power user", "admin"])
+
+st.title("🗓️ Capacity Planning")
+
+branch = st.session_state.get("branch", "main")
+engine = get_read_engine()
+
+try:
+    rates = cached_rate_table(engine, branch)
+    shift_hours = load_shift_hours()
+    families = load_machine_families()
+except Exception as e:
+    st.error(f"❌ Error loading standard rates, shifts or machine families: {e}")
+    st.stop()
+
+# ✅ Planning horizon
+col1, col2, col3 = st.columns(3)
+full_shifts = [code for code in shift_hours if not str(code).endswith("hr")] or list(shift_hours)
+shift_code = col1.selectbox("Shift Type", full_shifts, format_func=lambda c: f"{c} ({shift_hours[c]:g} h)")
+working_days = col2.number_input("Working Days", min_value=1, max_value=366, value=26)
+shifts_per_day = col3.number_input("Shifts per Day", min_value=1, max_value=3, value=2)
+available_shifts = int(working_days * shifts_per_day)
+
+# ✅ Orders: upload a CSV (product, quantity) or type them in
+uploaded = st.file_uploader("Upload Orders CSV (product, quantity)", type="csv")
+if uploaded is not None:
+    orders, rejected = read_orders(uploaded)
+else:
+    edited = st.data_editor(
+        pd.DataFrame({"product": pd.Series(dtype=str), "quantity": pd.Series(dtype="float64")}),
+        num_rows="dynamic",
+        column_config={
+            "product": st.column_config.SelectboxColumn("Product", options=sorted(rates["product"].unique())),
+            "quantity": st.column_config.NumberColumn("Quantity", min_value=0),
+        },
+        use_container_width=True,
+        key="planning_orders",
+    )
+    orders, rejected = clean_orders(edited.dropna(how="all").fillna(""))
+
+if not rejected.empty:
+    st.warning(f"⚠️ {len(rejected)} order lines skipped.")
+    st.dataframe(rejected, use_container_width=True)
+
+if orders.empty:
+    st.info("Add orders to see the machine load.")
+    st.stop()
+
+machine_load, product_load, unplanned = plan_capacity(orders, rates, shift_hours[shift_code], available_shifts, families)
+
+# ✅ Summary
+bottlenecks = machine_load[machine_load["bottleneck"]]
+m1, m2, m3 = st.columns(3)
+m1.metric("Orders", f"{len(orders):,}")
+m2.metric("Machine Hours", f"{machine_load['hours'].sum():,.0f}")
+m3.metric("Machines Over Capacity", len(bottlenecks))
+
+if not unplanned.empty:
+    st.warning(f"⚠️ No standard rate for {len(unplanned)} products; they are not planned.")
+    st.dataframe(unplanned, use_container_width=True)
+
+# ✅ Load vs capacity per machine
+fig = px.bar(machine_load, x="machine", y="shifts_needed", color="bottleneck",
+             color_discrete_map={True: "#d62728", False: "#1f77b4"},
+             title=f"{shift_code} Shifts Needed per Machine (available: {available_shifts})")
+fig.add_hline(y=available_shifts, line_dash="dash", annotation_text="Available shifts")
+st.plotly_chart(fig, use_container_width=True)
+
+st.subheader("🏭 Machine Load")
+st.dataframe(
+    machine_load.style.format({"quantity": "{:,.0f}", "hours": "{:,.1f}", "available_hours": "{:,.0f}",
+                               "utilization": "{:.0%}"}),
+    use_container_width=True,
+)
+
+st.subheader("📦 Hours per Product and Machine")
+st.caption("The limiting machine is the slowest step of each product's routing. "
+           "Interchangeable machines (e.g. Fette 3090 and Fette 3090 II) share an order's quantity.")
+st.dataframe(product_load, use_container_width=True)
+
+st.download_button("📥 Download Machine Load (CSV)", machine_load.to_csv(index=False).encode("utf-8"),
+                   file_name=f"{branch}_capacity_plan.csv", mime="text/csv")
@@ -0,0 +1,65 @@
+import streamlit as st
+import datetime
+import time
+from db import get_branches
+from auth import check_authentication, check_access
+from data_quality import RULES, audit_branches, summarize
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["admin"])
+
+st.title("🔍 Data Quality Audit")
+st.caption("Re-runs the shift form's checks and the av/archive consistency checks over saved reports.")
+
+branch = st.session_state.get("branch", "main")
+today = datetime.date.today()
+
+col1, col2 = st.columns(2)
+start_date = col1.date_input("Start Date", today - datetime.timedelta(days=365))
+end_date = col2.date_input("End Date", today)
+branches = st.multiselect("Branches", get_branches(), default=[branch])
+
+if st.button("▶️ Run Audit", disabled=not branches):
+    if start_date > end_date:
+        st.error("Start date cannot be after end date.")
+    else:
+        started = time.perf_counter()
+        with st.spinner(f"Auditing {len(branches)} branches..."):
+            violations, errors = audit_branches(branches, start_date, end_date)
+        st.session_state.audit_result = {
+            "violations": violations,
+            "errors": errors,
+            "label": f"{start_date}_to_{end_date}",
+            "seconds": time.perf_counter() - started,
+        }
+
+result = st.session_state.get("audit_result")
+if result:
+    violations = result["violations"]
+    for failed_branch, error in result["errors"].items():
+        st.error(f"❌ Audit of {failed_branch} failed: {error}")
+
+    st.success(f"✅ {len(violations):,} violations found in {result['seconds']:.1f}s.")
+    if not violations.empty:
+        st.subheader("📊 Violations per Rule")
+        summary = summarize(violations)
+        summary.insert(0, "description", summary.index.map(RULES))
+        st.dataframe(summary, use_container_width=True)
+
+        st.subheader("📋 Violations")
+        rules = st.multiselect("Filter Rules", sorted(violations["rule"].unique()))
+        shown = violations[violations["rule"].isin(rules)] if rules else violations
+        st.dataframe(shown, use_container_width=True, hide_index=True)
+
+        st.download_button("📥 Download Violations (CSV)", violations.to_csv(index=False).encode("utf-8"),
+                           file_name=f"audit_{result['label']}.csv", mime="text/csv")
@@ -0,0 +1,114 @@
+import streamlit as st
+import datetime
+import plotly.graph_objects as go
+from db import get_read_engine
+from auth import check_authentication, check_access
+from rollups import cached_downtime, downtime_pareto, fetch_downtime_comments
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["user", "power user", "admin", "report"])
+
+st.title("⏱️ Downtime Analytics")
+
+branch = st.session_state.get("branch", "main")
+engine = get_read_engine()
+
+GROUPINGS = {
+    "Downtime Type": "activity",
+    "Machine": "machine",
+    "Machine × Type": ["machine", "activity"],
+    "Week": "week",
+    "Month": "month",
+}
+
+
+def pareto_chart(pareto, label):
+    """Bars of downtime hours with the cumulative share as a line on a second axis."""
+    fig = go.Figure()
+    fig.add_bar(x=pareto[label], y=pareto["hours"], name="Hours")
+    fig.add_scatter(x=pareto[label], y=pareto["cumulative share"], name="Cumulative %",
+                    yaxis="y2", mode="lines+markers")
+    fig.update_layout(
+        yaxis=dict(title="Downtime Hours"),
+        yaxis2=dict(title="Cumulative %", overlaying="y", side="right", range=[0, 1.05], tickformat=".0%"),
+        xaxis=dict(type="category"),
+        legend=dict(orientation="h"),
+    )
+    return fig
+
+
+col1, col2, col3 = st.columns(3)
+today = datetime.date.today()
+start_date = col1.date_input("Start Date", today - datetime.timedelta(days=30))
+end_date = col2.date_input("End Date", today)
+group_label = col3.selectbox("Group By", list(GROUPINGS))
+
+if start_date > end_date:
+    st.error("❌ Start Date must be before End Date.")
+    st.stop()
+
+try:
+    downtime = cached_downtime(engine, branch, start_date, end_date)
+except Exception as e:
+    st.error(f"❌ Error loading downtime data: {e}")
+    st.stop()
+
+machines = st.multiselect("Machines", sorted(downtime["machine"].unique()), placeholder="All machines")
+if machines:
+    downtime = downtime[downtime["machine"].isin(machines)]
+
+if downtime.empty:
+    st.info("No downtime recorded in this period.")
+    st.stop()
+
+# ✅ Periods are derived from the date column in one pass
+downtime = downtime.assign(
+    week=downtime["date"].dt.to_period("W").dt.start_time.dt.strftime("%Y-%m-%d"),
+    month=downtime["date"].dt.strftime("%Y-%m"),
+)
+
+by = GROUPINGS[group_label]
+pareto = downtime_pareto(downtime, by)
+if isinstance(by, list):
+    pareto[group_label] = pareto["machine"].astype(str) + " · " + pareto["activity"].astype(str)
+else:
+    pareto[group_label] = pareto[by].astype(str)
+
+c1, c2, c3 = st.columns(3)
+c1.metric("Total Downtime", f"{pareto['hours'].sum():,.1f} hrs")
+c2.metric("Downtime Entries", f"{int(pareto['events'].sum()):,}")
+c3.metric(f"Top {group_label}", pareto[group_label].iloc[0])
+
+st.plotly_chart(pareto_chart(pareto, group_label), use_container_width=True)
+st.dataframe(
+    pareto[[group_label, "hours", "events", "share", "cumulative share"]]
+    .style.format({"hours": "{:,.2f}", "share": "{:.1%}", "cumulative share": "{:.1%}"}),
+    use_container_width=True,
+)
+
+# ✅ Drill down to the comments behind the top causes
+st.subheader("🔍 Comments for Top Causes")
+causes = downtime_pareto(downtime, "activity")
+selected = st.multiselect("Downtime Types", causes["activity"].astype(str).tolist(),
+                          default=causes["activity"].astype(str).head(3).tolist())
+
+if selected:
+    try:
+        comments = fetch_downtime_comments(engine, start_date, end_date, selected, machines)
+        if comments.empty:
+            st.info("No matching downtime entries.")
+        else:
+            st.caption(f"Longest {len(comments)} entries")
+            st.dataframe(comments, use_container_width=True)
+    except Exception as e:
+        st.error(f"❌ Error loading downtime comments: {e}")
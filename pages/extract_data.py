@@ -1,8 +1,7 @@
 import streamlit as st
 import pandas as pd
-from db import get_sqlalchemy_engine
-from io import BytesIO
 from auth import check_authentication
+import export_jobs
 
 # Hide Streamlit's menu and "Manage app" button
 st.markdown("""
@@ -14,28 +13,6 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def fetch_data(engine, table, start_date, end_date):
-    """Fetch data from a given table between two dates."""
-    column_mapping = {
-        "av": "date",
-        "archive": "Date"
-    }
-    date_column = column_mapping[table]
-    query = f"""
-        SELECT * FROM {table}
-        WHERE "{date_column}" BETWEEN '{start_date}' AND '{end_date}'
-    """
-    return pd.read_sql(query, con=engine)
-
-def generate_excel(av_df, archive_df, branch, start_date, end_date):
-    """Generate an Excel file with two sheets."""
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        av_df.to_excel(writer, sheet_name='av', index=False)
-        archive_df.to_excel(writer, sheet_name='archive', index=False)
-    filename = f"{branch}_{start_date}_to_{end_date}.xlsx"
-    return output.getvalue(), filename
-
 # Authenticate user
 check_authentication()
 
@@ -45,22 +22,18 @@ st.title("Extract Data")
 start_date = st.date_input("Start Date")
 end_date = st.date_input("End Date")
 
+branch = st.session_state.get("branch", "main")
+username = st.session_state.get("username")
+
+# Extracts are built in the background; the file appears below when it is ready
 if st.button("Extract Data"):
     if start_date > end_date:
         st.error("Start date cannot be after end date.")
     else:
-        branch = st.session_state.get("branch", "main")
-        engine = get_sqlalchemy_engine()
-        
-        av_data = fetch_data(engine, "av", start_date, end_date)
-        archive_data = fetch_data(engine, "archive", start_date, end_date)
-        
-        excel_data, filename = generate_excel(av_data, archive_data, branch, start_date, end_date)
-        
-        st.download_button(
-            label="Download Excel File",
-            data=excel_data,
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        job, created = export_jobs.submit_extract(branch, start_date, end_date, username)
+        if created:
+            st.success("Extract started. You can keep working; the download appears below when it is ready.")
+        else:
+            st.info("This extract is already running or ready below.")
 
+export_jobs.jobs_panel(branch, username, kind="extract")
@@ -0,0 +1,62 @@
+import streamlit as st
+import io
+from db import get_sqlalchemy_engine
+from auth import check_authentication, check_access
+from history_import import import_csv, TABLES, DEFAULT_CHUNKSIZE
+
+# Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate user and allow admins only (imports write straight into production tables)
+check_authentication()
+check_access(["admin"])
+
+st.title("📥 Import Historical Data")
+
+branch = st.session_state.get("branch", "main")
+st.write(f"Importing into branch: **{branch}**")
+
+table = st.selectbox("Target Table", sorted(TABLES))
+uploaded_file = st.file_uploader("CSV file (same columns as archive.csv / av.csv)", type="csv")
+chunksize = st.number_input("Rows per chunk", min_value=1_000, max_value=500_000, value=DEFAULT_CHUNKSIZE, step=10_000)
+dayfirst = st.checkbox("Dates are day-first (e.g. 31/01/2024)")
+
+if st.button("Start Import"):
+    if uploaded_file is None:
+        st.error("Please upload a CSV file.")
+    else:
+        engine = get_sqlalchemy_engine()
+        total_rows = max(uploaded_file.getvalue().count(b"\n") - 1, 1)
+        uploaded_file.seek(0)
+
+        progress_bar = st.progress(0.0, text="Starting import...")
+
+        def show_progress(stats):
+            progress_bar.progress(
+                min(stats["read"] / total_rows, 1.0),
+                text=f"{stats['read']:,} read · {stats['loaded']:,} loaded · {stats['rejected']:,} rejected",
+            )
+
+        rejected_file = io.StringIO()
+        try:
+            stats = import_csv(engine, table, uploaded_file, rejected_file,
+                               chunksize=int(chunksize), progress=show_progress, dayfirst=dayfirst,
+                               branch=branch)
+            st.success(f"✅ {stats['loaded']:,} rows loaded into {table} in {stats['seconds']:.1f}s.")
+            if stats["rejected"]:
+                st.warning(f"⚠️ {stats['rejected']:,} rows were rejected.")
+                st.download_button(
+                    label="📥 Download Rejected Rows",
+                    data=rejected_file.getvalue().encode("utf-8"),
+                    file_name=f"{table}_rejected.csv",
+                    mime="text/csv",
+                )
+        except Exception as e:
+            st.error(f"❌ Import failed: {e}")
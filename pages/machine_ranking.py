@@ -0,0 +1,68 @@
+import streamlit as st
+import datetime
+import plotly.express as px
+from db import get_sqlalchemy_engine, get_read_engine
+from auth import check_authentication, check_access
+from rollups import (RANKING_WINDOWS, RANKING_METRICS, cached_oee_ranking, clear_ranking_cache, clear_downtime_cache,
+                     rebuild_oee_rollup, rebuild_downtime_rollup)
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["user", "power user", "admin", "report"])
+
+st.title("🏆 Machine Ranking")
+
+branch = st.session_state.get("branch", "main")
+primary = get_sqlalchemy_engine()
+engine = get_read_engine()
+
+col1, col2, col3 = st.columns(3)
+end_date = col1.date_input("Period Ending", datetime.date.today())
+days = col2.selectbox("Window", RANKING_WINDOWS, format_func=lambda d: f"Last {d} days")
+metric = col3.selectbox("Rank By", list(RANKING_METRICS))
+
+try:
+    ranking = cached_oee_ranking(engine, branch, end_date)
+except Exception as e:
+    st.error(f"❌ Error loading machine ranking: {e}")
+    st.stop()
+
+# ✅ Keep the selected window only and sort best → worst
+columns = [f"{name} {days}d" for name in RANKING_METRICS] + [f"Shifts {days}d"]
+table = ranking[["Machine"] + columns].dropna(subset=[f"Shifts {days}d"])
+table = table.sort_values(f"{metric} {days}d", ascending=False).reset_index(drop=True)
+table.index += 1
+
+if table.empty:
+    st.info("No shift reports in this period.")
+else:
+    fig = px.bar(table, x="Machine", y=f"{metric} {days}d", title=f"{metric} by Machine · last {days} days")
+    fig.update_layout(yaxis_tickformat=".0%")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(
+        table.style.format({col: "{:.1%}" for col in columns[:-1]}),
+        use_container_width=True,
+    )
+
+# ✅ Admins can rebuild the summaries, e.g. after editing av/archive outside the app
+if st.session_state.get("role") == "admin":
+    if st.button("🔄 Rebuild Ranking Data"):
+        try:
+            rebuild_oee_rollup(primary)
+            rebuild_downtime_rollup(primary)
+            clear_ranking_cache()
+            clear_downtime_cache()
+            st.success("✅ Ranking and downtime data rebuilt.")
+            st.rerun()
+        except Exception as e:
+            st.error(f"❌ Error rebuilding ranking data: {e}")
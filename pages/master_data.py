@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy.sql import text
-from db import get_sqlalchemy_engine
+from db import get_sqlalchemy_engine, get_read_engine
 from auth import check_authentication, check_access
+from master_sync import load_rate_matrix, diff_rate_matrix, save_rate_changes
+from product_search import product_picker, clear_search_cache
 
 # Hide Streamlit's menu and "Manage app" button
 st.markdown("""
@@ -22,6 +24,8 @@ check_access(["admin", "power user"])
 
 # ✅ Get database engine for the user's assigned branch
 engine = get_sqlalchemy_engine()
+# ✅ Product listings can come from a read replica
+read_engine = get_read_engine()
 
 st.title("📦 Manage Products & Standard Rates")
 
@@ -29,40 +33,25 @@ st.title("📦 Manage Products & Standard Rates")
 with st.expander("✏️ Edit Product Definition", expanded=False):
     st.markdown("### Add/Edit Product Details")
 
-    def fetch_products():
-        """Fetch product names and IDs from the database."""
-        query = text("SELECT id, name FROM products ORDER BY name")
-        try:
-            with engine.connect() as conn:
-                df = pd.read_sql(query, conn)
-            return df
-        except Exception as e:
-            st.error(f"❌ Error fetching products: {e}")
-            return pd.DataFrame()
-
-    products = fetch_products()
-    product_options = {row["name"]: row["id"] for _, row in products.iterrows()}
-    selected_product = st.selectbox("Select a product", ["New Product"] + list(product_options.keys()))
+    selected_product = product_picker(read_engine, "Select a product", key="edit_product", placeholder="New Product")
 
-    def fetch_product_details(product_id):
+    def fetch_product_details(product_name):
         """Fetch details of a selected product."""
         query = text("""
             SELECT name, batch_size, units_per_box, primary_units_per_box, oracle_code
-            FROM products WHERE id = :id
+            FROM products WHERE name = :name
         """)
         try:
             with engine.connect() as conn:
-                df = pd.read_sql(query, conn, params={"id": product_id})
+                df = pd.read_sql(query, conn, params={"name": product_name})
             return df.iloc[0].to_dict() if not df.empty else None  # ✅ Always return a dictionary
         except Exception as e:
             st.error(f"❌ Error fetching product details: {e}")
             return None
 
     if selected_product != "New Product":
-        product_id = product_options[selected_product]
-        product_data = fetch_product_details(product_id)
+        product_data = fetch_product_details(selected_product)
     else:
-        product_id = None
         product_data = None
 
     # ✅ Form Inputs
@@ -93,6 +82,7 @@ with st.expander("✏️ Edit Product Definition", expanded=False):
                             "name": name, "batch_size": batch_size, "units_per_box": units_per_box,
                             "primary_units_per_box": primary_units_per_box, "oracle_code": oracle_code
                         })
+                    clear_search_cache()  # ✅ New or renamed products must show up in searches
                     st.success("✅ Product saved successfully!")
                 except Exception as e:
                     st.error(f"❌ Error saving product: {e}")
@@ -104,13 +94,61 @@ with st.expander("✏️ Edit Product Definition", expanded=False):
         if st.button("❌ Cancel"):
             st.rerun()
 
+# ✅ Expander for the product × machine rate matrix (edited in one render, saved in one write)
+with st.expander("🧮 Rate Matrix Editor", expanded=False):
+    st.markdown("### Edit Standard Rates for Many Products")
+
+    # ✅ The matrix is kept per branch, so switching branch never edits another branch's rates
+    matrix_branch = st.session_state.get("branch", "main")
+    matrix_key = f"rate_matrix_of_{matrix_branch}"
+    reload_matrix = st.button("🔄 Reload Matrix")  # ✅ Rendered on every run, including the first
+    if matrix_key not in st.session_state or reload_matrix:
+        try:
+            with engine.connect() as conn:
+                st.session_state[matrix_key] = load_rate_matrix(conn)
+        except Exception as e:
+            st.error(f"❌ Error fetching rate matrix: {e}")
+
+    # ✅ A failed load is retried on the next run; until then show an empty matrix (product names as index)
+    rate_matrix = st.session_state.get(matrix_key, pd.DataFrame(index=pd.Index([], dtype=str)))
+    product_filter = st.text_input("Filter products", key="matrix_product_filter")
+    machine_filter = st.multiselect("Machines", list(rate_matrix.columns), key=f"matrix_machines_{matrix_branch}")
+
+    visible = rate_matrix
+    if product_filter:
+        visible = visible[visible.index.str.contains(product_filter, case=False, regex=False)]
+    if machine_filter:
+        visible = visible[machine_filter]
+
+    st.caption(f"{len(visible)} products × {len(visible.columns)} machines. Blank cells have no standard rate.")
+
+    with st.form("rate_matrix_form"):
+        edited_matrix = st.data_editor(
+            visible,
+            use_container_width=True,
+            num_rows="fixed",
+            key=f"rate_matrix_{matrix_branch}_{product_filter}_{'|'.join(machine_filter)}",
+        )
+        save_matrix = st.form_submit_button("✅ Save Matrix Changes")
+
+    if save_matrix:
+        matrix_changes = diff_rate_matrix(visible, edited_matrix)
+        if matrix_changes.empty:
+            st.info("No rates were changed.")
+        else:
+            try:
+                save_rate_changes(engine, matrix_changes, matrix_branch)
+                st.success(f"✅ {len(matrix_changes)} rates updated successfully!")
+                st.dataframe(matrix_changes, use_container_width=True)
+                st.session_state.pop(matrix_key, None)  # Reload fresh values on the next run
+            except Exception as e:
+                st.error(f"❌ Error saving rates: {e}")
+
 # ✅ Expander for Standard Rates
 with st.expander("⚙️ Edit Product Standard Rate", expanded=False):
     st.markdown("### Update Product Standard Rates")
 
-    products = fetch_products()
-    product_list = products["name"].tolist()
-    selected_product = st.selectbox("Select a product", ["Select"] + product_list)
+    selected_product = product_picker(read_engine, "Select a product", key="rate_product", placeholder="Select")
 
     def fetch_rates(product):
         """Fetch existing rates for a product."""
@@ -154,16 +192,14 @@ with st.expander("⚙️ Edit Product Standard Rate", expanded=False):
             if st.button("✅ Save Changes"):
                 def save_rates():
                     """Save updated rates."""
-                    query = text("""
-                        INSERT INTO rates (product, machine, standard_rate)
-                        VALUES (:product, :machine, :standard_rate)
-                        ON CONFLICT (product, machine) 
-                        DO UPDATE SET standard_rate = EXCLUDED.standard_rate
-                    """)
+                    rows = pd.DataFrame({
+                        "product": selected_product,
+                        "machine": list(updated_rates.keys()),
+                        "standard_rate": list(updated_rates.values()),
+                    })
                     try:
-                        with engine.begin() as conn:  # ✅ Use `begin()` instead of commit
-                            for machine, rate in updated_rates.items():
-                                conn.execute(query, {"product": selected_product, "machine": machine, "standard_rate": rate})
+                        # ✅ One multi-row upsert for all changed machines
+                        save_rate_changes(engine, rows, st.session_state.get("branch", "main"))
                         st.success("✅ Rates updated successfully!")
                     except Exception as e:
                         st.error(f"❌ Error saving rates: {e}")
@@ -0,0 +1,81 @@
+import streamlit as st
+from db import get_branches
+from auth import check_authentication, check_access
+from master_sync import SPECS, BUNDLED_SHEETS, read_sheet, sync_branches, summarize
+from product_search import clear_search_cache
+
+# Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Same access as the master data page
+check_authentication()
+check_access(["admin", "power user"])
+
+st.title("🔄 Sync Master Data from Sheets")
+st.write("Upload machines, products or rates sheets (CSV). Only rows that differ from the database are written.")
+
+branch = st.session_state.get("branch", "main")
+
+uploads = {}
+for kind in SPECS:
+    uploads[kind] = st.file_uploader(f"{kind.capitalize()} sheet", type="csv", key=f"sync_{kind}")
+
+use_bundled = st.checkbox("Use the bundled CSVs for sheets that are not uploaded")
+
+# ✅ Only admins may push a sheet to every branch at once
+if st.session_state.get("role") == "admin":
+    target = st.radio("Target", [f"Current branch ({branch})", "All branches"], horizontal=True)
+    branches = get_branches() if target == "All branches" else [branch]
+else:
+    branches = [branch]
+
+sheets = {}
+try:
+    for kind in SPECS:
+        if uploads[kind] is not None:
+            sheets[kind] = read_sheet(kind, uploads[kind])
+        elif use_bundled:
+            sheets[kind] = read_sheet(kind, BUNDLED_SHEETS[kind])
+except Exception as e:
+    st.error(f"❌ Could not read sheet: {e}")
+    st.stop()
+
+if not sheets:
+    st.info("Upload at least one sheet to compare.")
+    st.stop()
+
+col1, col2 = st.columns(2)
+preview = col1.button("🔍 Preview Changes")
+apply = col2.button("✅ Apply Changes")
+
+if preview or apply:
+    with st.spinner(f"Comparing with {len(branches)} branch(es)..."):
+        results = sync_branches(branches, sheets, apply=apply)
+    if apply:
+        clear_search_cache()
+
+    for name, result in results.items():
+        if isinstance(result, Exception):
+            st.error(f"❌ {name}: {result}")
+            continue
+
+        st.subheader(f"🏢 {name}")
+        if apply:
+            st.success(f"✅ Applied: {summarize(result)}")
+        else:
+            st.write(summarize(result))
+
+        for kind in SPECS:
+            if kind in result and not result[kind].empty:
+                with st.expander(f"{kind.capitalize()} changes ({len(result[kind])})"):
+                    st.dataframe(result[kind], use_container_width=True)
+        if len(result.get("skipped_rates", [])):
+            with st.expander(f"Skipped rates ({len(result['skipped_rates'])})"):
+                st.dataframe(result["skipped_rates"], use_container_width=True)
@@ -11,6 +11,12 @@ from db import get_db_connection
 import psycopg2
 import bcrypt
 from auth import check_authentication, check_access
+import shift_report
+from product_search import product_picker, cached_search, existing_products
+from shift_report import clean_dataframe
+from rollups import refresh_oee_rollup, refresh_downtime_rollup
+import change_feed
+import write_queue
 # Hide Streamlit's menu and "Manage app" button
 st.markdown("""
     <style>
@@ -37,11 +43,12 @@ def reset_form():
     st.session_state.pop("shift_type", None)
     st.session_state.pop("shift_duration", None)
     st.session_state.pop("selected_product", None)
-    st.session_state.pop("product_batches", None)
+    st.session_state.pop("selected_product_search", None)
+    st.session_state.pop("selected_product_page", None)
+    st.session_state.pop("batch_draft", None)
+    st.session_state.pop("bulk_batches_machine", None)
     
     # ✅ Ensure submitted data is cleared
-    st.session_state.pop("submitted_archive_df", None)
-    st.session_state.pop("submitted_av_df", None)
     st.session_state.pop("modify_mode", None)
     st.session_state.pop("proceed_clicked", None)
     st.session_state.pop("show_confirmation", None)
@@ -128,45 +135,28 @@ def fetch_data(query):
 # Fetch machine list from database
 machine_list = fetch_data("SELECT name FROM machines")
 
-# Fetch product list from database
-product_list = fetch_data("SELECT name FROM products")
+# ✅ Products are searched page by page; only check that at least one exists
+product_list_available = bool(cached_search(engine, "", 0, 1)[0])
 
 # Check if product_list is empty
-if not product_list:
+if not product_list_available:
     st.error("⚠️ Product list is empty. Please check the database.")
-def clean_dataframe(df):
-    """
-    Cleans the dataframe by:
-    1. Converting column names to strings to prevent errors.
-    2. Stripping whitespaces from column names.
-    3. Converting empty strings in numeric columns to NaN.
-    4. Ensuring consistent data types.
-    """
-    df.columns = df.columns.astype(str).str.strip()  # Ensure all column names are strings
-    
-    numeric_cols = ["time", "quantity", "rate", "standard rate", "efficiency"]  # Adjust as needed
-
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")  # Convert to float, replace invalid values with NaN
-    
-    return df
 
 
 st.title("Shift Output Report")
 
+# ✅ Result of the last "Approve and Save", kept across the rerun that resets the form
+if "queue_message" in st.session_state:
+    st.success(st.session_state.pop("queue_message"))
+
 # Initialize session state for submitted data and modify mode
-if "submitted_archive_df" not in st.session_state:
-    st.session_state.submitted_archive_df = pd.DataFrame()
-if "submitted_av_df" not in st.session_state:
-    st.session_state.submitted_av_df = pd.DataFrame()
 if "modify_mode" not in st.session_state:
     st.session_state.modify_mode = False
 if st.button("Restart App"):
     reset_form()
     st.rerun()  # ✅ Force rerun to apply changes
 # Check if product_list is empty
-if not product_list:
+if not product_list_available:
     st.error("Product list is empty. Please check products.csv.")
 else:
     # Read shift types from shifts.csv
@@ -206,6 +196,8 @@ if st.session_state.get("proceed_clicked", False):
 
     col1, col2 = st.columns(2)
     if col1.button("🗑️ Delete Existing Data and Proceed"):
+        deleted = [change_feed.Change(st.session_state.get("branch", "main"), table, str(date), shift_type, selected_machine)
+                   for table in ("archive", "av")]
         try:
             with engine.begin() as conn:  # Use engine.begin() to keep connection open
             # Check if records exist before deleting
@@ -236,9 +228,13 @@ if st.session_state.get("proceed_clicked", False):
                         DELETE FROM archive WHERE "Date" = :date AND "Machine" = :machine AND "Day/Night/plan" = :shift
                     """)
                     conn.execute(delete_query_archive, {"date": date, "shift": shift_type, "machine": selected_machine})
+                    refresh_oee_rollup(conn, [date])
+                    refresh_downtime_rollup(conn, [date])
+                    change_feed.notify(conn, deleted)
 
                     st.success("✅ Existing records deleted. You can proceed with new data entry.")
                     st.session_state.proceed_clicked = False  # Reset proceed state
+            change_feed.publish(deleted)
 
         except Exception as e:
             st.error(f"❌ Error deleting records: {e}")
@@ -279,36 +275,107 @@ for dt_type in downtime_types:
             )
 
 
-if "product_batches" not in st.session_state:
-    st.session_state.product_batches = {}
-
-selected_product = st.selectbox("Select Product", [""] + product_list, index=0, key="selected_product")
-
-# Allow adding batches for multiple products
-if selected_product:
-    if selected_product not in st.session_state.product_batches:
-        st.session_state.product_batches[selected_product] = []
-with st.form("batch_entry_form"):
-    batch = st.text_input("Batch Number")
-    quantity = st.number_input("Production Quantity", min_value=0.0, step=0.1, format="%.1f")
-    time_consumed = st.number_input("Time Consumed (hours)", min_value=0.0, step=0.1, format="%.1f")
-    add_batch = st.form_submit_button("Add Batch")
-
-    if add_batch:
-        if selected_product:
-            if len(st.session_state.product_batches[selected_product]) < 5:
-                st.session_state.product_batches[selected_product].append({
-                    "batch": batch,
-                    "quantity": quantity,
-                    "time_consumed": time_consumed
-                })
+# ✅ Batches of all products (single and bulk entries) live in one compact draft per session
+if "batch_draft" not in st.session_state:
+    st.session_state.batch_draft = shift_report.BatchDraft()
+draft = st.session_state.batch_draft
+
+selected_product = product_picker(engine, "Select Product", key="selected_product")
+
+entry_mode = st.radio("Batch Entry Mode", ["Single Batch", "Bulk Entry"], horizontal=True, key="entry_mode")
+
+if entry_mode == "Single Batch":
+    with st.form("batch_entry_form"):
+        batch = st.text_input("Batch Number")
+        quantity = st.number_input("Production Quantity", min_value=0.0, step=0.1, format="%.1f")
+        time_consumed = st.number_input("Time Consumed (hours)", min_value=0.0, step=0.1, format="%.1f")
+        add_batch = st.form_submit_button("Add Batch")
+
+        if add_batch:
+            if selected_product:
+                if len(draft.rows(selected_product)) < 5:
+                    draft.add(selected_product, batch, quantity, time_consumed)
+                else:
+                    st.error(f"You can add a maximum of 5 batches for {selected_product}.")
             else:
-                st.error(f"You can add a maximum of 5 batches for {selected_product}.")
+                st.error("Please select a product before adding a batch.")
+else:
+    # ✅ Bulk mode: all rows are submitted together, so editing the grid causes no reruns
+    st.caption("Edit the grid, paste CSV text or upload a CSV with batch number, quantity and time columns. "
+               "A product column is optional and defaults to the selected product.")
+    # ✅ Grid choices are the products that have a standard rate on this machine
+    if selected_machine and st.session_state.get("bulk_rates_machine") != selected_machine:
+        st.session_state.bulk_rates = shift_report.load_machine_rates(engine, selected_machine)
+        st.session_state.bulk_rates_machine = selected_machine
+    grid_products = sorted(st.session_state.bulk_rates.index) if selected_machine else []
+
+    with st.form("bulk_batch_form"):
+        grid = st.data_editor(
+            pd.DataFrame({"product": pd.Series(dtype=str), "batch": pd.Series(dtype=str),
+                          "quantity": pd.Series(dtype=float), "time_consumed": pd.Series(dtype=float)}),
+            num_rows="dynamic",
+            use_container_width=True,
+            column_config={
+                "product": st.column_config.SelectboxColumn("Product", options=grid_products, default=selected_product or None),
+                "batch": st.column_config.TextColumn("Batch Number"),
+                "quantity": st.column_config.NumberColumn("Production Quantity", min_value=0.0, step=0.1),
+                "time_consumed": st.column_config.NumberColumn("Time Consumed (hours)", min_value=0.0, step=0.1),
+            },
+            key="bulk_grid",
+        )
+        pasted_batches = st.text_area("Or paste CSV rows", placeholder="batch number,quantity,time")
+        uploaded_batches = st.file_uploader("Or upload a CSV file", type="csv")
+        add_bulk = st.form_submit_button("Validate and Add Batches")
+
+    if add_bulk:
+        if not selected_machine:
+            st.error("Please select a machine before adding batches.")
         else:
-            st.error("Please select a product before adding a batch.")
+            try:
+                sheets = [shift_report.normalize_batch_sheet(grid, selected_product)]
+                if pasted_batches.strip():
+                    sheets.append(shift_report.read_batch_sheet(pasted_batches, selected_product))
+                if uploaded_batches is not None:
+                    sheets.append(shift_report.read_batch_sheet(uploaded_batches, selected_product))
+                bulk_rows = pd.concat(sheets, ignore_index=True)
+
+                known_products = existing_products(engine, bulk_rows["product"])
+                valid_batches, rejected_batches = shift_report.validate_batches(bulk_rows, st.session_state.bulk_rates, known_products)
+                draft.add_bulk(valid_batches)
+                st.session_state.bulk_batches_machine = selected_machine
+
+                st.success(f"✅ {len(valid_batches)} batches added.")
+                if not rejected_batches.empty:
+                    st.error(f"⚠️ {len(rejected_batches)} rows rejected. Fix them and submit again.")
+                    st.dataframe(rejected_batches)
+            except Exception as e:
+                st.error(f"❌ Could not read batches: {e}")
+
+# ✅ Bulk batches carry the standard rate of the machine they were validated against
+if draft.has_bulk() and st.session_state.get("bulk_batches_machine") != selected_machine:
+    if selected_machine:
+        machine_rates = shift_report.load_machine_rates(engine, selected_machine)
+        bulk_rows = draft.to_frame(bulk=True).drop(columns="standard_rate").astype(str)
+        known_products = existing_products(engine, bulk_rows["product"])
+        valid_batches, rejected_batches = shift_report.validate_batches(bulk_rows, machine_rates, known_products)
+        draft.replace_bulk(valid_batches)
+        st.session_state.bulk_batches_machine = selected_machine
+        if not rejected_batches.empty:
+            st.warning(f"⚠️ {len(rejected_batches)} bulk batches were removed after changing the machine.")
+            st.dataframe(rejected_batches)
+
+if draft.has_bulk():
+    bulk_batches = draft.to_frame(bulk=True)
+    st.subheader(f"Bulk Batches ({len(bulk_batches)})")
+    st.dataframe(bulk_batches, use_container_width=True)
+    if st.button("Clear Bulk Batches"):
+        draft.clear_bulk()
+        st.rerun()
+
     # Display added batches for the selected product with delete buttons
-for product, batch_list in st.session_state.product_batches.items():
-    if batch_list:  # Only show if there are batches
+for product in draft.single_products():
+    batch_rows = draft.rows(product)
+    if batch_rows:  # Only show if there are batches
         st.subheader(f"Added Batches for {product}:")
         
              # Display table headers
@@ -320,18 +387,18 @@ for product, batch_list in st.session_state.product_batches.items():
 
         # Ensure batch_data exists
         batches_to_delete = []
-        for i, batch in enumerate(batch_list):
-            cols[0].write(batch["batch"])
-            cols[1].write(batch["quantity"])
-            cols[2].write(batch["time_consumed"])
+        for i, row in enumerate(batch_rows):
+            cols[0].write(draft.batch[row])
+            cols[1].write(draft.quantity[row])
+            cols[2].write(draft.time_consumed[row])
             
             # Delete button
             if cols[3].button("Delete", key=f"delete_{product}_{i}"):
-                batches_to_delete.append(i)
+                batches_to_delete.append(row)
 
         # Remove selected batches
-        for i in sorted(batches_to_delete, reverse=True):
-            del st.session_state.product_batches[product][i]
+        for row in sorted(batches_to_delete, reverse=True):
+            draft.remove(row)
             st.rerun()
 
 
@@ -389,37 +456,20 @@ for dt_type in downtime_types:
         archive_data.append(archive_row)  # Append to the list
 
 # Construct archive_df (Production batch records)
-# ✅ Initialize average_efficiency with a default value
-average_efficiency = 0  # Default to 0 if no efficiency data is available
-# ✅ Always initialize production_data before using it
-production_data = []
-efficiencies = []  # Declare only once
-
-if "product_batches" in st.session_state and st.session_state["product_batches"]:
-    for product, batch_list in st.session_state["product_batches"].items():
-        for batch in batch_list:
-            rate = batch["quantity"] / batch["time_consumed"] if batch["time_consumed"] != 0 else 0
-            standard_rate = get_standard_rate(product, selected_machine) or 1  # Avoid division by zero
-            efficiency = rate / standard_rate
-            efficiencies.append(efficiency)
-            # ✅ Ensure efficiency calculation runs even if no products are added
-            if efficiencies:
-                average_efficiency = sum(efficiencies) / len(efficiencies)
-                production_data.append({
-                    "Date": date,
-                    "Machine": selected_machine,
-                    "Day/Night/plan": shift_type,
-                    "Activity": "Production",
-                    "time": batch["time_consumed"],
-                    "Product": product,
-                    "batch number": batch["batch"],
-                    "quantity": batch["quantity"],
-                    "comments": "",
-                    "rate": rate,
-                    "standard rate": standard_rate,
-                    "efficiency": efficiency,
-                })
+# ✅ Single batches take the selected machine's standard rate, looked up once per product;
+#    bulk batches keep the rate they were validated against
+single_batches = draft.to_frame(bulk=False)
+standard_rates = {product: get_standard_rate(product, selected_machine) or 1  # Avoid division by zero
+                  for product in single_batches["product"].cat.categories}
+single_batches["standard_rate"] = single_batches["product"].map(standard_rates).astype("float64")
+batches = pd.concat([single_batches, draft.to_frame(bulk=True)], ignore_index=True)
 
+production_data = []
+efficiencies = []
+if not batches.empty:
+    production_archive = shift_report.batches_to_archive(batches, date, selected_machine, shift_type)
+    production_data = production_archive.to_dict("records")
+    efficiencies = production_archive["efficiency"].tolist()
 
 # ✅ Merge both downtime and production records
 archive_data.extend(production_data)
@@ -428,9 +478,7 @@ archive_data.extend(production_data)
 archive_df = pd.DataFrame(archive_data)
 
             # Construct av_df
-total_production_time = sum(
-    batch["time_consumed"] for product, batch_list in st.session_state.product_batches.items() for batch in batch_list
-)
+total_production_time = draft.total_time()
 
 filtered_shift = shifts_df.loc[shifts_df['code'] == shift_duration, 'working hours']
 
@@ -441,13 +489,9 @@ else:
     standard_shift_time = None  # Set default value or handle gracefully
 
 
-if shift_duration == "partial":
-    total_downtime = sum(downtime_data.values()) - sum(1 for key in downtime_data if "_comment" in key)
-    availability = total_production_time / (total_production_time + total_downtime) if (total_production_time + total_downtime) != 0 else 0
-else:
-    availability = total_production_time / standard_shift_time if standard_shift_time != 0 else 0
-
-OEE = 0.99 * availability * average_efficiency
+total_downtime = sum(downtime_data[dt] for dt in downtime_types)
+availability, average_efficiency, OEE = shift_report.shift_metrics(
+    total_production_time, total_downtime, standard_shift_time, efficiencies, partial=shift_duration == "partial")
 av_row = {
                     "date": date,
                     "machine": selected_machine,
@@ -461,19 +505,12 @@ av_row = {
 }
 av_df = pd.DataFrame([av_row])
 
-# Store submitted data in session state
-st.session_state.submitted_archive_df = archive_df
-st.session_state.submitted_av_df = av_df
-
-# Display submitted data
+# Display submitted data (rebuilt from the draft on every run, never kept in session state)
 st.subheader("Submitted Archive Data")
-st.dataframe(st.session_state.submitted_archive_df)
+st.dataframe(archive_df)
 st.subheader("Submitted AV Data")
-st.dataframe(st.session_state.submitted_av_df)
+st.dataframe(av_df)
            # Compute total recorded time (downtime + production time)
-total_production_time = sum(
-    batch["time_consumed"] for product, batch_list in st.session_state.product_batches.items() for batch in batch_list
-)
 total_downtime = sum(downtime_data[dt] for dt in downtime_types)
 total_recorded_time = total_production_time + total_downtime
 
@@ -488,7 +525,6 @@ except IndexError:
     standard_shift_time = 0  # Default to 0 to avoid None issues
 
 # Compute total recorded time (downtime + production time)
-total_production_time = sum(batch["time_consumed"] for batch in st.session_state.product_batches[selected_product])
 total_downtime = sum(downtime_data[dt] for dt in downtime_types)
 total_recorded_time = archive_df["time"].sum()
 
@@ -539,22 +575,17 @@ else:
     
 if st.button("Approve and Save"):
     try:
+        branch = st.session_state.get("branch", "main")
         # Check for duplicate entries in both "av" and "archive" tables
-        query_av = text("""
-            SELECT COUNT(*) FROM av 
-            WHERE date = :date AND "shift" = :shift AND machine = :machine
-        """)
-        query_archive = text("""
-            SELECT COUNT(*) FROM archive 
-            WHERE "Date" = :date AND "Machine" = :machine AND "Day/Night/plan" = :shift
-        """)
-
-        with engine.connect() as conn:
-            result_av = conn.execute(query_av, {"date": date, "shift": shift_type, "machine": selected_machine}).fetchone()
-            result_archive = conn.execute(query_archive, {"date": date, "shift": shift_type, "machine": selected_machine}).fetchone()
-
         # If a duplicate exists in either table, STOP execution completely
-        if (result_av and result_av[0] > 0) or (result_archive and result_archive[0] > 0):
+        try:
+            already_saved = shift_report.report_exists(engine, date, shift_type, selected_machine)
+        except Exception as e:
+            # ✅ The queue worker repeats this check before writing
+            st.warning(f"⚠️ Database unreachable, the duplicate check will run when the report is sent: {e}")
+            already_saved = False
+
+        if already_saved or write_queue.is_queued(branch, date, shift_type, selected_machine):
             st.error("❌ A report for this Date, Shift Type, and Machine already exists. Modify your selection or delete existing data before saving.")
             st.stop()  # ⛔ Completely stop execution
 
@@ -562,8 +593,8 @@ if st.button("Approve and Save"):
             st.success("No existing record found. Proceeding with approval.")
 
             # Clean DataFrames before using them
-            archive_df = clean_dataframe(st.session_state.submitted_archive_df.copy())
-            av_df = clean_dataframe(st.session_state.submitted_av_df.copy())
+            archive_df = clean_dataframe(archive_df.copy())
+            av_df = clean_dataframe(av_df.copy())
 
             # Get shift standard time
             standard_shift_time = shifts_df.loc[shifts_df['code'] == shift_duration, 'working hours'].iloc[0]
@@ -581,12 +612,38 @@ if st.button("Approve and Save"):
             elif time_below_90:
                 st.error(f"Total recorded time ({total_recorded_time} hrs) is less than 90% of shift standard time ({0.9 * standard_shift_time} hrs). Modify the data.")
             else:
-                # Save cleaned data to PostgreSQL
-                archive_df.to_sql("archive", engine, if_exists="append", index=False)
-                av_df.to_sql("av", engine, if_exists="append", index=False)
-                st.success("Data saved to database successfully!")
-                # ✅ Reset form after successful save
-                reset_form()
-                st.rerun()  # ✅ Force rerun to apply changes
+                # Queue cleaned data; the background worker writes it to PostgreSQL
+                if write_queue.enqueue(branch, archive_df, av_df):
+                    st.session_state["queue_message"] = "Report accepted and queued for saving to the database."
+                    # ✅ Reset form after successful save (reset_form reruns the page)
+                    reset_form()
+                else:
+                    st.error("❌ A report for this Date, Shift Type, and Machine is still waiting to be saved. "
+                             "Wait until it is sent, then modify it.")
     except Exception as e:
         st.error(f"Error saving data: {e}")
+
+# ✅ Reports waiting in the local queue for this branch
+write_queue.start_worker()
+queued = write_queue.queue_status(st.session_state.get("branch", "main"))
+waiting = queued[queued["status"].isin(["pending", "sending"])]
+duplicates = queued[queued["status"] == "duplicate"]
+failed = queued[queued["status"] == "failed"]
+if not waiting.empty:
+    st.info(f"📤 {len(waiting)} report(s) waiting to be saved to the database.")
+if not failed.empty:
+    st.error(f"❌ {len(failed)} report(s) could not be saved. Review them under Queued Reports.")
+if not waiting.empty or not duplicates.empty or not failed.empty:
+    with st.expander("📋 Queued Reports", expanded=not failed.empty):
+        st.dataframe(queued[queued["status"] != "saved"].drop(columns=["branch", "saved_at"]), use_container_width=True)
+        # ✅ Reports that will not be saved: the operator dismisses them, or re-enters a corrected report
+        for row in pd.concat([duplicates, failed]).itertuples(index=False):
+            col1, col2 = st.columns([3, 1])
+            if row.status == "duplicate":
+                col1.warning(f"⚠️ {row.key} was not saved: a report for it already exists.")
+            else:
+                col1.error(f"❌ {row.key} was not saved after {row.attempts} attempts: {row.last_error}. "
+                           "Dismiss it, or enter the corrected report again.")
+            if col2.button("Dismiss", key=f"dismiss_{row.key}"):
+                write_queue.discard(row.key)
+                st.rerun()
@@ -0,0 +1,84 @@
+import streamlit as st
+import datetime
+from db import get_sqlalchemy_engine, get_read_engine
+from auth import check_authentication, check_access
+from rate_calibration import (BASES, DEFAULT_MIN_BATCHES, DEFAULT_TOLERANCE, DEFAULT_WINDOW_DAYS,
+                              apply_proposals, cached_rate_stats, load_standard_rates, propose_rates)
+# ✅ Hide Streamlit's menu and "Manage app" button
+st.markdown("""
+    <style>
+        [data-testid="stToolbar"] {visibility: hidden !important;}
+        [data-testid="manage-app-button"] {display: none !important;}
+        header {visibility: hidden !important;}
+        footer {visibility: hidden !important;}
+    </style>
+""", unsafe_allow_html=True)
+
+# ✅ Authenticate and enforce role-based access
+check_authentication()
+check_access(["power user", "admin"])
+
+st.title("🎯 Standard Rate Calibration")
+st.caption("Compares the standard rates with the actual rates of past production batches.")
+
+# ✅ Result of the last apply, kept across the rerun that reloads the proposals
+if "calibration_message" in st.session_state:
+    st.success(st.session_state.pop("calibration_message"))
+
+branch = st.session_state.get("branch", "main")
+engine = get_read_engine()
+
+col1, col2, col3, col4 = st.columns(4)
+days = col1.number_input("History (days)", min_value=30, max_value=3650, value=DEFAULT_WINDOW_DAYS, step=30)
+basis = col2.selectbox("Propose", list(BASES), help="Median: typical batch. P90: what good batches achieve.")
+tolerance = col3.number_input("Tolerance (%)", min_value=1, max_value=100, value=int(DEFAULT_TOLERANCE * 100)) / 100
+min_batches = col4.number_input("Min. Batches", min_value=1, value=DEFAULT_MIN_BATCHES)
+
+end = datetime.date.today()
+try:
+    stats = cached_rate_stats(engine, branch, end - datetime.timedelta(days=int(days)), end)
+    result = propose_rates(stats, load_standard_rates(engine), BASES[basis], tolerance, int(min_batches))
+except Exception as e:
+    st.error(f"❌ Error loading batch history: {e}")
+    st.stop()
+
+proposals = result[result["propose"]].reset_index(drop=True)
+m1, m2, m3 = st.columns(3)
+m1.metric("Pairs With History", len(result))
+m2.metric("Within Tolerance", len(result) - len(proposals))
+m3.metric("Proposed Changes", len(proposals))
+
+if proposals.empty:
+    st.success("✅ All standard rates with enough history are within tolerance.")
+    st.stop()
+
+# ✅ Review: untick rows to leave them out, or edit the proposed rate
+proposals.insert(0, "apply", True)
+edited = st.data_editor(
+    proposals[["apply", "product", "machine", "batches", "standard_rate", "median_rate", "p10_rate", "p90_rate",
+               "deviation", "proposed_rate", "last_batch"]],
+    column_config={
+        "apply": st.column_config.CheckboxColumn("Apply"),
+        "standard_rate": st.column_config.NumberColumn("Current", format="%.4f"),
+        "median_rate": st.column_config.NumberColumn("Median", format="%.4f"),
+        "p10_rate": st.column_config.NumberColumn("P10", format="%.4f"),
+        "p90_rate": st.column_config.NumberColumn("P90", format="%.4f"),
+        "deviation": st.column_config.NumberColumn("Off By", format="percent"),
+        "proposed_rate": st.column_config.NumberColumn("Proposed", min_value=0.0, format="%.4f"),
+    },
+    disabled=["product", "machine", "batches", "standard_rate", "median_rate", "p10_rate", "p90_rate",
+              "deviation", "last_batch"],
+    hide_index=True,
+    use_container_width=True,
+    key=f"calibration_{basis}_{days}_{tolerance}_{min_batches}",
+)
+
+selected = edited[edited["apply"] & (edited["proposed_rate"] > 0)]
+if st.button(f"✅ Apply {len(selected)} Proposed Rates", disabled=selected.empty):
+    try:
+        # ✅ One batched upsert on the primary; the change feed refreshes cached rates
+        written = apply_proposals(get_sqlalchemy_engine(), selected, branch)
+        st.session_state["calibration_message"] = f"✅ {written} standard rates updated."
+        st.rerun()
+    except Exception as e:
+        st.error(f"❌ Error saving rates: {e}")
@@ -1,18 +1,18 @@
 import streamlit as st
+import pandas as pd
 import psycopg2
 import bcrypt
 from db import get_db_connection
 from auth import check_authentication, check_access
+from user_admin import ROLES, PAGE_SIZE, search_users, import_users
 
-def get_users():
-    """Fetch all users from the database."""
+def get_users(term="", role=None, page=0):
+    """Fetch one page of users matching the search."""
     conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, username, role, branch FROM users")
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
-    return users
+    try:
+        return search_users(conn, term, role, page)
+    finally:
+        conn.close()
 
 def add_user(username, password, role, branch):
     """Add a new user with hashed password."""
@@ -59,8 +59,52 @@ check_access(["admin"])
 
 st.title("User Management")
 
-# Display users
-users = get_users()
+# ✅ Bulk import: passwords are hashed in parallel and all accounts are inserted in one transaction
+with st.expander("📥 Bulk Import Users (CSV)"):
+    st.caption("Columns: username, password, role, branch. Blank roles and branches take the defaults below.")
+    col1, col2 = st.columns(2)
+    default_role = col1.selectbox("Default Role", ROLES, index=ROLES.index("user"), key="import_role")
+    default_branch = col2.text_input("Default Branch", key="import_branch")
+    uploaded_users = st.file_uploader("Upload a CSV file", type="csv", key="import_file")
+
+    if st.button("Import Users", disabled=uploaded_users is None):
+        conn = get_db_connection()
+        try:
+            with st.spinner("Hashing passwords and creating users..."):
+                created, rejected = import_users(conn, uploaded_users, default_role, default_branch)
+            st.success(f"✅ {len(created)} users created.")
+            if not rejected.empty:
+                st.error(f"⚠️ {len(rejected)} rows were not imported.")
+                st.dataframe(rejected, use_container_width=True)
+                st.download_button("Download Rejected Rows", rejected.to_csv(index=False), "rejected_users.csv", "text/csv")
+        except Exception as e:
+            st.error(f"❌ Import failed, no users were created: {e}")
+        finally:
+            conn.close()
+
+# ✅ Users are searched and listed one page at a time on the server
+col1, col2 = st.columns([3, 1])
+search = col1.text_input("🔍 Search username or branch", key="user_search")
+role_filter = col2.selectbox("Role", ["All"] + ROLES, key="user_role_filter")
+if st.session_state.get("user_search_last") != (search, role_filter):
+    st.session_state["user_search_last"] = (search, role_filter)
+    st.session_state["user_page"] = 0
+page = st.session_state.get("user_page", 0)
+
+users, has_more = get_users(search, None if role_filter == "All" else role_filter, page)
+st.dataframe(
+    pd.DataFrame(users, columns=["id", "username", "role", "branch"]).set_index("id"),
+    use_container_width=True,
+)
+col1, col2, col3 = st.columns([1, 2, 1])
+if col1.button("◀ Previous", disabled=page == 0):
+    st.session_state["user_page"] = page - 1
+    st.rerun()
+col2.caption(f"Page {page + 1} · {PAGE_SIZE} per page" + (" · more results available" if has_more else ""))
+if col3.button("Next ▶", disabled=not has_more):
+    st.session_state["user_page"] = page + 1
+    st.rerun()
+
 user_options = {str(user[0]): f"{user[1]} ({user[2]})" for user in users}
 selected_user = st.selectbox("Select User to Edit", options=["New User"] + list(user_options.keys()), format_func=lambda x: user_options.get(x, "New User"))
 
@@ -68,7 +112,7 @@ if selected_user == "New User":
     st.subheader("Add New User")
     username = st.text_input("Username")
     password = st.text_input("Password", type="password")
-    role = st.selectbox("Role", ["admin", "user", "power user", "report"])
+    role = st.selectbox("Role", ROLES)
     branch = st.text_input("Branch")
     
     if st.button("Add User"):
@@ -80,7 +124,7 @@ else:
     user_id = int(selected_user)
     user_data = next((u for u in users if u[0] == user_id), None)
     if user_data:
-        new_role = st.selectbox("Role", ["admin", "user", "power user", "report"], index=["admin", "user", "power user", "report"].index(user_data[2]))
+        new_role = st.selectbox("Role", ROLES, index=ROLES.index(user_data[2]) if user_data[2] in ROLES else 0)
         new_branch = st.text_input("Branch", value=user_data[3])
         
         if st.button("Update User"):
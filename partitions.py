@@ -0,0 +1,267 @@
+"""
+Monthly range partitioning of ``archive`` and ``av``, with cold-storage export.
+
+    convert   rebuild a flat table as a table partitioned by month on "Date"/date
+              (run in a maintenance window: the table is locked while rows are copied)
+    ensure    create the partitions for the coming months (also a migrations.py
+              step; schedule it daily from cron, outside page requests)
+    export    write partitions older than a month to compressed Parquet and detach them
+    list      show partitions and row counts
+
+Rows outside every monthly partition land in a DEFAULT partition; ``ensure`` moves
+them into their month when it creates it. Queries filtered on the date column
+are pruned to the matching partitions by PostgreSQL.
+
+Usage:
+    python partitions.py convert --branch main
+    python partitions.py ensure --months 3 --branch main
+    python partitions.py export --before 2023-01 --dir cold_storage --drop --branch main
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine
+
+# Partition key of each table and the (date, machine, shift) key used by duplicate checks
+TABLES = {
+    "archive": {"date": "Date", "key": ["Date", "Machine", "Day/Night/plan"]},
+    "av": {"date": "date", "key": ["date", "machine", "shift"]},
+}
+DEFAULT_MONTHS_AHEAD = 3
+EXPORT_CHUNKSIZE = 100_000
+
+PARTITION_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def month_start(value):
+    value = pd.Timestamp(value)
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(conn, table):
+    query = text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)")
+    return conn.execute(query, {"table": table}).scalar() == "p"
+
+
+def list_partitions(conn, table):
+    """Partitions of ``table`` as (name, month) pairs; month is None for the default partition."""
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+        ORDER BY c.relname
+    """), {"table": table}).fetchall()
+    partitions = []
+    for (name,) in rows:
+        match = PARTITION_NAME.search(name)
+        partitions.append((name, datetime.date(int(match[1]), int(match[2]), 1) if match else None))
+    return partitions
+
+
+def create_partition(conn, table, month):
+    """Create the partition for ``month`` (moving matching rows out of the default partition)."""
+    name = partition_name(table, month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+
+    date_col = TABLES[table]["date"]
+    bounds = {"start": month, "end": add_months(month, 1)}
+    default = f"{table}_default"
+    in_month = f'"{date_col}" >= :start AND "{date_col}" < :end'
+    has_default = conn.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar()
+    stranded = has_default and conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), bounds).scalar()
+
+    if stranded:
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    conn.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{month}') TO ('{bounds['end']}')"
+    ))
+    if stranded:
+        conn.execute(text(f"INSERT INTO {table} SELECT * FROM {default} WHERE {in_month}"), bounds)
+        conn.execute(text(f"DELETE FROM {default} WHERE {in_month}"), bounds)
+        conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    return True
+
+
+def ensure_future_partitions(engine, months_ahead=DEFAULT_MONTHS_AHEAD, tables=TABLES):
+    """Create partitions from the current month through ``months_ahead`` months ahead."""
+    created = []
+    this_month = month_start(datetime.date.today())
+    with engine.begin() as conn:
+        for table in tables:
+            if not is_partitioned(conn, table):
+                continue
+            for n in range(months_ahead + 1):
+                month = add_months(this_month, n)
+                if create_partition(conn, table, month):
+                    created.append(partition_name(table, month))
+    return created
+
+
+def convert_table(engine, table, months_ahead=DEFAULT_MONTHS_AHEAD):
+    """
+    Replace a flat table with a monthly partitioned one holding the same rows.
+    The original table is kept as <table>_unpartitioned for rollback and can be
+    dropped once the new one is verified.
+    """
+    date_col = TABLES[table]["date"]
+    new = f"{table}_partitioned"
+    backup = f"{table}_unpartitioned"
+
+    with engine.begin() as conn:
+        if is_partitioned(conn, table):
+            print(f"{table} is already partitioned.")
+            return 0
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+
+        first, last = conn.execute(text(f'SELECT MIN("{date_col}"), MAX("{date_col}") FROM {table}')).one()
+        this_month = month_start(datetime.date.today())
+        first = month_start(first) if first else this_month
+        last = max(month_start(last) if last else this_month, this_month)
+
+        conn.execute(text(f"""
+            CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+            PARTITION BY RANGE ("{date_col}")
+        """))
+        conn.execute(text(f"CREATE TABLE {new}_default PARTITION OF {new} DEFAULT"))
+        month = first
+        while month <= add_months(last, months_ahead):
+            conn.execute(text(
+                f"CREATE TABLE {partition_name(table, month)} PARTITION OF {new} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            ))
+            month = add_months(month, 1)
+
+        copied = conn.execute(text(f"INSERT INTO {new} SELECT * FROM {table}")).rowcount
+
+        # Serial columns keep counting from the old table's sequences
+        for (column,) in conn.execute(text("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = :table AND column_default LIKE 'nextval(%'
+        """), {"table": table}).fetchall():
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, :column)"),
+                                    {"table": table, "column": column}).scalar()
+            if sequence:
+                conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY {new}."{column}"'))
+
+        # Index names move to the backup so the same definitions can be recreated on the new table
+        indexes = conn.execute(text("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = :table
+        """), {"table": table}).fetchall()
+        for name, _ in indexes:
+            conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{(name + "_unpartitioned")[:63]}"'))
+
+        conn.execute(text(f"ALTER TABLE {table} RENAME TO {backup}"))
+        conn.execute(text(f"ALTER TABLE {new} RENAME TO {table}"))
+        conn.execute(text(f"ALTER TABLE {new}_default RENAME TO {table}_default"))
+
+        skipped = []
+        for name, definition in indexes:
+            if definition.startswith("CREATE UNIQUE"):
+                skipped.append(name)  # Unique indexes on a partitioned table must include the date
+            else:
+                conn.execute(text(definition))
+        key = ", ".join(f'"{col}"' for col in TABLES[table]["key"])
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_report_key_idx ON {table} ({key})"))
+
+    if skipped:
+        print(f"⚠️ Unique indexes not recreated on {table} (still on {backup}): {', '.join(skipped)}")
+    return copied
+
+
+def export_partitions(engine, table, before, out_dir, drop=False, chunksize=EXPORT_CHUNKSIZE):
+    """
+    Write every monthly partition of ``table`` older than ``before`` to
+    <out_dir>/<partition>.parquet (zstd) and detach it; drop it too when ``drop`` is set.
+    Returns the exported partition names.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(out_dir, exist_ok=True)
+    before = month_start(before)
+    with engine.connect() as conn:
+        old = [name for name, month in list_partitions(conn, table) if month and month < before]
+
+    exported = []
+    for name in old:
+        path = os.path.join(out_dir, f"{name}.parquet")
+        tmp_path = path + ".tmp"
+        written = 0
+        writer = None
+        with engine.connect() as conn:
+            expected = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+            for chunk in pd.read_sql(text(f"SELECT * FROM {name}"), conn, chunksize=chunksize):
+                batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, batch.schema, compression="zstd")
+                writer.write_table(batch.cast(writer.schema))
+                written += len(chunk)
+        if writer is not None:
+            writer.close()
+
+        if written != expected:
+            raise RuntimeError(f"{name}: exported {written} rows but the partition holds {expected}")
+        if writer is not None:
+            os.replace(tmp_path, path)
+
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+        exported.append(name)
+        print(f"✅ {name}: {written} rows → {path}" + (" (dropped)" if drop else " (detached)"))
+    return exported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of archive and av.")
+    parser.add_argument("command", choices=["convert", "ensure", "export", "list"])
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--table", choices=sorted(TABLES), action="append", help="Default: both tables")
+    parser.add_argument("--months", type=int, default=DEFAULT_MONTHS_AHEAD, help="Future months to create")
+    parser.add_argument("--before", help="Export partitions older than this month (YYYY-MM)")
+    parser.add_argument("--dir", default="cold_storage", help="Parquet output directory")
+    parser.add_argument("--drop", action="store_true", help="Drop exported partitions instead of keeping them detached")
+    args = parser.parse_args(argv)
+
+    engine = get_sqlalchemy_engine(args.branch)
+    tables = args.table or list(TABLES)
+
+    if args.command == "convert":
+        for table in tables:
+            print(f"✅ {table}: {convert_table(engine, table, args.months)} rows copied into monthly partitions")
+    elif args.command == "ensure":
+        created = ensure_future_partitions(engine, args.months, tables)
+        print(f"✅ Created: {', '.join(created)}" if created else "All partitions already exist.")
+    elif args.command == "export":
+        if not args.before:
+            parser.error("export needs --before YYYY-MM")
+        for table in tables:
+            export_partitions(engine, table, args.before, args.dir, args.drop)
+    else:
+        with engine.connect() as conn:
+            for table in tables:
+                for name, month in list_partitions(conn, table):
+                    count = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                    print(f"{table:<8} {name:<24} {count:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
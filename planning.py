@@ -0,0 +1,125 @@
+"""
+Capacity planning from the standard rates.
+
+Each product has a standard rate on every machine that can run it. Machines of
+one family (machine_families.csv) are alternatives for the same step, so an order
+for Q units is split across the family's machines in proportion to their rates:
+each of them runs Q / (sum of the family's rates) hours. A machine outside every
+family is a step of its own and runs Q / rate hours. Orders are joined to the
+rates and summed per machine in one vectorized pass. The totals are then turned
+into shifts of the chosen shifts.csv code and set against the shifts available
+in the planning horizon.
+"""
+import io
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from shared_cache import cached
+
+# Header spellings accepted in order sheets
+ORDER_COLUMN_ALIASES = {
+    "product": "product",
+    "item": "product",
+    "quantity": "quantity",
+    "qty": "quantity",
+    "order quantity": "quantity",
+}
+
+
+
+def load_rate_table(engine):
+    """All positive standard rates as (product, machine, standard_rate)."""
+    query = text("SELECT product, machine, standard_rate FROM rates")
+    with engine.connect() as conn:
+        rates = pd.read_sql(query, conn)
+    rates["standard_rate"] = pd.to_numeric(rates["standard_rate"], errors="coerce")
+    return rates[rates["standard_rate"] > 0].reset_index(drop=True)
+
+
+@cached("rate_table", tables=["rates"])
+def cached_rate_table(_engine, branch):
+    return load_rate_table(_engine)
+
+
+def load_machine_families(families_path="machine_families.csv"):
+    """
+    Machine -> family from a (machine, family) CSV. A product listed on several
+    machines of a family runs on any of them, not on each in turn. Without the
+    file no machine has a family.
+    """
+    if not os.path.exists(families_path):
+        return {}
+    families = pd.read_csv(families_path, dtype=str, encoding="utf-8-sig").dropna()
+    return dict(zip(families["machine"].str.strip(), families["family"].str.strip()))
+
+
+def read_orders(source):
+    """
+    Read an order sheet (CSV text or file) with product and quantity columns.
+    Returns (orders, rejected), rejected rows carrying a "reason".
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    df = pd.read_csv(source, dtype=str, skipinitialspace=True, keep_default_na=False)
+    df.columns = df.columns.astype(str).str.strip().str.lstrip("\ufeff").str.lower()
+    df = df.rename(columns=ORDER_COLUMN_ALIASES)
+    for col in ["product", "quantity"]:
+        if col not in df.columns:
+            df[col] = ""
+    return clean_orders(df[["product", "quantity"]])
+
+
+def clean_orders(df):
+    """Validate (product, quantity) rows. Returns (orders, rejected)."""
+    product = df["product"].astype(str).str.strip()
+    quantity = pd.to_numeric(df["quantity"], errors="coerce")
+    reason = pd.Series("", index=df.index)
+    reason = reason.mask(quantity.isna() | (quantity <= 0), "invalid quantity")
+    reason = reason.mask(product.eq(""), "missing product")
+    bad = reason.ne("")
+    rejected = df[bad].assign(reason=reason[bad])
+    orders = pd.DataFrame({"product": product[~bad], "quantity": quantity[~bad]}).reset_index(drop=True)
+    return orders, rejected
+
+
+def plan_capacity(orders, rates, shift_hours, available_shifts=None, families=None):
+    """
+    Machine load for ``orders`` (product, quantity); ``families`` maps machines
+    to their family (see load_machine_families()).
+
+    Returns (machine_load, product_load, unplanned):
+    - machine_load: hours, shifts needed and utilization per machine, busiest first;
+      ``bottleneck`` marks machines over capacity (or the busiest one without a horizon)
+    - product_load: quantity and hours per product and machine (an order's quantity is
+      split across the machines of a family), with the product's slowest step flagged
+    - unplanned: ordered products without any standard rate
+    """
+    demand = orders.groupby("product", sort=False)["quantity"].sum()
+    lines = rates.join(demand, on="product", how="inner")
+    lines["family"] = lines["machine"].map(families or {}).fillna(lines["machine"])
+    family_rate = lines.groupby(["product", "family"], sort=False)["standard_rate"].transform("sum").to_numpy()
+    lines["hours"] = lines["quantity"].to_numpy() / family_rate
+    lines["quantity"] = lines["quantity"].to_numpy() * lines["standard_rate"].to_numpy() / family_rate
+
+    unplanned = demand[~demand.index.isin(rates["product"])].reset_index()
+
+    machine_load = (lines.groupby("machine", sort=False)
+                    .agg(products=("product", "size"), quantity=("quantity", "sum"), hours=("hours", "sum"))
+                    .sort_values("hours", ascending=False))
+    machine_load["shifts_needed"] = np.ceil(machine_load["hours"].to_numpy() / shift_hours - 1e-9).astype(int)
+    if available_shifts:
+        capacity = available_shifts * shift_hours
+        machine_load["available_hours"] = capacity
+        machine_load["utilization"] = machine_load["hours"] / capacity
+        machine_load["bottleneck"] = machine_load["utilization"] > 1
+    else:
+        machine_load["bottleneck"] = False
+        if len(machine_load):
+            machine_load.iloc[0, machine_load.columns.get_loc("bottleneck")] = True
+    machine_load = machine_load.reset_index()
+
+    # The machine that takes longest on each product limits how fast the product can flow
+    lines["limiting"] = lines["hours"].eq(lines.groupby("product")["hours"].transform("max"))
+    product_load = lines.sort_values(["product", "hours"], ascending=[True, False]).reset_index(drop=True)
+    return machine_load, product_load, unplanned
@@ -0,0 +1,109 @@
+import streamlit as st
+from sqlalchemy.sql import text
+from db import create_index
+from shared_cache import cached
+
+PAGE_SIZE = 25
+
+
+def ensure_search_index(engine):
+    """
+    Creates the index behind product search (a migration step, see migrations.py).
+    Uses a pg_trgm GIN index (fast ILIKE '%term%'); falls back to a prefix
+    index on lower(name) when the extension cannot be installed.
+    """
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        create_index(engine, "products_name_trgm_idx", "products", "USING gin (lower(name) gin_trgm_ops)")
+    except Exception as e:
+        print(f"⚠️ Trigram index unavailable, using prefix index: {e}")
+        create_index(engine, "products_name_prefix_idx", "products", "(lower(name) text_pattern_ops)")
+
+
+def search_products(engine, term="", page=0, page_size=PAGE_SIZE):
+    """
+    Returns (names, has_more) for one page of products matching ``term``.
+    Names starting with the term are listed before other matches.
+    """
+    term = term.strip().lower()
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    query = text("""
+        SELECT name FROM products
+        WHERE :term = '' OR lower(name) LIKE :contains
+        ORDER BY lower(name) LIKE :prefix DESC, name
+        LIMIT :limit OFFSET :offset
+    """)
+    params = {
+        "term": term,
+        "contains": f"%{escaped}%",
+        "prefix": f"{escaped}%",
+        "limit": page_size + 1,  # One extra row tells whether a next page exists
+        "offset": page * page_size,
+    }
+    with engine.connect() as conn:
+        names = [row[0] for row in conn.execute(query, params).fetchall()]
+    return names[:page_size], len(names) > page_size
+
+
+def existing_products(engine, names):
+    """Return the subset of ``names`` that exist in the products table (one query)."""
+    names = list(dict.fromkeys(names))
+    if not names:
+        return set()
+    query = text("SELECT name FROM products WHERE name = ANY(:names)")
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(query, {"names": names}).fetchall()}
+
+
+@cached("product_search")
+def cached_search_products(_engine, branch, term="", page=0, page_size=PAGE_SIZE):
+    """search_products() cached per branch and search, shared by every app process."""
+    return search_products(_engine, term, page, page_size)
+
+
+def cached_search(engine, term="", page=0, page_size=PAGE_SIZE):
+    """cached_search_products() for the session's branch."""
+    branch = st.session_state.get("branch", "main")
+    return cached_search_products(engine, branch, term.strip().lower(), page, page_size)
+
+
+def clear_search_cache(branch=None):
+    """Forget cached search pages of one branch, or all (call after products are added or renamed)."""
+    cached_search_products.clear(branch)
+
+
+def product_picker(engine, label, key, placeholder=""):
+    """
+    Search box plus a paginated selectbox that only loads matching product names.
+    Returns the selected product name ("" or ``placeholder`` when nothing is selected).
+    """
+    page_key = f"{key}_page"
+    term = st.text_input(f"🔍 Search {label.lower()}", key=f"{key}_search")
+
+    # Start from the first page whenever the search term changes
+    if st.session_state.get(f"{key}_last_term") != term:
+        st.session_state[f"{key}_last_term"] = term
+        st.session_state[page_key] = 0
+    page = st.session_state.get(page_key, 0)
+
+    names, has_more = cached_search(engine, term, page)
+
+    # Keep the current selection visible even if it is not on this page
+    current = st.session_state.get(key, placeholder)
+    options = [placeholder] + names
+    if current and current not in options:
+        options.insert(1, current)
+
+    selected = st.selectbox(label, options, key=key)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    if col1.button("◀ Previous", key=f"{key}_prev", disabled=page == 0):
+        st.session_state[page_key] = page - 1
+        st.rerun()
+    col2.caption(f"Page {page + 1}" + (" · more results available" if has_more else ""))
+    if col3.button("Next ▶", key=f"{key}_next", disabled=not has_more):
+        st.session_state[page_key] = page + 1
+        st.rerun()
+
+    return selected
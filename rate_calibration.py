@@ -0,0 +1,115 @@
+"""
+Standard-rate calibration from the actual batch rates in ``archive``.
+
+One grouped query computes, per (product, machine), the number of production
+batches and the median, 10th and 90th percentile of their actual rate over a
+date window. Pairs whose current standard rate is off from the chosen basis
+by more than a tolerance become proposals. Applying them writes all the new
+rates with one batched upsert (master_sync.save_rate_changes).
+
+Usage:
+    python rate_calibration.py --branch main --days 365 --out proposals.csv
+    python rate_calibration.py --branch main --days 365 --apply
+"""
+import argparse
+import datetime
+import sys
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine
+from master_sync import save_rate_changes
+from shared_cache import cached
+
+DEFAULT_WINDOW_DAYS = 365
+DEFAULT_MIN_BATCHES = 10
+DEFAULT_TOLERANCE = 0.15   # Propose a new rate when the current one is more than 15% off
+BASES = {"Median": "median_rate", "P90": "p90_rate"}
+
+RATE_STATS_QUERY = """
+    SELECT
+        "Product" AS product,
+        "Machine" AS machine,
+        COUNT(*) AS batches,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY rate) AS median_rate,
+        percentile_cont(0.1) WITHIN GROUP (ORDER BY rate) AS p10_rate,
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY rate) AS p90_rate,
+        MAX("Date") AS last_batch
+    FROM archive
+    WHERE "Activity" = 'Production' AND "Date" BETWEEN :start AND :end
+      AND rate > 0 AND time > 0 AND "Product" <> ''
+    GROUP BY "Product", "Machine"
+"""
+
+
+def actual_rate_stats(engine, start, end):
+    """Batch count and actual-rate percentiles per (product, machine) between two dates."""
+    with engine.connect() as conn:
+        return pd.read_sql(text(RATE_STATS_QUERY), conn, params={"start": start, "end": end})
+
+
+@cached("rate_stats", tables=["archive"])
+def cached_rate_stats(_engine, branch, start, end):
+    return actual_rate_stats(_engine, start, end)
+
+
+def load_standard_rates(engine):
+    with engine.connect() as conn:
+        rates = pd.read_sql(text("SELECT product, machine, standard_rate FROM rates"), conn)
+    rates["standard_rate"] = pd.to_numeric(rates["standard_rate"], errors="coerce")
+    return rates
+
+
+def propose_rates(stats, rates, basis="median_rate", tolerance=DEFAULT_TOLERANCE, min_batches=DEFAULT_MIN_BATCHES):
+    """
+    Compare the history with the current standard rates.
+    Returns every pair with enough batches, with the proposed rate, its deviation
+    from the current one and a ``propose`` flag for pairs outside the tolerance
+    (or without a usable standard rate).
+    """
+    merged = stats[stats["batches"] >= min_batches].merge(rates, on=["product", "machine"], how="left")
+    current = merged["standard_rate"].to_numpy(dtype="float64")
+    proposed = merged[basis].to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = np.where(current > 0, proposed / current - 1, np.nan)
+    merged["proposed_rate"] = np.round(proposed, 4)
+    merged["deviation"] = deviation
+    merged["propose"] = np.isnan(deviation) | (np.abs(deviation) > tolerance)
+    # Proposals first, the furthest off at the top
+    order = np.lexsort((-np.nan_to_num(np.abs(deviation), nan=np.inf), ~merged["propose"].to_numpy()))
+    return merged.iloc[order].reset_index(drop=True)
+
+
+def apply_proposals(engine, proposals, branch="main"):
+    """Write the proposed rates of the given rows with one batched upsert."""
+    changes = proposals[["product", "machine", "proposed_rate"]].rename(columns={"proposed_rate": "standard_rate"})
+    return save_rate_changes(engine, changes.reset_index(drop=True), branch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose standard rates from historical actual rates.")
+    parser.add_argument("--branch", default="main")
+    parser.add_argument("--days", type=int, default=DEFAULT_WINDOW_DAYS, help="History window ending today")
+    parser.add_argument("--basis", choices=sorted(BASES), default="Median")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--min-batches", type=int, default=DEFAULT_MIN_BATCHES)
+    parser.add_argument("--out", help="Write the proposals to this CSV file")
+    parser.add_argument("--apply", action="store_true", help="Write the proposed rates to the rates table")
+    args = parser.parse_args(argv)
+
+    engine = get_sqlalchemy_engine(args.branch)
+    end = datetime.date.today()
+    stats = actual_rate_stats(engine, end - datetime.timedelta(days=args.days), end)
+    result = propose_rates(stats, load_standard_rates(engine), BASES[args.basis], args.tolerance, args.min_batches)
+    proposals = result[result["propose"]]
+    print(f"{len(result)} pairs with at least {args.min_batches} batches, {len(proposals)} proposed changes.")
+    if args.out:
+        proposals.to_csv(args.out, index=False)
+        print(f"✅ Proposals written to {args.out}")
+    if args.apply and not proposals.empty:
+        print(f"✅ {apply_proposals(engine, proposals, args.branch)} rates updated.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+In-process columnar cache of the most recent archive/av rows per branch.
+
+Each (branch, table) entry keeps a rolling window of rows sorted by date, with
+text columns stored as categoricals and metrics as float32. Entries are
+refreshed incrementally: only rows on or after the watermark (the latest date
+already loaded, but never after today) and dates marked dirty by this process's
+saves are re-read.
+The total size of all entries is kept under MAX_CACHE_BYTES.
+Database reads run under a per-entry lock; the module lock only guards the
+entry dict, so a slow refresh never blocks other tables, branches or saves.
+"""
+import datetime
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+import change_feed
+
+WINDOW_DAYS = 35
+REFRESH_SECONDS = 15        # Minimum delay between watermark checks
+FULL_RELOAD_SECONDS = 900   # Picks up backdated rows written by other processes
+MAX_CACHE_BYTES = 128 * 1024 ** 2
+
+TABLES = {
+    "archive": {
+        "date": "Date",
+        "categories": ["Machine", "Day/Night/plan", "Activity", "Product", "batch number"],
+        "metrics": ["time", "quantity", "efficiency"],
+    },
+    "av": {
+        "date": "date",
+        "categories": ["machine", "shift", "shift type"],
+        "metrics": ["hours", "T.production time", "Availability", "Av Efficiency", "OEE"],
+    },
+}
+
+
+class CacheEntry:
+    """Cached rows of one table for one branch."""
+
+    def __init__(self):
+        self.frame = None
+        self.start = None          # First date fully covered by the frame
+        self.watermark = None      # Latest date loaded, at most today
+        self.dirty = set()         # Dates to re-read on the next refresh
+        self.checked_at = 0.0
+        self.loaded_at = 0.0
+        self.lock = threading.Lock()  # Held while the entry is refreshed
+
+    @property
+    def nbytes(self):
+        return 0 if self.frame is None else int(self.frame.memory_usage(deep=True).sum())
+
+
+_entries = OrderedDict()  # (branch, table) -> CacheEntry, least recently used first
+_lock = threading.Lock()  # Guards _entries and each entry's dirty set
+
+
+def encode(df, table):
+    """Compact column types and sort by date."""
+    spec = TABLES[table]
+    df[spec["date"]] = pd.to_datetime(df[spec["date"]])
+    for col in spec["categories"]:
+        df[col] = df[col].astype("category")
+    for col in spec["metrics"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    return df.sort_values(spec["date"], kind="stable").reset_index(drop=True)
+
+
+def load_rows(engine, table, start, dates=()):
+    """Read the cached columns for rows on or after ``start`` or on one of ``dates``."""
+    spec = TABLES[table]
+    columns = ", ".join(f'"{col}"' for col in [spec["date"]] + spec["categories"] + spec["metrics"])
+    query = text(f"""
+        SELECT {columns} FROM {table}
+        WHERE "{spec['date']}" >= :start OR "{spec['date']}" = ANY(:dates)
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params={"start": start, "dates": sorted(dates)})
+    return encode(df, table)
+
+
+def _refresh(entry, engine, table, dirty):
+    spec = TABLES[table]
+    date_col = spec["date"]
+    today = datetime.date.today()
+    window_start = today - datetime.timedelta(days=WINDOW_DAYS - 1)
+    now = time.monotonic()
+
+    if entry.frame is None or now - entry.loaded_at > FULL_RELOAD_SECONDS:
+        entry.frame = load_rows(engine, table, window_start)
+        entry.start = window_start
+        entry.loaded_at = now
+    else:
+        since = max(entry.watermark or window_start, window_start)
+        dirty = {d for d in dirty if d >= window_start}
+        fresh = load_rows(engine, table, since, dirty)
+        stale_dates = pd.to_datetime(sorted(dirty | {since}))
+        dates = entry.frame[date_col]
+        keep = (dates < pd.Timestamp(since)) & ~dates.isin(stale_dates) & (dates >= pd.Timestamp(window_start))
+        # Categories differ between the two parts, so encode() rebuilds them after the concat
+        entry.frame = encode(pd.concat([entry.frame[keep], fresh], ignore_index=True), table)
+        entry.start = max(entry.start, window_start)
+
+    entry.checked_at = now
+    if not entry.frame.empty:
+        # Rows dated in the future (plans) must not move the watermark past today's rows
+        entry.watermark = min(entry.frame[date_col].iloc[-1].date(), today)
+
+
+def _enforce_memory_bound(current_key):
+    """Evict least recently used entries, then trim the oldest days of the current one."""
+    total = sum(entry.nbytes for entry in _entries.values())
+    for key in list(_entries):
+        if total <= MAX_CACHE_BYTES or key == current_key:
+            continue
+        total -= _entries.pop(key).nbytes
+
+    entry = _entries[current_key]
+    if total > MAX_CACHE_BYTES and len(entry.frame):
+        date_col = TABLES[current_key[1]]["date"]
+        keep_rows = int(len(entry.frame) * MAX_CACHE_BYTES / total)
+        first_date = entry.frame[date_col].iloc[len(entry.frame) - keep_rows] if keep_rows else None
+        if first_date is None:
+            entry.frame, entry.start = entry.frame.iloc[0:0], datetime.date.max
+        else:
+            # Keep whole days only, so every covered date is complete
+            first_date = first_date.normalize() + pd.Timedelta(days=1)
+            entry.frame = entry.frame[entry.frame[date_col] >= first_date].reset_index(drop=True)
+            entry.start = first_date.date()
+        print(f"⚠️ Recent cache for {current_key} trimmed to start at {entry.start}")
+
+
+def recent_rows(engine, branch, table):
+    """
+    Returns (frame, start): the cached rows for ``branch`` and ``table`` and the
+    first date they fully cover. Checks the watermark at most every REFRESH_SECONDS.
+    """
+    key = (branch, table)
+    with _lock:
+        entry = _entries.pop(key, None) or CacheEntry()
+        _entries[key] = entry  # Most recently used last
+
+    with entry.lock:
+        with _lock:
+            stale = entry.frame is None or entry.dirty or time.monotonic() - entry.checked_at > REFRESH_SECONDS
+            # Dates marked while the refresh reads stay dirty for the next one
+            dirty, entry.dirty = entry.dirty, set()
+        if stale:
+            try:
+                _refresh(entry, engine, table, dirty)
+            except Exception:
+                with _lock:
+                    entry.dirty |= dirty
+                raise
+            with _lock:
+                if _entries.get(key) is entry:  # Not cleared or evicted during the refresh
+                    _enforce_memory_bound(key)
+        return entry.frame, entry.start
+
+
+def mark_dirty(branch, dates, tables=("archive", "av")):
+    """Re-read these dates on the next access."""
+    dates = {pd.Timestamp(d).date() for d in dates if pd.notna(d)}
+    with _lock:
+        for table in tables:
+            entry = _entries.get((branch, table))
+            if entry is not None:
+                entry.dirty |= dates
+
+
+def clear(branch=None):
+    """Drop the cache for one branch, or for all branches."""
+    with _lock:
+        for key in [k for k in _entries if branch is None or k[0] == branch]:
+            del _entries[key]
+
+
+def _on_change(changes):
+    """Re-read exactly the changed dates; drop the branch when the scope is unknown."""
+    for change in changes:
+        if change.table == change_feed.ALL_TABLES or change.date is None:
+            clear(change.branch)
+        else:
+            mark_dirty(change.branch, [change.date], tables=(change.table,))
+
+
+change_feed.subscribe(_on_change, tables=TABLES)
+
+
+def day_slice(frame, date_col, date):
+    """Rows of one date, found by binary search on the date-sorted column."""
+    dates = frame[date_col].to_numpy()
+    day = np.datetime64(pd.Timestamp(date))
+    lo, hi = np.searchsorted(dates, [day, day + np.timedelta64(1, "D")])
+    return frame.iloc[lo:hi]
+
+
+def dashboard_frames(engine, branch, date, shift):
+    """
+    The reports dashboard's AV, activity and production tables computed from the
+    cache, equivalent to QUERY_AV, QUERY_ARCHIVE and QUERY_PRODUCTION.
+    Returns None when ``date`` is outside the cached window.
+    """
+    av, av_start = recent_rows(engine, branch, "av")
+    archive, archive_start = recent_rows(engine, branch, "archive")
+    if date < av_start or date < archive_start:
+        return None
+
+    av = day_slice(av, "date", date)
+    df_av = av.loc[(av["shift"] == shift).to_numpy(), ["machine", "Availability", "Av Efficiency", "OEE"]]
+    df_av = df_av.astype({"machine": str}).reset_index(drop=True)
+
+    archive = day_slice(archive, "Date", date)
+    archive = archive[(archive["Day/Night/plan"] == shift).to_numpy()]
+    df_archive = (
+        archive.groupby(["Machine", "Activity"], observed=True, dropna=False)
+        .agg(Total_Time=("time", lambda s: s.sum(min_count=1)), Avg_Efficiency=("efficiency", "mean"))
+        .reset_index()
+    )
+
+    production = archive[(archive["Activity"] == "Production").to_numpy()]
+    df_production = (
+        production.groupby(["Machine", "batch number", "Product"], observed=True, dropna=False)["quantity"]
+        .sum(min_count=1).rename("Produced Quantity").reset_index()
+    )
+    df_production["Total Batch Output"] = (
+        df_production.groupby(["Machine", "batch number"], observed=True, dropna=False)["Produced Quantity"]
+        .transform(lambda s: s.sum(min_count=1))
+    )
+    df_production = df_production.sort_values(["Machine", "batch number"]).reset_index(drop=True)
+
+    for df in (df_archive, df_production):
+        for col in df.select_dtypes("category").columns:
+            df[col] = df[col].astype(str)
+    return df_av, df_archive, df_production
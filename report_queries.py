@@ -0,0 +1,131 @@
+import pandas as pd
+from io import BytesIO
+from sqlalchemy.sql import text
+import recent_cache
+from shared_cache import cached
+
+# ✅ SQL Query to Fetch Production Data with Total Batch Output
+QUERY_PRODUCTION = """
+    SELECT
+        "Machine",
+        "batch number",
+        a."Product" AS "Product",
+        SUM("quantity") AS "Produced Quantity",
+        SUM(SUM("quantity")) OVER (PARTITION BY "Machine", "batch number") AS "Total Batch Output"
+    FROM archive a
+    WHERE "Activity" = 'Production' AND "Date" = :date AND "Day/Night/plan" = :shift
+    GROUP BY "Machine", "batch number", a."Product"
+    ORDER BY "Machine", "batch number";
+"""
+
+QUERY_AV = """
+    SELECT "machine", "Availability", "Av Efficiency", "OEE"
+    FROM av
+    WHERE "date" = :date AND "shift" = :shift
+"""
+
+QUERY_ARCHIVE = """
+    SELECT "Machine", "Activity", SUM("time") as "Total_Time", AVG("efficiency") as "Avg_Efficiency"
+    FROM archive
+    WHERE "Date" = :date AND "Day/Night/plan" = :shift
+    GROUP BY "Machine", "Activity"
+"""
+
+# ✅ The same three queries limited to some machines (live dashboard deltas)
+QUERY_PRODUCTION_MACHINES = """
+    SELECT
+        "Machine",
+        "batch number",
+        a."Product" AS "Product",
+        SUM("quantity") AS "Produced Quantity",
+        SUM(SUM("quantity")) OVER (PARTITION BY "Machine", "batch number") AS "Total Batch Output"
+    FROM archive a
+    WHERE "Activity" = 'Production' AND "Date" = :date AND "Day/Night/plan" = :shift AND "Machine" = ANY(:machines)
+    GROUP BY "Machine", "batch number", a."Product"
+    ORDER BY "Machine", "batch number";
+"""
+
+QUERY_AV_MACHINES = """
+    SELECT "machine", "Availability", "Av Efficiency", "OEE"
+    FROM av
+    WHERE "date" = :date AND "shift" = :shift AND "machine" = ANY(:machines)
+"""
+
+QUERY_ARCHIVE_MACHINES = """
+    SELECT "Machine", "Activity", SUM("time") as "Total_Time", AVG("efficiency") as "Avg_Efficiency"
+    FROM archive
+    WHERE "Date" = :date AND "Day/Night/plan" = :shift AND "Machine" = ANY(:machines)
+    GROUP BY "Machine", "Activity"
+"""
+
+# Date column of each table that can be extracted
+EXTRACT_DATE_COLUMNS = {
+    "av": "date",
+    "archive": "Date"
+}
+
+
+def count_extract(engine, table, start_date, end_date):
+    """Number of rows fetch_extract() will return."""
+    date_column = EXTRACT_DATE_COLUMNS[table]
+    query = text(f'SELECT COUNT(*) FROM {table} WHERE "{date_column}" BETWEEN :start_date AND :end_date')
+    with engine.connect() as conn:
+        return conn.execute(query, {"start_date": start_date, "end_date": end_date}).scalar()
+
+
+def fetch_extract(engine, table, start_date, end_date, chunksize=None, progress=None):
+    """Fetch data from a given table between two dates.
+
+    With ``chunksize`` the rows are read in chunks and ``progress(rows_read)`` is
+    called after each one.
+    """
+    date_column = EXTRACT_DATE_COLUMNS[table]
+    query = text(f"""
+        SELECT * FROM {table}
+        WHERE "{date_column}" BETWEEN :start_date AND :end_date
+    """)
+    params = {"start_date": start_date, "end_date": end_date}
+    with engine.connect() as conn:
+        if not chunksize:
+            return pd.read_sql(query, conn, params=params)
+        chunks, rows = [], 0
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+            chunks.append(chunk)
+            rows += len(chunk)
+            if progress:
+                progress(rows)
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.read_sql(query, conn, params=params)
+
+
+def fetch_dashboard(engine, branch, date, shift):
+    """
+    The dashboard's (av, activity, production) tables for one date and shift:
+    from the recent-data cache when the date is in its window, else from SQL
+    through the shared cache.
+    """
+    try:
+        frames = recent_cache.dashboard_frames(engine, branch, date, shift)
+    except Exception as e:
+        print(f"⚠️ Recent cache unavailable, querying the database: {e}")
+        frames = None
+    if frames is not None:
+        return frames
+    return cached_dashboard(engine, branch, str(date), shift)
+
+
+@cached("dashboard", tables=["archive", "av"])
+def cached_dashboard(_engine, branch, date, shift):
+    """The dashboard tables from SQL, cached per branch, date and shift."""
+    params = {"date": date, "shift": shift}
+    with _engine.connect() as conn:
+        return tuple(pd.read_sql(text(query), conn, params=params) for query in (QUERY_AV, QUERY_ARCHIVE, QUERY_PRODUCTION))
+
+
+def generate_excel(av_df, archive_df, branch, start_date, end_date):
+    """Generate an Excel file with two sheets."""
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        av_df.to_excel(writer, sheet_name='av', index=False)
+        archive_df.to_excel(writer, sheet_name='archive', index=False)
+    filename = f"{branch}_{start_date}_to_{end_date}.xlsx"
+    return output.getvalue(), filename
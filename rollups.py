@@ -0,0 +1,252 @@
+"""
+Incrementally maintained summary tables for analytics pages.
+
+machine_daily_oee keeps one row per (date, machine) with the sums of the av
+metrics, and machine_daily_downtime one row per (date, machine, downtime type)
+with the hours recorded in archive. Saves refresh only the dates they touch, so
+rankings and Pareto charts read a few rows per day however long the history is.
+
+Usage:
+    python rollups.py --branch main        # rebuild the summaries from scratch
+"""
+import argparse
+import datetime
+import sys
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_sqlalchemy_engine
+from shared_cache import cached
+
+RANKING_WINDOWS = [7, 30, 90]
+REBUILD_CHUNK_DAYS = 31     # Dates recomputed per transaction by a full rebuild
+
+RANKING_METRICS = {
+    "OEE": "oee_sum",
+    "Availability": "availability_sum",
+    "Efficiency": "efficiency_sum",
+}
+
+CREATE_OEE_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS machine_daily_oee (
+        date date NOT NULL,
+        machine text NOT NULL,
+        shifts integer NOT NULL,
+        oee_sum double precision,
+        availability_sum double precision,
+        efficiency_sum double precision,
+        production_hours double precision,
+        scheduled_hours double precision,
+        PRIMARY KEY (date, machine)
+    )
+"""
+
+OEE_ROLLUP_SELECT = """
+    SELECT date, machine, COUNT(*), SUM("OEE"), SUM("Availability"), SUM("Av Efficiency"),
+           SUM("T.production time"), SUM(hours)
+    FROM av
+"""
+
+CREATE_DOWNTIME_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS machine_daily_downtime (
+        date date NOT NULL,
+        machine text NOT NULL,
+        activity text NOT NULL,
+        hours double precision NOT NULL,
+        events integer NOT NULL,
+        PRIMARY KEY (date, machine, activity)
+    )
+"""
+
+DOWNTIME_ROLLUP_SELECT = """
+    SELECT "Date", "Machine", "Activity", SUM(COALESCE("time", 0)), COUNT(*)
+    FROM archive
+    WHERE "Activity" <> 'Production' AND "Machine" IS NOT NULL
+"""
+
+# Writers refreshing the same date take turns: one lock per (summary table, date)
+LOCK_DATES = """
+    SELECT pg_advisory_xact_lock(hashtext(:table || ':' || d::text))
+    FROM (SELECT d FROM unnest(CAST(:dates AS date[])) AS d ORDER BY d) AS dates
+"""
+
+
+def ensure_rollup_tables(conn):
+    """Create the summary tables (a migration step, see migrations.py)."""
+    conn.execute(text(CREATE_OEE_ROLLUP))
+    conn.execute(text(CREATE_DOWNTIME_ROLLUP))
+
+
+def _unique_dates(dates):
+    return sorted({pd.Timestamp(d).date() for d in dates if pd.notna(d)})
+
+
+def _lock_dates(conn, table, dates):
+    """
+    Hold the rollup rows of ``dates`` until the transaction ends, so concurrent saves
+    on the same date do not both delete and then both insert. Locks are taken in date
+    order, so writers with overlapping dates cannot deadlock.
+    """
+    conn.execute(text(LOCK_DATES), {"table": table, "dates": dates})
+
+
+def refresh_oee_rollup(conn, dates):
+    """Recompute the daily machine summary for the given dates (run inside the writer's transaction)."""
+    dates = _unique_dates(dates)
+    if not dates:
+        return
+    _lock_dates(conn, "machine_daily_oee", dates)
+    conn.execute(text("DELETE FROM machine_daily_oee WHERE date = ANY(:dates)"), {"dates": dates})
+    conn.execute(text(f"""
+        INSERT INTO machine_daily_oee
+        {OEE_ROLLUP_SELECT}
+        WHERE date = ANY(:dates) AND machine IS NOT NULL
+        GROUP BY date, machine
+    """), {"dates": dates})
+
+
+def refresh_downtime_rollup(conn, dates):
+    """Recompute the daily downtime summary for the given archive dates (run inside the writer's transaction)."""
+    dates = _unique_dates(dates)
+    if not dates:
+        return
+    _lock_dates(conn, "machine_daily_downtime", dates)
+    conn.execute(text("DELETE FROM machine_daily_downtime WHERE date = ANY(:dates)"), {"dates": dates})
+    conn.execute(text(f"""
+        INSERT INTO machine_daily_downtime
+        {DOWNTIME_ROLLUP_SELECT} AND "Date" = ANY(:dates)
+        GROUP BY "Date", "Machine", "Activity"
+    """), {"dates": dates})
+
+
+def _rebuild(engine, source_dates, rollup_table, refresh):
+    """
+    Recompute every date of ``source_dates`` or ``rollup_table`` with ``refresh``,
+    REBUILD_CHUNK_DAYS dates per transaction, so saves wait for one chunk at most.
+    """
+    with engine.connect() as conn:
+        dates = conn.execute(text(f"{source_dates} UNION SELECT date FROM {rollup_table}")).scalars().all()
+    dates = _unique_dates(dates)
+    for i in range(0, len(dates), REBUILD_CHUNK_DAYS):
+        with engine.begin() as conn:
+            refresh(conn, dates[i:i + REBUILD_CHUNK_DAYS])
+
+
+def rebuild_oee_rollup(engine):
+    """Rebuild the whole daily machine summary from av."""
+    _rebuild(engine, "SELECT DISTINCT date FROM av WHERE date IS NOT NULL", "machine_daily_oee", refresh_oee_rollup)
+
+
+def rebuild_downtime_rollup(engine):
+    """Rebuild the whole daily downtime summary from archive."""
+    _rebuild(engine, 'SELECT DISTINCT "Date" FROM archive WHERE "Date" IS NOT NULL', "machine_daily_downtime",
+             refresh_downtime_rollup)
+
+
+def fetch_oee_ranking(engine, end_date, windows=RANKING_WINDOWS):
+    """
+    Rolling per-machine averages of OEE, Availability and Efficiency for each window
+    ending on ``end_date``, computed from the daily summary in one query.
+    """
+    params = {"end_date": end_date, "start": end_date - datetime.timedelta(days=max(windows) - 1)}
+    columns = []
+    for days in windows:
+        params[f"start_{days}"] = end_date - datetime.timedelta(days=days - 1)
+        in_window = f"date >= :start_{days}"
+        for label, column in RANKING_METRICS.items():
+            columns.append(f"""
+                SUM({column}) FILTER (WHERE {in_window})
+                / NULLIF(SUM(shifts) FILTER (WHERE {in_window}), 0) AS "{label} {days}d"
+            """)
+        columns.append(f'SUM(shifts) FILTER (WHERE {in_window}) AS "Shifts {days}d"')
+
+    query = text(f"""
+        SELECT machine AS "Machine", {", ".join(columns)}
+        FROM machine_daily_oee
+        WHERE date BETWEEN :start AND :end_date
+        GROUP BY machine
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+
+@cached("oee_ranking", tables=["av"])
+def cached_oee_ranking(_engine, branch, end_date):
+    """fetch_oee_ranking() cached per branch and end date (cleared when av changes)."""
+    return fetch_oee_ranking(_engine, end_date)
+
+
+def clear_ranking_cache():
+    cached_oee_ranking.clear()
+
+
+def fetch_downtime(engine, start_date, end_date):
+    """Daily downtime hours per machine and type between two dates, from the summary table."""
+    query = text("""
+        SELECT date, machine, activity, hours, events
+        FROM machine_daily_downtime
+        WHERE date BETWEEN :start_date AND :end_date
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params={"start_date": start_date, "end_date": end_date})
+    df["date"] = pd.to_datetime(df["date"])
+    df["machine"] = df["machine"].astype("category")
+    df["activity"] = df["activity"].astype("category")
+    return df
+
+
+@cached("downtime", tables=["archive"])
+def cached_downtime(_engine, branch, start_date, end_date):
+    """fetch_downtime() cached per branch and period (cleared when archive changes)."""
+    return fetch_downtime(_engine, start_date, end_date)
+
+
+def clear_downtime_cache():
+    cached_downtime.clear()
+
+
+def downtime_pareto(downtime, by):
+    """
+    Total downtime hours grouped by ``by`` (a column name or a list), sorted
+    largest first, with each group's share and the cumulative share of the total.
+    """
+    pareto = (
+        downtime.groupby(by, observed=True)[["hours", "events"]].sum()
+        .sort_values("hours", ascending=False)
+        .reset_index()
+    )
+    total = pareto["hours"].sum()
+    pareto["share"] = pareto["hours"] / total if total else 0.0
+    pareto["cumulative share"] = pareto["share"].cumsum()
+    return pareto
+
+
+def fetch_downtime_comments(engine, start_date, end_date, activities, machines=None):
+    """Raw downtime rows with their comments for a drill-down, longest first."""
+    query = """
+        SELECT "Date", "Machine", "Day/Night/plan", "Activity", "time", "comments"
+        FROM archive
+        WHERE "Date" BETWEEN :start_date AND :end_date AND "Activity" = ANY(:activities)
+    """
+    params = {"start_date": start_date, "end_date": end_date, "activities": list(activities)}
+    if machines:
+        query += ' AND "Machine" = ANY(:machines)'
+        params["machines"] = list(machines)
+    query += ' ORDER BY "time" DESC NULLS LAST LIMIT 500'
+    with engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild analytics summary tables.")
+    parser.add_argument("--branch", default="main")
+    args = parser.parse_args(argv)
+
+    engine = get_sqlalchemy_engine(args.branch)
+    rebuild_oee_rollup(engine)
+    rebuild_downtime_rollup(engine)
+    print(f"✅ machine_daily_oee and machine_daily_downtime rebuilt for {args.branch}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
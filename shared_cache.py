@@ -0,0 +1,289 @@
+"""
+Two-tier cache for query results, shared by every app process on a host.
+
+    local tier    per-process LRU of pickled values (bounded by MAX_LOCAL_BYTES)
+    shared tier   pickled values in a SQLite file, or in Redis when SHARED_CACHE_URL
+                  is a redis:// URL, so a result computed by one worker serves all
+
+Keys are namespaced "<branch>:<namespace>:g<generation>:<args digest>". Each
+(branch, namespace) has a generation counter in the shared tier, and so does
+each namespace as a whole (for clearing all branches at once). Invalidating
+bumps the counter, which makes every older entry unreachable in all processes at
+once; both tiers check the current generation on every lookup. Like
+st.cache_data, every hit returns a fresh copy, so callers may modify results. Results
+read from a read replica are kept only as long as the replica may lag (db.max_staleness),
+because a refill right after an invalidation may still miss the write. Namespaces
+declare the tables they read, and a change feed subscriber bumps the matching
+generations. Only the process that made a write bumps them: the shared tier
+carries the new generations to every process that uses it. Changes relayed from
+other processes (NOTIFY/LISTEN) invalidate only where the tier is not shared
+with the writer (no shared tier, or a SQLite file on another host).
+
+    @cached("oee_ranking", tables=["av"])
+    def cached_oee_ranking(_engine, branch, end_date): ...
+
+Database engines stay per process: connections cannot be shared between processes.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import change_feed
+from db import max_staleness
+
+SHARED_CACHE_URL = os.environ.get(
+    "SHARED_CACHE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "shared_cache.db"),
+)
+DEFAULT_TTL = 600
+MAX_LOCAL_BYTES = 64 * 1024 ** 2
+MAX_VALUE_BYTES = 32 * 1024 ** 2   # Larger results stay in the local tier only
+PURGE_SECONDS = 300
+RETRY_SECONDS = 30        # Pause between attempts to reach an unavailable shared tier
+
+
+class SQLiteStore:
+    """Shared tier in a local SQLite file (one connection per thread, WAL so readers never block)."""
+
+    shared_with = ("host",)     # change_feed sources whose writes this tier already reflects
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value BLOB NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._purged_at = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Losing cached values in a power cut is harmless
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                                   (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO entries (key, expires_at, value) VALUES (?, ?, ?)", (key, now + ttl, value))
+        if now - self._purged_at > PURGE_SECONDS:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            self._purged_at = now
+
+    def counter(self, key):
+        row = self._conn().execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key, stale=None):
+        """Bump a counter and drop the entries matching the LIKE pattern ``stale`` (now unreachable)."""
+        conn = self._conn()
+        value = conn.execute(
+            "INSERT INTO counters (key, value) VALUES (?, 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1 RETURNING value", (key,)
+        ).fetchone()[0]
+        if stale:
+            conn.execute("DELETE FROM entries WHERE key LIKE ?", (stale,))
+        return value
+
+
+class RedisStore:
+    """Shared tier in Redis (or a Redis-compatible server); entries expire by TTL."""
+
+    shared_with = ("host", "remote")
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.setex(key, max(1, int(ttl)), value)
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key, stale=None):
+        return self.client.incr(key)   # Stale entries expire by TTL
+
+
+def open_store(url=SHARED_CACHE_URL):
+    """The shared tier for ``url`` (sqlite:///path, redis://..., or "none" for local only)."""
+    if not url or url == "none":
+        return None
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported SHARED_CACHE_URL: {url}")
+
+
+class TieredCache:
+    """Local LRU in front of an optional shared store."""
+
+    def __init__(self, store, max_local_bytes=MAX_LOCAL_BYTES):
+        self.store = store
+        self.max_local_bytes = max_local_bytes
+        self._local = OrderedDict()   # key -> (expires_at, payload), least recently used first
+        self._local_bytes = 0
+        self._local_generations = {}  # Fallback counters when there is no shared store
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self.hits = {"local": 0, "shared": 0, "miss": 0}
+
+    def _call_store(self, method, *args, default=None):
+        """Use the shared tier; while it is unavailable, results are computed without caching."""
+        if time.monotonic() < self._down_until:
+            return default
+        try:
+            return getattr(self.store, method)(*args)
+        except Exception as e:
+            print(f"⚠️ Shared cache unavailable, retrying in {RETRY_SECONDS}s ({method}): {e}")
+            self._down_until = time.monotonic() + RETRY_SECONDS
+            return default
+
+    def _counter(self, key):
+        if self.store is None:
+            return self._local_generations.get(key, 0)
+        return self._call_store("counter", key)
+
+    def generation(self, branch, namespace):
+        """Current generation of (branch, namespace) as "<namespace count>.<branch count>", None if unknown."""
+        everywhere, here = self._counter(f"gen:*:{namespace}"), self._counter(f"gen:{branch}:{namespace}")
+        if everywhere is None or here is None:
+            return None
+        return f"{everywhere}.{here}"
+
+    def get_or_compute(self, branch, namespace, args, compute, ttl=DEFAULT_TTL):
+        generation = self.generation(branch, namespace)
+        if generation is None:  # Shared tier down: cannot tell whether entries are current
+            self.hits["miss"] += 1
+            return compute()
+        digest = hashlib.sha1(repr(args).encode()).hexdigest()
+        key = f"{branch}:{namespace}:g{generation}:{digest}"
+        now = time.time()
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry and entry[0] > now:
+                self._local.move_to_end(key)
+                self.hits["local"] += 1
+                return pickle.loads(entry[1])
+
+        payload = self._call_store("get", key) if self.store is not None else None
+        if payload is not None:
+            self.hits["shared"] += 1
+            value = pickle.loads(payload)
+        else:
+            self.hits["miss"] += 1
+            value = compute()
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if self.store is not None and len(payload) <= MAX_VALUE_BYTES:
+                self._call_store("set", key, payload, ttl)
+        self._remember(key, now + ttl, payload)
+        return value
+
+    def _remember(self, key, expires_at, payload):
+        if len(payload) > self.max_local_bytes:
+            return
+        with self._lock:
+            old = self._local.pop(key, None)
+            if old:
+                self._local_bytes -= len(old[1])
+            self._local[key] = (expires_at, payload)
+            self._local_bytes += len(payload)
+            while self._local_bytes > self.max_local_bytes:
+                _, (_, evicted) = self._local.popitem(last=False)
+                self._local_bytes -= len(evicted)
+
+    def invalidate(self, namespace, branch=None):
+        """Make cached values of ``namespace`` stale for one branch (all branches when None)."""
+        counter = f"gen:{'*' if branch is None else branch}:{namespace}"
+        if self.store is None:
+            self._local_generations[counter] = self._local_generations.get(counter, 0) + 1
+        else:
+            self._call_store("incr", counter, f"{'%' if branch is None else branch}:{namespace}:%")
+        with self._lock:
+            for key in [k for k in self._local if k.split(":")[1] == namespace and branch in (None, k.split(":")[0])]:
+                self._local_bytes -= len(self._local.pop(key)[1])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_namespaces = {}  # namespace -> tables it reads
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                store = open_store()
+            except Exception as e:
+                print(f"⚠️ Shared cache disabled, caching in this process only: {e}")
+                store = None
+            _cache = TieredCache(store)
+        return _cache
+
+
+def cached(namespace, tables=(), ttl=DEFAULT_TTL):
+    """
+    Cache ``func(_engine, branch, *args)`` per branch and arguments. Writes to any
+    of ``tables`` (reported on the change feed) invalidate it in every process.
+    The wrapper has ``clear(branch=None)``.
+    """
+    _namespaces[namespace] = set(tables)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(_engine, branch, *args, **kwargs):
+            call_args = args + tuple(sorted(kwargs.items()))
+            staleness = max_staleness(_engine)
+            return get_cache().get_or_compute(branch, namespace, call_args,
+                                              lambda: func(_engine, branch, *args, **kwargs),
+                                              min(ttl, staleness) if staleness else ttl)
+
+        wrapper.clear = lambda branch=None: get_cache().invalidate(namespace, branch)
+        return wrapper
+    return decorator
+
+
+def _on_change(changes):
+    """Bump the generations of the namespaces reading the changed tables."""
+    stale = set()
+    for change in changes:
+        for namespace, tables in _namespaces.items():
+            if change.table == change_feed.ALL_TABLES or change.table in tables:
+                stale.add((namespace, change.branch))
+    for namespace, branch in stale:
+        get_cache().invalidate(namespace, branch)
+
+
+def _relayed(source):
+    """Subscriber for changes relayed from ``source``, skipped when the writer bumped our shared tier."""
+    def on_change(changes):
+        store = get_cache().store
+        if store is None or source not in store.shared_with:
+            _on_change(changes)
+    return on_change
+
+
+change_feed.subscribe(_on_change, sources=["local"])
+for _source in ("host", "remote"):
+    change_feed.subscribe(_relayed(_source), sources=[_source])
@@ -0,0 +1,311 @@
+import io
+from array import array
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import text
+from rollups import refresh_oee_rollup, refresh_downtime_rollup
+import change_feed
+
+SHIFT_TYPES = ["Day", "Night", "Plan"]
+
+DOWNTIME_TYPES = [
+    "Maintenance DT", "Production DT", "Material DT", "Utility DT",
+    "QC DT", "Cleaning DT", "QA DT", "Changeover DT"
+]
+
+# Header spellings accepted from the grid, pasted text or uploaded CSV files
+BATCH_COLUMN_ALIASES = {
+    "product": "product",
+    "batch": "batch",
+    "batch number": "batch",
+    "batch_number": "batch",
+    "quantity": "quantity",
+    "qty": "quantity",
+    "time": "time_consumed",
+    "time consumed": "time_consumed",
+    "time_consumed": "time_consumed",
+    "hours": "time_consumed",
+}
+
+
+def load_shift_hours(shifts_path="shifts.csv"):
+    """Working hours of each shifts.csv code."""
+    shifts = pd.read_csv(shifts_path, encoding="utf-8-sig")
+    return dict(zip(shifts["code"], shifts["working hours"]))
+
+
+def clean_dataframe(df):
+    """
+    Cleans the dataframe by:
+    1. Converting column names to strings to prevent errors.
+    2. Stripping whitespaces from column names.
+    3. Converting empty strings in numeric columns to NaN.
+    4. Ensuring consistent data types.
+    """
+    df.columns = df.columns.astype(str).str.strip()  # Ensure all column names are strings
+    
+    numeric_cols = ["time", "quantity", "rate", "standard rate", "efficiency"]  # Adjust as needed
+
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")  # Convert to float, replace invalid values with NaN
+    
+    return df
+
+
+def report_exists(engine, date, shift, machine):
+    """True if a report for this Date, Shift Type and Machine is already in av or archive."""
+    query = text("""
+        SELECT EXISTS (SELECT 1 FROM av WHERE date = :date AND "shift" = :shift AND machine = :machine)
+            OR EXISTS (SELECT 1 FROM archive
+                       WHERE "Date" = :date AND "Machine" = :machine AND "Day/Night/plan" = :shift)
+    """)
+    with engine.connect() as conn:
+        return bool(conn.execute(query, {"date": date, "shift": shift, "machine": machine}).scalar())
+
+
+def save_shift_report(engine, archive_df, av_df, branch="main"):
+    """
+    Append a cleaned shift report to archive and av and refresh the rollups in one
+    transaction, then announce the saved (date, shift, machine) on the change feed.
+    """
+    changes = change_feed.report_changes(branch, av_df)
+    with engine.begin() as conn:
+        archive_df.to_sql("archive", conn, if_exists="append", index=False)
+        av_df.to_sql("av", conn, if_exists="append", index=False)
+        refresh_oee_rollup(conn, av_df["date"])
+        refresh_downtime_rollup(conn, archive_df["Date"])
+        change_feed.notify(conn, changes)
+    change_feed.publish(changes)
+
+
+def empty_batches():
+    """Return an empty batch frame in the layout of validated and draft batches."""
+    return pd.DataFrame({
+        "product": pd.Categorical([]),
+        "batch": pd.Series(dtype=str),
+        "quantity": pd.Series(dtype="float64"),
+        "time_consumed": pd.Series(dtype="float64"),
+        "standard_rate": pd.Series(dtype="float64"),
+    })
+
+
+def normalize_batch_sheet(df, default_product=""):
+    """Rename columns to the bulk-entry layout and fill blank products with the selected one."""
+    df = df.copy()
+    df.columns = df.columns.astype(str).str.strip().str.lstrip("\ufeff").str.lower()
+    df = df.rename(columns=BATCH_COLUMN_ALIASES)
+
+    for col in ["product", "batch", "quantity", "time_consumed"]:
+        if col not in df.columns:
+            df[col] = ""
+
+    df = df[["product", "batch", "quantity", "time_consumed"]]
+    df = df.fillna("").astype(str).apply(lambda col: col.str.strip())
+    df["product"] = df["product"].mask(df["product"].eq(""), default_product)
+
+    # Drop rows the user left completely empty in the grid
+    blank = df[["batch", "quantity", "time_consumed"]].eq("").all(axis=1)
+    return df[~blank].reset_index(drop=True)
+
+
+def read_batch_sheet(source, default_product=""):
+    """Read pasted CSV text or an uploaded CSV file of batches."""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    df = pd.read_csv(source, dtype=str, skipinitialspace=True, keep_default_na=False)
+    return normalize_batch_sheet(df, default_product)
+
+
+def load_machine_rates(engine, machine):
+    """Fetch every standard rate of a machine in one query, indexed by product."""
+    query = text("SELECT product, standard_rate FROM rates WHERE machine = :machine")
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params={"machine": machine})
+    rates = pd.to_numeric(df["standard_rate"], errors="coerce")
+    rates.index = df["product"]
+    return rates[rates > 0]
+
+
+def batch_metrics(quantity, time_consumed, standard_rate):
+    """Vectorized form formulas: rate = quantity / time and efficiency = rate / standard rate."""
+    quantity = np.asarray(quantity, dtype="float64")
+    time_consumed = np.asarray(time_consumed, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(time_consumed != 0, quantity / time_consumed, 0.0)
+        efficiency = rate / np.asarray(standard_rate, dtype="float64")
+    return rate, efficiency
+
+
+def validate_batches(df, rates, known_products):
+    """
+    Validates all bulk-entered batches in one pass against the machine's rate table.
+    Returns (valid, rejected): valid rows in the session-state layout, and rejected
+    rows with a "reason" column listing every failed check.
+    """
+    quantity = pd.to_numeric(df["quantity"], errors="coerce")
+    time_consumed = pd.to_numeric(df["time_consumed"], errors="coerce")
+    standard_rate = df["product"].map(rates)
+    _, efficiency = batch_metrics(quantity, time_consumed, standard_rate)
+
+    checks = pd.DataFrame({
+        "missing product": df["product"].eq(""),
+        "unknown product": df["product"].ne("") & ~df["product"].isin(known_products),
+        "missing batch number": df["batch"].eq(""),
+        "invalid quantity": quantity.isna() | (quantity < 0),
+        "invalid time": time_consumed.isna() | (time_consumed < 0),
+        "no standard rate for machine": df["product"].ne("") & standard_rate.isna(),
+        "efficiency above 1": efficiency > 1,
+        "duplicate batch": df.duplicated(["product", "batch"], keep="first"),
+    }, index=df.index)
+
+    failed = checks.any(axis=1)
+    rejected = df[failed].copy()
+    rejected["reason"] = checks[failed].dot(checks.columns + "; ").str.rstrip("; ")
+
+    valid = pd.DataFrame({
+        "product": df["product"][~failed],
+        "batch": df["batch"][~failed],
+        "quantity": quantity[~failed].astype("float64"),
+        "time_consumed": time_consumed[~failed].astype("float64"),
+        "standard_rate": standard_rate[~failed].astype("float64"),
+    }).reset_index(drop=True)
+    valid["product"] = valid["product"].astype("category")
+    return valid, rejected
+
+
+def merge_batches(existing, new):
+    """Append validated batches, letting a re-entered (product, batch) replace the older row."""
+    if existing is None or existing.empty:
+        return new
+    merged = pd.concat([existing.astype({"product": str}), new.astype({"product": str})], ignore_index=True)
+    merged = merged.drop_duplicates(["product", "batch"], keep="last").reset_index(drop=True)
+    merged["product"] = merged["product"].astype("category")
+    return merged
+
+
+class BatchDraft:
+    """
+    The batches of a shift report being entered, kept in compact columns for the
+    session: product codes into a list of distinct names, and typed arrays for the
+    numbers. DataFrames are built from it only for display and saving.
+
+    Single-entry batches have no stored standard rate (it is looked up for the
+    selected machine when the report is built). Bulk batches keep the rate they
+    were validated against.
+    """
+
+    __slots__ = ("products", "product", "batch", "quantity", "time_consumed", "standard_rate", "bulk")
+
+    def __init__(self):
+        self.products = []               # Distinct product names, indexed by the codes in ``product``
+        self.product = array("I")
+        self.batch = []
+        self.quantity = array("d")
+        self.time_consumed = array("d")
+        self.standard_rate = array("d")  # NaN for single-entry batches
+        self.bulk = array("b")
+
+    def __len__(self):
+        return len(self.batch)
+
+    def _code(self, product):
+        try:
+            return self.products.index(product)
+        except ValueError:
+            self.products.append(product)
+            return len(self.products) - 1
+
+    def add(self, product, batch, quantity, time_consumed, standard_rate=float("nan"), bulk=False):
+        self.product.append(self._code(product))
+        self.batch.append(batch)
+        self.quantity.append(quantity)
+        self.time_consumed.append(time_consumed)
+        self.standard_rate.append(standard_rate)
+        self.bulk.append(bulk)
+
+    def remove(self, i):
+        for column in (self.product, self.batch, self.quantity, self.time_consumed, self.standard_rate, self.bulk):
+            del column[i]
+
+    def rows(self, product=None, bulk=False):
+        """Positions of the single-entry (or bulk) batches, optionally of one product."""
+        code = self.products.index(product) if product in self.products else None
+        return [i for i, flag in enumerate(self.bulk)
+                if flag == bulk and (product is None or self.product[i] == code)]
+
+    def single_products(self):
+        """Products with single-entry batches, in the order they were first added."""
+        return [self.products[code] for code in dict.fromkeys(self.product[i] for i in self.rows())]
+
+    def has_bulk(self):
+        return any(self.bulk)
+
+    def total_time(self):
+        return sum(self.time_consumed)
+
+    def to_frame(self, bulk=None):
+        """The batches (only single-entry or bulk ones when ``bulk`` is given) in the validate_batches() layout."""
+        keep = [i for i, flag in enumerate(self.bulk) if bulk is None or flag == bulk]
+        frame = pd.DataFrame({
+            "product": pd.Categorical.from_codes(np.asarray(self.product, dtype="int64")[keep],
+                                                 categories=pd.Index(self.products, dtype=object))
+            if self.products else pd.Categorical([]),
+            "batch": pd.Series([self.batch[i] for i in keep], dtype=str),
+            "quantity": np.asarray(self.quantity)[keep],
+            "time_consumed": np.asarray(self.time_consumed)[keep],
+            "standard_rate": np.asarray(self.standard_rate)[keep],
+        })
+        frame["product"] = frame["product"].cat.remove_unused_categories()
+        return frame
+
+    def clear_bulk(self):
+        for i in reversed(self.rows(bulk=True)):
+            self.remove(i)
+
+    def replace_bulk(self, batches):
+        """Replace the bulk batches with validated ones (validate_batches() layout)."""
+        self.clear_bulk()
+        for product, batch, quantity, time_consumed, standard_rate in zip(
+                batches["product"].astype(str), batches["batch"], batches["quantity"],
+                batches["time_consumed"], batches["standard_rate"]):
+            self.add(product, batch, quantity, time_consumed, standard_rate, bulk=True)
+
+    def add_bulk(self, batches):
+        """Append validated bulk batches; a re-entered (product, batch) replaces the older row."""
+        self.replace_bulk(merge_batches(self.to_frame(bulk=True), batches))
+
+
+def shift_metrics(production_time, downtime, shift_hours, efficiencies, partial=False):
+    """
+    The form's av formulas: availability against the shift's working hours (against
+    production + downtime for partial shifts), average batch efficiency, and
+    OEE = 0.99 × availability × efficiency. Returns (availability, efficiency, OEE).
+    """
+    if partial:
+        recorded = production_time + downtime
+        availability = production_time / recorded if recorded else 0
+    else:
+        availability = production_time / shift_hours if shift_hours else 0
+    efficiencies = list(efficiencies)
+    average_efficiency = sum(efficiencies) / len(efficiencies) if efficiencies else 0
+    return availability, average_efficiency, 0.99 * availability * average_efficiency
+
+
+def batches_to_archive(batches, date, machine, shift_type):
+    """Build the production ``archive`` rows for bulk-entered batches."""
+    rate, efficiency = batch_metrics(batches["quantity"], batches["time_consumed"], batches["standard_rate"])
+    return pd.DataFrame({
+        "Date": date,
+        "Machine": machine,
+        "Day/Night/plan": shift_type,
+        "Activity": "Production",
+        "time": batches["time_consumed"].to_numpy(),
+        "Product": batches["product"].astype(str).to_numpy(),
+        "batch number": batches["batch"].to_numpy(),
+        "quantity": batches["quantity"].to_numpy(),
+        "comments": "",
+        "rate": rate,
+        "standard rate": batches["standard_rate"].to_numpy(),
+        "efficiency": efficiency,
+    }, index=range(len(batches)))
@@ -1,6 +1,8 @@
 import streamlit as st
 from auth import authenticate_user, ROLE_ACCESS
-from db import get_branches
+from db import get_branches, get_sqlalchemy_engine
+import change_feed
+import warmup
 
 # Hide Streamlit's menu and "Manage app" button
 st.markdown("""
@@ -12,6 +14,9 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# ✅ Warm every branch's connection pools and caches once per process, without blocking the login
+warmup.start_warm_up()
+
 # ✅ Authenticate user FIRST
 user = authenticate_user()
 
@@ -44,6 +49,18 @@ if st.session_state["role"] == "admin":
         st.session_state["branch"] = selected_branch
         st.rerun()
 
+    # ✅ Warm-up timing of this server process per branch
+    warm_up_report = warmup.last_report()
+    if warm_up_report:
+        with st.expander("⏱️ Startup warm-up"):
+            for result in sorted(warm_up_report.values(), key=lambda r: r.branch):
+                st.text(str(result))
+                for step, error in result.errors.items():
+                    st.error(f"❌ {step}: {error}")
+
+# ✅ Relay other workers' saves for this branch to the local caches
+change_feed.start_listener(get_sqlalchemy_engine(st.session_state["branch"]), st.session_state["branch"])
+
 # ✅ Display UI
 st.title("Welcome to the App")
 st.write("Use the sidebar to navigate.")
@@ -58,8 +75,24 @@ if "shift_output_form" in allowed_pages:
 if "reports_dashboard" in allowed_pages:
     st.page_link("pages/reports_dashboard.py", label="Reports Dashboard")
 
+if "machine_ranking" in allowed_pages:
+    st.page_link("pages/machine_ranking.py", label="Machine Ranking")
+
+if "downtime_analytics" in allowed_pages:
+    st.page_link("pages/downtime_analytics.py", label="Downtime Analytics")
+
+if "batch_trace" in allowed_pages:
+    st.page_link("pages/batch_traceability.py", label="Batch Traceability")
+
+if "capacity_planning" in allowed_pages:
+    st.page_link("pages/capacity_planning.py", label="Capacity Planning")
+
 if "master_data" in allowed_pages:
     st.page_link("pages/master_data.py", label="Master Data Control")
+    st.page_link("pages/master_data_sync.py", label="Sync Master Data")
+
+if "rate_calibration" in allowed_pages:
+    st.page_link("pages/standard_rate_calibration.py", label="Standard Rate Calibration")
     
 if "user management" in allowed_pages:
     st.page_link("pages/user_management.py", label="User Management")
@@ -67,5 +100,11 @@ if "user management" in allowed_pages:
 if "extract_data" in allowed_pages:
     st.page_link("pages/extract_data.py", label="Extract Data")
 
+if "import_data" in allowed_pages:
+    st.page_link("pages/import_data.py", label="Import Historical Data")
+
+if "data_audit" in allowed_pages:
+    st.page_link("pages/data_audit.py", label="Data Quality Audit")
+
 # ✅ Success message
 st.success(f"Now working on: {display_branch}")
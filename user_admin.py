@@ -0,0 +1,169 @@
+"""
+User administration helpers: server-side user search and bulk import.
+
+Searches return one page of users at a time, so the admin page never loads the
+whole ``users`` table. A bulk import reads a CSV of accounts and validates every
+row in one pass. It hashes the passwords in a process pool (bcrypt is CPU-bound,
+about a quarter of a second per hash) and inserts all accounts with one
+multi-row INSERT in a single transaction. Rows that fail are returned with the
+reason.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import bcrypt
+import pandas as pd
+from psycopg2.extras import execute_values
+
+ROLES = ["admin", "user", "power user", "report"]
+PAGE_SIZE = 25
+HASH_WORKERS = os.cpu_count() or 2
+MAX_IMPORT_ROWS = 5000
+
+# Header spellings accepted in user sheets
+USER_COLUMN_ALIASES = {
+    "username": "username",
+    "user": "username",
+    "user name": "username",
+    "password": "password",
+    "role": "role",
+    "branch": "branch",
+}
+
+
+def search_users(conn, term="", role=None, page=0, page_size=PAGE_SIZE):
+    """
+    Returns (users, has_more) for one page of (id, username, role, branch) rows
+    whose username or branch contains ``term``, optionally of one role.
+    """
+    term = term.strip().lower()
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id, username, role, branch FROM users
+            WHERE (%(term)s = '' OR lower(username) LIKE %(contains)s OR lower(branch) LIKE %(contains)s)
+              AND (%(role)s IS NULL OR role = %(role)s)
+            ORDER BY lower(username) LIKE %(prefix)s DESC, username
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, {
+            "term": term,
+            "contains": f"%{escaped}%",
+            "prefix": f"{escaped}%",
+            "role": role,
+            "limit": page_size + 1,  # One extra row tells whether a next page exists
+            "offset": page * page_size,
+        })
+        users = cur.fetchall()
+    finally:
+        cur.close()
+    return users[:page_size], len(users) > page_size
+
+
+def read_user_sheet(source, default_role="user", default_branch=""):
+    """Read a CSV (text or file) of users; blank roles and branches take the defaults."""
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    df = pd.read_csv(source, dtype=str, skipinitialspace=True, keep_default_na=False)
+    df.columns = df.columns.astype(str).str.strip().str.lstrip("﻿").str.lower()
+    df = df.rename(columns=USER_COLUMN_ALIASES)
+    for col in ["username", "password", "role", "branch"]:
+        if col not in df.columns:
+            df[col] = ""
+    df = df[["username", "password", "role", "branch"]].fillna("")
+    for col in ["username", "role", "branch"]:  # Passwords are taken as typed
+        df[col] = df[col].str.strip()
+    df["role"] = df["role"].str.lower().mask(df["role"].eq(""), default_role)
+    df["branch"] = df["branch"].mask(df["branch"].eq(""), default_branch)
+    return df
+
+
+def validate_users(df, existing_usernames):
+    """
+    Check every row at once. Returns (valid, rejected), rejected rows carrying a
+    "reason" that lists every failed check (without the password).
+    """
+    checks = pd.DataFrame({
+        "missing username": df["username"].eq(""),
+        "missing password": df["password"].eq(""),
+        "invalid role": ~df["role"].isin(ROLES),
+        "missing branch": df["branch"].eq(""),
+        "duplicate username in file": df["username"].ne("") & df.duplicated("username", keep="first"),
+        "username already exists": df["username"].isin(existing_usernames),
+    }, index=df.index)
+    failed = checks.any(axis=1)
+    rejected = df.loc[failed, ["username", "role", "branch"]].copy()
+    rejected.insert(0, "row", rejected.index + 2)  # Line number in the file, after the header
+    rejected["reason"] = checks[failed].dot(checks.columns + "; ").str.rstrip("; ")
+    return df[~failed].reset_index(drop=True), rejected.reset_index(drop=True)
+
+
+def existing_users(conn, usernames):
+    """The subset of ``usernames`` already in the users table (one query)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT username FROM users WHERE username = ANY(%s)", (list(usernames),))
+        return {row[0] for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def hash_password(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def hash_passwords(passwords, max_workers=HASH_WORKERS):
+    """Hash many passwords in parallel worker processes."""
+    passwords = list(passwords)
+    if len(passwords) <= 1 or max_workers <= 1:
+        return [hash_password(p) for p in passwords]
+    workers = min(max_workers, len(passwords))
+    # Spawned workers do not inherit the app's threads and open connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def insert_users(conn, users):
+    """
+    Insert (username, password hash, role, branch) rows with one statement in one
+    transaction. Returns the usernames inserted; rows taken in the meantime are skipped.
+    """
+    cur = conn.cursor()
+    try:
+        inserted = execute_values(cur, """
+            INSERT INTO users (username, password, role, branch) VALUES %s
+            ON CONFLICT (username) DO NOTHING
+            RETURNING username
+        """, users, page_size=max(1, len(users)), fetch=True)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {row[0] for row in inserted}
+
+
+def import_users(conn, source, default_role="user", default_branch="", max_workers=HASH_WORKERS):
+    """
+    Bulk-create the users of a CSV sheet.
+    Returns (created, rejected): the usernames created and the rows that were not, with a reason.
+    """
+    sheet = read_user_sheet(source, default_role, default_branch)
+    if len(sheet) > MAX_IMPORT_ROWS:
+        raise ValueError(f"The sheet has {len(sheet)} rows; import at most {MAX_IMPORT_ROWS} at a time.")
+    valid, rejected = validate_users(sheet, existing_users(conn, sheet["username"]))
+    if valid.empty:
+        return [], rejected
+
+    hashes = hash_passwords(valid["password"], max_workers)
+    rows = list(zip(valid["username"], hashes, valid["role"], valid["branch"]))
+    inserted = insert_users(conn, rows)
+
+    created = [name for name in valid["username"] if name in inserted]
+    taken = valid[~valid["username"].isin(inserted)]
+    if not taken.empty:
+        taken = taken[["username", "role", "branch"]].assign(row=None, reason="username already exists")
+        rejected = pd.concat([rejected, taken[rejected.columns]], ignore_index=True)
+    return created, rejected
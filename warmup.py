@@ -0,0 +1,161 @@
+"""
+Startup warm-up of connection pools and hot caches for every branch.
+
+Branches are warmed in parallel. For each one, the warm-up:
+- opens MIN_CONNECTIONS pooled connections on the primary and the read engine;
+- loads the machine list, the first page of products, the rate table (into the
+  shared cache) and the shifts;
+- runs today's dashboard queries for every shift, which also fills the
+  recent-data cache, and loads today's machine ranking.
+
+A step that fails is reported and skipped, so the remaining steps still run.
+The app starts the warm-up in a background thread on the first request of each
+process (start_warm_up). Deploy scripts can run it before traffic arrives:
+
+Usage:
+    python warmup.py                    # all branches
+    python warmup.py --branch main --connections 4
+"""
+import argparse
+import datetime
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from sqlalchemy.sql import text
+from db import get_branches, get_read_engine, get_sqlalchemy_engine
+from planning import cached_rate_table
+from shift_report import load_shift_hours
+from product_search import cached_search_products
+from report_queries import fetch_dashboard
+from rollups import cached_oee_ranking
+
+MIN_CONNECTIONS = 2         # Kept open in each pool (the pools keep up to 5 idle connections)
+MAX_WORKERS = 8
+DASHBOARD_SHIFTS = ["Day", "Night", "Plan"]
+
+_report = {}    # branch -> BranchWarmUp of the last warm-up in this process
+_started = False
+_start_lock = threading.Lock()
+
+
+class BranchWarmUp:
+    """Timings (seconds) and errors of one branch's warm-up steps."""
+
+    def __init__(self, branch):
+        self.branch = branch
+        self.timings = {}
+        self.errors = {}
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    def step(self, name, func):
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"⚠️ Warm-up of {self.branch} ({name}) failed: {e}")
+        self.timings[name] = time.perf_counter() - started
+
+    def __str__(self):
+        steps = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+        status = f"{len(self.errors)} failed steps" if self.errors else "ok"
+        return f"{self.branch}: {self.total:.2f}s ({steps}) {status}"
+
+
+def open_connections(engine, count=MIN_CONNECTIONS):
+    """Check ``count`` connections out at the same time, so the pool keeps that many open."""
+    connections = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def load_master_data(engine, branch):
+    with engine.connect() as conn:
+        pd.read_sql(text("SELECT name FROM machines"), conn)
+    cached_search_products(engine, branch, "", 0)
+    cached_rate_table(engine, branch)
+    load_shift_hours()
+
+
+def load_dashboards(engine, branch, date):
+    for shift in DASHBOARD_SHIFTS:
+        fetch_dashboard(engine, branch, date, shift)
+    cached_oee_ranking(engine, branch, date)
+
+
+def warm_branch(branch, connections=MIN_CONNECTIONS, date=None):
+    """Warm one branch's pools and caches. Returns its BranchWarmUp."""
+    date = date or datetime.date.today()
+    result = BranchWarmUp(branch)
+    engines = {}
+
+    def pools():
+        engines["primary"] = get_sqlalchemy_engine(branch)
+        engines["read"] = get_read_engine(branch)
+        for engine in set(engines.values()):
+            open_connections(engine, connections)
+
+    result.step("pools", pools)
+    if result.errors:
+        return result  # Nothing else can work without a connection
+    read = engines["read"]
+    result.step("master data", lambda: load_master_data(read, branch))
+    result.step("dashboards", lambda: load_dashboards(read, branch, date))
+    return result
+
+
+def warm_up(branches=None, connections=MIN_CONNECTIONS, max_workers=MAX_WORKERS):
+    """Warm every branch in parallel. Returns {branch: BranchWarmUp}."""
+    branches = branches or get_branches()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(branches)))) as pool:
+        futures = {pool.submit(warm_branch, branch, connections): branch for branch in branches}
+        for future in as_completed(futures):
+            result = future.result()
+            results[result.branch] = result
+            _report[result.branch] = result
+            print(f"{'⚠️' if result.errors else '✅'} Warm-up {result}")
+    return results
+
+
+def start_warm_up():
+    """Start the warm-up in a background thread, once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+def last_report():
+    """The latest warm-up result of each branch in this process."""
+    return dict(_report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm connection pools and caches before traffic arrives.")
+    parser.add_argument("--branch", action="append", help="Branch to warm (repeatable, default: all)")
+    parser.add_argument("--connections", type=int, default=MIN_CONNECTIONS)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = warm_up(args.branch, args.connections, args.workers)
+    print(f"✅ {len(results)} branches warmed in {time.perf_counter() - started:.2f}s")
+    return 1 if any(result.errors for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Durable local queue for finished shift reports.
+
+"Approve and Save" writes the report to a SQLite file and returns at once; a
+background worker drains the queue to the branch databases in batches, with
+exponential-backoff retries. A report that still fails after MAX_ATTEMPTS is
+marked failed and kept, with its last error, until the operator dismisses or
+re-enters it. Each report is keyed by (branch, date, shift, machine):
+enqueueing a key that is still waiting is refused (a saved, duplicate or failed
+report with that key is replaced by the new one), and a report that already
+exists in Postgres (e.g. the commit went through but the acknowledgment was
+lost) is marked as a duplicate instead of being written again.
+"""
+import io
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+from db import get_sqlalchemy_engine
+from shift_report import clean_dataframe, report_exists, save_shift_report
+
+QUEUE_PATH = os.environ.get("SHIFT_QUEUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "write_queue.db"))
+BATCH_SIZE = 20
+POLL_SECONDS = 5
+MAX_BACKOFF_SECONDS = 300
+MAX_ATTEMPTS = 10             # About half an hour of retries before a report is marked failed
+CLAIM_TIMEOUT_SECONDS = 600   # Reports claimed by a worker that died are retried after this
+KEEP_SAVED_SECONDS = 7 * 24 * 3600
+
+# pending → sending → saved | duplicate; sending → pending (retry) on failure, or failed after MAX_ATTEMPTS
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shift_reports (
+        key TEXT PRIMARY KEY,
+        branch TEXT NOT NULL,
+        date TEXT NOT NULL,
+        shift TEXT NOT NULL,
+        machine TEXT NOT NULL,
+        archive_json TEXT NOT NULL,
+        av_json TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        enqueued_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL,
+        claimed_at REAL,
+        saved_at REAL
+    )
+"""
+
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or QUEUE_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")  # A queued report must survive a power cut
+    conn.execute(SCHEMA)
+    return conn
+
+
+def report_key(branch, date, shift, machine):
+    return f"{branch}|{pd.Timestamp(date).date()}|{shift}|{machine}"
+
+
+def to_json(df):
+    # Dates travel as ISO strings; Postgres casts them when the rows are inserted
+    return df.astype({col: str for col in ("Date", "date") if col in df.columns}).to_json(orient="split", index=False)
+
+
+def from_json(payload):
+    return clean_dataframe(pd.read_json(io.StringIO(payload), orient="split", dtype=False, convert_dates=False))
+
+
+def enqueue(branch, archive_df, av_df, path=None):
+    """
+    Store a finished report and wake the worker. Returns False when a report with
+    the same (branch, date, shift, machine) is still waiting to be sent. A saved,
+    duplicate or failed one is replaced, so a corrected or re-entered report is queued again.
+    """
+    row = av_df.iloc[0]
+    key = report_key(branch, row["date"], row["shift"], row["machine"])
+    now = time.time()
+    conn = connect(path)
+    try:
+        cur = conn.execute(
+            """INSERT INTO shift_reports
+               (key, branch, date, shift, machine, archive_json, av_json, enqueued_at, next_attempt_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (key) DO UPDATE SET
+                   archive_json = excluded.archive_json, av_json = excluded.av_json,
+                   status = 'pending', attempts = 0, last_error = NULL,
+                   enqueued_at = excluded.enqueued_at, next_attempt_at = excluded.next_attempt_at,
+                   claimed_at = NULL, saved_at = NULL
+               WHERE status IN ('saved', 'duplicate', 'failed')""",
+            (key, branch, str(pd.Timestamp(row["date"]).date()), row["shift"], row["machine"],
+             to_json(archive_df), to_json(av_df), now, now),
+        )
+        queued = cur.rowcount == 1
+    finally:
+        conn.close()
+    _wake.set()
+    return queued
+
+
+def is_queued(branch, date, shift, machine, path=None):
+    """True if this report is waiting in the queue (not yet saved or rejected)."""
+    conn = connect(path)
+    try:
+        row = conn.execute(
+            "SELECT 1 FROM shift_reports WHERE key = ? AND status IN ('pending', 'sending')",
+            (report_key(branch, date, shift, machine),),
+        ).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def queue_status(branch=None, path=None):
+    """Queued, duplicate, failed and recently saved reports as a DataFrame, newest first."""
+    query = """SELECT key, branch, date, shift, machine, status, attempts, last_error, enqueued_at, saved_at
+               FROM shift_reports"""
+    params = ()
+    if branch:
+        query += " WHERE branch = ?"
+        params = (branch,)
+    conn = connect(path)
+    try:
+        df = pd.read_sql_query(query + " ORDER BY enqueued_at DESC", conn, params=params)
+    finally:
+        conn.close()
+    for col in ("enqueued_at", "saved_at"):
+        df[col] = pd.to_datetime(df[col], unit="s")
+    return df
+
+
+def discard(key, path=None):
+    """Remove a report that will not be saved (e.g. a duplicate or failed one the operator reviewed)."""
+    conn = connect(path)
+    try:
+        conn.execute("DELETE FROM shift_reports WHERE key = ? AND status != 'sending'", (key,))
+    finally:
+        conn.close()
+
+
+def claim_batch(conn, limit=BATCH_SIZE):
+    """Atomically mark up to ``limit`` due reports as being sent and return them."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute(
+            """SELECT key, branch, archive_json, av_json, attempts FROM shift_reports
+               WHERE (status = 'pending' AND next_attempt_at <= ?)
+                  OR (status = 'sending' AND claimed_at < ?)
+               ORDER BY enqueued_at LIMIT ?""",
+            (now, now - CLAIM_TIMEOUT_SECONDS, limit),
+        ).fetchall()
+        conn.executemany("UPDATE shift_reports SET status = 'sending', claimed_at = ? WHERE key = ?",
+                         [(now, row[0]) for row in rows])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+
+def _finish(conn, key, status):
+    conn.execute("UPDATE shift_reports SET status = ?, saved_at = ?, last_error = NULL WHERE key = ?",
+                 (status, time.time(), key))
+
+
+def _retry(conn, key, attempts, error):
+    """Schedule another attempt, or mark the report failed after MAX_ATTEMPTS. Returns the new status."""
+    status = "failed" if attempts + 1 >= MAX_ATTEMPTS else "pending"
+    delay = min(MAX_BACKOFF_SECONDS, POLL_SECONDS * 2 ** attempts)
+    conn.execute(
+        """UPDATE shift_reports SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?
+           WHERE key = ?""",
+        (status, attempts + 1, str(error)[:500], time.time() + delay, key),
+    )
+    return status
+
+
+def send_branch(conn, branch, rows):
+    """Write one branch's claimed reports: one transaction for the batch, per report on failure."""
+    reports = [(key, from_json(archive_json), from_json(av_json), attempts)
+               for key, _, archive_json, av_json, attempts in rows]
+    try:
+        engine = get_sqlalchemy_engine(branch)
+        new = []
+        for key, archive_df, av_df, attempts in reports:
+            row = av_df.iloc[0]
+            if report_exists(engine, row["date"], row["shift"], row["machine"]):
+                _finish(conn, key, "duplicate")
+            else:
+                new.append((key, archive_df, av_df, attempts))
+        if new:
+            save_shift_report(engine, pd.concat([r[1] for r in new], ignore_index=True),
+                              pd.concat([r[2] for r in new], ignore_index=True), branch)
+            for key, *_ in new:
+                _finish(conn, key, "saved")
+        return
+    except Exception as e:
+        if len(reports) == 1:
+            if _retry(conn, reports[0][0], reports[0][3], e) == "failed":
+                print(f"❌ Queued report {reports[0][0]} failed {MAX_ATTEMPTS} times, giving up: {e}")
+            else:
+                print(f"⚠️ Queued report {reports[0][0]} not saved, will retry: {e}")
+            return
+        print(f"⚠️ Batch of {len(reports)} queued reports for {branch} failed, saving one by one: {e}")
+
+    # One bad report must not hold back the others
+    for row in rows:
+        send_branch(conn, branch, [row])
+
+
+def drain_once(path=None, limit=BATCH_SIZE):
+    """Send one batch of due reports. Returns the number of reports claimed."""
+    conn = connect(path)
+    try:
+        rows = claim_batch(conn, limit)
+        by_branch = {}
+        for row in rows:
+            by_branch.setdefault(row[1], []).append(row)
+        for branch, branch_rows in by_branch.items():
+            send_branch(conn, branch, branch_rows)
+        conn.execute("DELETE FROM shift_reports WHERE status IN ('saved', 'duplicate') AND saved_at < ?",
+                     (time.time() - KEEP_SAVED_SECONDS,))
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def _run(path):
+    while True:
+        try:
+            if drain_once(path) == BATCH_SIZE:
+                continue  # More reports are probably waiting
+        except Exception as e:
+            print(f"❌ Shift report queue worker error: {e}")
+        _wake.wait(POLL_SECONDS)
+        _wake.clear()
+
+
+def start_worker(path=None):
+    """Start the background drain thread (once per process)."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, args=(path,), daemon=True, name="shift-report-queue")
+            _worker.start()